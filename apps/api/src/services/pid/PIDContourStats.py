@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+PID轮廓批量统计
+- 所有轮廓点拼接为一个数组，用 np.add.reduceat 分段求和
+- 面积/矩/外接矩形与 cv2.contourArea / cv2.moments / cv2.boundingRect 逐位一致
+  （整数坐标下鞋带公式各项为整数，累加无舍入误差）
+- Hu矩（旋转/缩放不变），用于图例模板匹配
+"""
+from typing import Dict, Sequence
+
+import numpy as np
+
+
+def contour_stats(contours: Sequence[np.ndarray]) -> Dict[str, np.ndarray]:
+    """批量计算轮廓统计量
+
+    Returns:
+        area: 面积（同 cv2.contourArea）
+        m00: 零阶矩（同 cv2.moments()['m00']）
+        cx, cy: 质心（int(m10/m00)，m00为0时为0）
+        x, y, w, h: 外接矩形（同 cv2.boundingRect）
+    """
+    n = len(contours)
+    if n == 0:
+        empty_f = np.empty(0, dtype=np.float64)
+        empty_i = np.empty(0, dtype=np.int64)
+        return {'area': empty_f, 'm00': empty_f, 'cx': empty_i, 'cy': empty_i,
+                'x': empty_i, 'y': empty_i, 'w': empty_i, 'h': empty_i}
+
+    lengths = np.fromiter((len(c) for c in contours), dtype=np.int64, count=n)
+    pts = np.concatenate(contours).reshape(-1, 2).astype(np.int64)
+    starts = np.cumsum(lengths) - lengths
+
+    # 每个点的前一个点（闭合轮廓，首点的前一个是末点）
+    prev = np.arange(len(pts)) - 1
+    prev[starts] = starts + lengths - 1
+
+    x = pts[:, 0]
+    y = pts[:, 1]
+    xp = x[prev]
+    yp = y[prev]
+
+    # 格林公式（与OpenCV contourMoments相同的累加项）
+    dxy = xp * y - x * yp
+    a00 = np.add.reduceat(dxy, starts).astype(np.float64)
+    a10 = np.add.reduceat(dxy * (xp + x), starts).astype(np.float64)
+    a01 = np.add.reduceat(dxy * (yp + y), starts).astype(np.float64)
+
+    area = np.abs(a00 * 0.5)
+
+    # OpenCV按a00符号统一为正向：m00 = a00 * ±1/2，m10 = a10 * ±1/6
+    sign = np.where(a00 > 0, 1.0, -1.0)
+    m00 = a00 * (0.5 * sign)
+    m10 = a10 * (sign / 6)
+    m01 = a01 * (sign / 6)
+
+    nonzero = m00 != 0
+    safe_m00 = np.where(nonzero, m00, 1.0)
+    cx = np.where(nonzero, np.trunc(m10 / safe_m00), 0).astype(np.int64)
+    cy = np.where(nonzero, np.trunc(m01 / safe_m00), 0).astype(np.int64)
+
+    x_min = np.minimum.reduceat(x, starts)
+    y_min = np.minimum.reduceat(y, starts)
+    w = np.maximum.reduceat(x, starts) - x_min + 1
+    h = np.maximum.reduceat(y, starts) - y_min + 1
+
+    return {'area': area, 'm00': m00, 'cx': cx, 'cy': cy,
+            'x': x_min, 'y': y_min, 'w': w, 'h': h}
+
+
+def contour_hu_moments(contours: Sequence[np.ndarray]) -> np.ndarray:
+    """批量计算轮廓Hu矩（N×7，定义同 cv2.HuMoments(cv2.moments(c))）
+
+    每个轮廓先平移到自身外接矩形原点再累加高阶矩，避免大坐标下中心矩相减的精度损失。
+    """
+    n = len(contours)
+    if n == 0:
+        return np.empty((0, 7), dtype=np.float64)
+
+    lengths = np.fromiter((len(c) for c in contours), dtype=np.int64, count=n)
+    pts = np.concatenate(contours).reshape(-1, 2).astype(np.float64)
+    starts = np.cumsum(lengths) - lengths
+    segment = np.repeat(np.arange(n), lengths)
+
+    x = pts[:, 0] - np.minimum.reduceat(pts[:, 0], starts)[segment]
+    y = pts[:, 1] - np.minimum.reduceat(pts[:, 1], starts)[segment]
+
+    prev = np.arange(len(pts)) - 1
+    prev[starts] = starts + lengths - 1
+    xp = x[prev]
+    yp = y[prev]
+
+    # 与OpenCV contourMoments相同的格林公式累加项
+    x2, y2, xp2, yp2 = x * x, y * y, xp * xp, yp * yp
+    dxy = xp * y - x * yp
+    xs = xp + x
+    ys = yp + y
+
+    def total(terms):
+        return np.add.reduceat(terms, starts)
+
+    a00 = total(dxy)
+    a10 = total(dxy * xs)
+    a01 = total(dxy * ys)
+    a20 = total(dxy * (xp * xs + x2))
+    a11 = total(dxy * (xp * (ys + yp) + x * (ys + y)))
+    a02 = total(dxy * (yp * ys + y2))
+    a30 = total(dxy * xs * (xp2 + x2))
+    a03 = total(dxy * ys * (yp2 + y2))
+    a21 = total(dxy * (xp2 * (3 * yp + y) + 2 * x * xp * ys + x2 * (yp + 3 * y)))
+    a12 = total(dxy * (yp2 * (3 * xp + x) + 2 * y * yp * xs + y2 * (xp + 3 * x)))
+
+    sign = np.where(a00 > 0, 1.0, -1.0)
+    m00 = a00 * sign / 2
+    m10 = a10 * sign / 6
+    m01 = a01 * sign / 6
+    m20 = a20 * sign / 12
+    m11 = a11 * sign / 24
+    m02 = a02 * sign / 12
+    m30 = a30 * sign / 20
+    m21 = a21 * sign / 60
+    m12 = a12 * sign / 60
+    m03 = a03 * sign / 20
+
+    hu = np.zeros((n, 7), dtype=np.float64)
+    valid = np.abs(m00) > 1e-12
+    if not valid.any():
+        return hu
+
+    m00, m10, m01, m20, m11, m02, m30, m21, m12, m03 = (
+        v[valid] for v in (m00, m10, m01, m20, m11, m02, m30, m21, m12, m03)
+    )
+
+    # 中心矩
+    cx = m10 / m00
+    cy = m01 / m00
+    mu20 = m20 - m10 * cx
+    mu11 = m11 - m10 * cy
+    mu02 = m02 - m01 * cy
+    mu30 = m30 - cx * (3 * mu20 + cx * m10)
+    mu21 = m21 - cx * (2 * mu11 + cx * m01) - cy * mu20
+    mu12 = m12 - cy * (2 * mu11 + cy * m10) - cx * mu02
+    mu03 = m03 - cy * (3 * mu02 + cy * m01)
+
+    # 归一化中心矩
+    s2 = 1.0 / (m00 * m00)
+    s3 = s2 / np.sqrt(np.abs(m00))
+    n20, n11, n02 = mu20 * s2, mu11 * s2, mu02 * s2
+    n30, n21, n12, n03 = mu30 * s3, mu21 * s3, mu12 * s3, mu03 * s3
+
+    t0 = n30 + n12
+    t1 = n21 + n03
+    q0 = t0 * t0
+    q1 = t1 * t1
+    n4 = 4 * n11
+    s = n20 + n02
+    d = n20 - n02
+
+    h = np.empty((len(m00), 7), dtype=np.float64)
+    h[:, 0] = s
+    h[:, 1] = d * d + n4 * n11
+    h[:, 3] = q0 + q1
+    h[:, 5] = d * (q0 - q1) + n4 * t0 * t1
+
+    t0_3 = t0 * (q0 - 3 * q1)
+    t1_3 = t1 * (3 * q0 - q1)
+    a = n30 - 3 * n12
+    b = 3 * n21 - n03
+    h[:, 2] = a * a + b * b
+    h[:, 4] = a * t0_3 + b * t1_3
+    h[:, 6] = b * t0_3 - a * t1_3
+
+    hu[valid] = h
+    return hu
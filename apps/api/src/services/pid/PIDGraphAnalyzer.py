@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
 """
 PID图拓扑分析服务
-- NetworkX构建管线连接图
-- 工艺流程路径分析
+- 数组存储的图核心（PIDGraphCore，CSR邻接 + 整数节点id）构建管线连接图
+- 工艺流程路径分析（枚举入口→出口简单路径，或分支点间的最长无分支管段）
 - 规则验证(P&ID标准)
 - 装配约束提取
+- NetworkX只用于导出（_build_graph）与拓扑图可视化，可选安装
 """
-import networkx as nx
 from typing import List, Dict, Tuple
 import json
 import math
+import os
+
+import numpy as np
+
+from PIDGraphCore import PIDGraphCore
+from PIDSpatialIndex import radius_pairs
+
+try:
+    import networkx as nx
+    HAS_NETWORKX = True
+except ImportError:
+    HAS_NETWORKX = False
 
 try:
     import matplotlib
@@ -20,8 +32,20 @@ except ImportError:
     print("⚠️  Matplotlib未安装，图可视化功能受限")
     HAS_MATPLOTLIB = False
 
+# 管线识别模式：paths（枚举入口→出口简单路径）/ runs（分支点间的最长无分支管段，线性时间）/
+# auto（无环且路径数上界不超过 PATH_WORK_LIMIT 时枚举，否则按管段）
+PIPELINE_MODES = ('auto', 'paths', 'runs')
+PATH_WORK_LIMIT = 10000
+
+
 class PIDGraphAnalyzer:
-    def __init__(self):
+    def __init__(self, pipeline_mode: str = None):
+        self.pipeline_mode = pipeline_mode or os.getenv('PID_PIPELINE_MODE', 'auto')
+        if self.pipeline_mode not in PIPELINE_MODES:
+            print(f"  ⚠️  未知管线识别模式 {self.pipeline_mode}，按auto处理")
+            self.pipeline_mode = 'auto'
+        self.path_work_limit = int(os.getenv('PID_PIPELINE_PATH_LIMIT', str(PATH_WORK_LIMIT)))
+
         # P&ID规则库
         self.rules = {
             # 入口组件类型
@@ -48,24 +72,25 @@ class PIDGraphAnalyzer:
         """完整分析PID图拓扑"""
         print("🔍 开始图拓扑分析...")
 
-        # 1. 构建NetworkX图
-        G = self._build_graph(components, connections)
-        print(f"  ✅ 构建图: {G.number_of_nodes()} 节点, {G.number_of_edges()} 边")
+        # 1. 构建图（CSR数组）
+        core = self._build_core(components, connections)
+        print(f"  ✅ 构建图: {core.n} 节点, {core.m} 边")
 
         # 2. 分析连通性
-        connectivity = self._analyze_connectivity(G)
+        connectivity = self._analyze_connectivity(core)
         print(f"  ✅ 连通性分析: {connectivity['num_components']} 个连通子图")
 
         # 3. 识别管线路径
-        pipelines = self._identify_pipelines(G, components)
-        print(f"  ✅ 识别管线: {len(pipelines)} 条")
+        pipelines, pipeline_mode = self._identify_pipelines(core, components)
+        pipeline_index = self._index_pipelines(pipelines)
+        print(f"  ✅ 识别管线: {len(pipelines)} 条（{pipeline_mode}）")
 
         # 4. 规则验证
-        validation = self._validate_rules(G, components, pipelines)
+        validation = self._validate_rules(core, components, pipelines, pipeline_index)
         print(f"  ✅ 规则验证: {validation['num_violations']} 个违规")
 
         # 5. 提取装配约束
-        constraints = self._extract_assembly_constraints(G, components, pipelines)
+        constraints = self._extract_assembly_constraints(core, components, pipelines)
         print(f"  ✅ 装配约束: {len(constraints)} 条")
 
         # 6. 生成工艺流程报告
@@ -73,167 +98,222 @@ class PIDGraphAnalyzer:
 
         return {
             'graph': {
-                'nodes': G.number_of_nodes(),
-                'edges': G.number_of_edges(),
-                'density': round(nx.density(G), 3) if G.number_of_nodes() > 0 else 0
+                'nodes': core.n,
+                'edges': core.m,
+                'density': round(core.density(), 3) if core.n > 0 else 0
             },
             'connectivity': connectivity,
             'pipelines': pipelines,
+            'pipeline_mode': pipeline_mode,
+            'pipeline_index': pipeline_index,
             'validation': validation,
             'assembly_constraints': constraints,
             'process_flow': process_flow
         }
 
-    def _build_graph(self, components: List[Dict], connections: List[Dict]) -> nx.DiGraph:
-        """构建NetworkX有向图"""
-        G = nx.DiGraph()
+    def _build_core(self, components: List[Dict], connections: List[Dict]) -> PIDGraphCore:
+        """构建数组存储的有向图"""
+        return PIDGraphCore.from_components(components, connections)
 
-        # 添加节点(组件)
-        for comp in components:
-            G.add_node(
-                comp['tag_number'],
-                type=comp.get('symbol_type'),
-                position=comp.get('position'),
-                parameters=comp.get('parameters', {}),
-                confidence=comp.get('confidence', 0)
-            )
-
-        # 添加边(连接)
-        for conn in connections:
-            G.add_edge(
-                conn['from'],
-                conn['to'],
-                distance=conn.get('distance'),
-                confidence=conn.get('confidence', 0)
-            )
-
-        return G
-
-    def _analyze_connectivity(self, G: nx.DiGraph) -> Dict:
-        """分析图连通性"""
-        # 转为无向图分析连通子图
-        G_undirected = G.to_undirected()
-
-        connected_components = list(nx.connected_components(G_undirected))
+    def _build_graph(self, components: List[Dict], connections: List[Dict]) -> 'nx.DiGraph':
+        """构建NetworkX有向图（导出/可视化用，需安装networkx）"""
+        return self._build_core(components, connections).to_networkx()
 
-        # 检测孤立节点
-        isolated = list(nx.isolates(G))
+    def _analyze_connectivity(self, core: PIDGraphCore) -> Dict:
+        """分析图连通性（弱连通分量）"""
+        labels = core.weak_components()
+        sizes = np.bincount(labels).tolist() if core.n > 0 else []
 
-        # 检测度中心性(哪些节点是关键连接点)
-        if G.number_of_nodes() > 0:
-            degree_centrality = nx.degree_centrality(G)
-            top_hubs = sorted(degree_centrality.items(), key=lambda x: x[1], reverse=True)[:5]
+        # 检测孤立节点
+        isolated = [core.tags[i] for i in core.isolates().tolist()]
+
+        # 检测度中心性(哪些节点是关键连接点)；稳定排序，同分保持节点顺序
+        if core.n > 0:
+            centrality = core.degree_centrality()
+            top = np.argsort(-centrality, kind='stable')[:5].tolist()
+            values = centrality.tolist()
+            top_hubs = [(core.tags[i], values[i]) for i in top]
         else:
             top_hubs = []
 
         return {
-            'num_components': len(connected_components),
-            'component_sizes': [len(c) for c in connected_components],
+            'num_components': len(sizes),
+            'component_sizes': sizes,
             'isolated_nodes': isolated,
             'top_hubs': [{'node': node, 'centrality': round(cent, 3)} for node, cent in top_hubs],
-            'is_connected': nx.is_weakly_connected(G) if G.number_of_nodes() > 0 else False
+            'is_connected': len(sizes) == 1
         }
 
-    def _identify_pipelines(self, G: nx.DiGraph, components: List[Dict]) -> List[Dict]:
-        """识别管线路径"""
-        pipelines = []
+    def _identify_pipelines(self, core: PIDGraphCore, components: List[Dict]) -> Tuple[List[Dict], str]:
+        """识别管线路径，返回 (管线列表, 实际使用的模式)"""
+        inlet_nodes, outlet_nodes = self._terminal_nodes(core)
+
+        mode = self.pipeline_mode
+        if mode == 'auto':
+            mode = 'paths' if self._path_work(core, inlet_nodes, outlet_nodes) <= self.path_work_limit else 'runs'
+        if mode == 'runs':
+            return self._identify_runs(core, set(inlet_nodes) | set(outlet_nodes)), mode
+        return self._enumerate_paths(core, inlet_nodes, outlet_nodes), mode
+
+    def _terminal_nodes(self, core: PIDGraphCore) -> Tuple[List[int], List[int]]:
+        """入口/出口节点id：按类型，无明确类型时按入度/出度为0"""
+        types = core.types
 
         # 找出所有入口节点(泵)
-        inlet_nodes = [
-            node for node, data in G.nodes(data=True)
-            if data.get('type') in self.rules['inlet_types']
-        ]
+        inlet_nodes = [i for i, t in enumerate(types) if t in self.rules['inlet_types']]
 
         # 找出所有出口节点(容器/设备)
-        outlet_nodes = [
-            node for node, data in G.nodes(data=True)
-            if data.get('type') in self.rules['outlet_types']
-        ]
+        outlet_nodes = [i for i, t in enumerate(types) if t in self.rules['outlet_types']]
 
         # 如果没有明确入口/出口,使用度数判断
         if not inlet_nodes:
-            inlet_nodes = [node for node in G.nodes() if G.in_degree(node) == 0]
+            inlet_nodes = np.flatnonzero(core.in_degree == 0).tolist()
 
         if not outlet_nodes:
-            outlet_nodes = [node for node in G.nodes() if G.out_degree(node) == 0]
+            outlet_nodes = np.flatnonzero(core.out_degree == 0).tolist()
+
+        return inlet_nodes, outlet_nodes
+
+    def _path_work(self, core: PIDGraphCore, inlet_nodes: List[int], outlet_nodes: List[int]) -> float:
+        """逐对枚举简单路径的搜索量上界；有环时为无穷
+
+        无环图上DFS访问的路径前缀数 = 各节点的「入口→该节点」路径数之和，
+        按拓扑序DP线性求出；每个出口各搜索一遍。
+        """
+        order = core.topological_order()
+        if order is None:
+            return math.inf
+        counts = [0] * core.n
+        for i in inlet_nodes:
+            counts[i] = 1
+        successors = core.successor_lists()
+        for i in order:
+            if counts[i]:
+                for j in successors[i]:
+                    counts[j] += counts[i]
+        return sum(counts) * len(outlet_nodes)
+
+    def _pipeline(self, core: PIDGraphCore, pipeline_id: int, path: List[int], **extra) -> Dict:
+        tags = [core.tags[i] for i in path]
+        return {
+            'id': f'LINE-{pipeline_id:03d}',
+            'inlet': tags[0],
+            'outlet': tags[-1],
+            'length': len(path),
+            'path': tags,
+            'components': [
+                {'tag': core.tags[i], 'type': core.types[i], 'position': core.positions[i]}
+                for i in path
+            ],
+            **extra
+        }
 
-        # 遍历所有入口→出口路径
-        pipeline_id = 1
+    def _enumerate_paths(self, core: PIDGraphCore, inlet_nodes: List[int], outlet_nodes: List[int]) -> List[Dict]:
+        """枚举所有入口→出口简单路径（有环或网状旁路时为指数级）"""
+        pipelines = []
         for inlet in inlet_nodes:
             for outlet in outlet_nodes:
                 if inlet == outlet:
                     continue
+                for path in core.simple_paths(inlet, outlet, cutoff=20):
+                    pipelines.append(self._pipeline(core, len(pipelines) + 1, path))
+        return pipelines
 
-                try:
-                    # 找出所有简单路径
-                    paths = list(nx.all_simple_paths(G, inlet, outlet, cutoff=20))
-
-                    for path in paths:
-                        # 提取路径上的组件信息
-                        path_components = []
-                        for node in path:
-                            node_data = G.nodes[node]
-                            path_components.append({
-                                'tag': node,
-                                'type': node_data.get('type'),
-                                'position': node_data.get('position')
-                            })
-
-                        pipelines.append({
-                            'id': f'LINE-{pipeline_id:03d}',
-                            'inlet': inlet,
-                            'outlet': outlet,
-                            'length': len(path),
-                            'path': path,
-                            'components': path_components
-                        })
-                        pipeline_id += 1
-                except nx.NetworkXNoPath:
-                    continue
+    def _identify_runs(self, core: PIDGraphCore, terminals: set) -> List[Dict]:
+        """分支点之间的最长无分支管段（每条边恰属一个管段，线性时间）
+
+        分支点：入度或出度不为1的节点，以及入口/出口节点。从每个分支点沿每条出边走到下一个分支点为一段；
+        剩下未走过的边构成纯环（环上节点入度、出度均为1），每个环为一段。
+        按强连通分量缩合图的拓扑序输出（上游管段在前）；两端位于同一环路（强连通分量）内的管段标为loop。
+        """
+        branch = (core.in_degree != 1) | (core.out_degree != 1)
+        branch[list(terminals)] = True
+        branch = branch.tolist()
+        successors = core.successor_lists()
+
+        scc = core.strong_components()
+        scc_rank = core.condensation_order(scc)
+        scc_size = np.bincount(scc)
+        ordered = np.lexsort((np.arange(core.n), scc_rank)).tolist()
+
+        runs = []
+        visited = [False] * core.n  # 非分支节点（出度为1）的出边是否已走过
+        for start in ordered:
+            if not branch[start]:
+                continue
+            for succ in successors[start]:
+                path = [start, succ]
+                while not branch[path[-1]]:
+                    visited[path[-1]] = True
+                    path.append(successors[path[-1]][0])
+                runs.append(path)
+
+        # 纯环：环上没有分支点
+        for node in ordered:
+            if branch[node] or visited[node]:
+                continue
+            path = [node]
+            while not visited[path[-1]]:
+                visited[path[-1]] = True
+                path.append(successors[path[-1]][0])
+            runs.append(path)
 
+        pipelines = []
+        for path in runs:
+            in_loop = scc[path[0]] == scc[path[-1]] and scc_size[scc[path[0]]] > 1
+            pipelines.append(self._pipeline(core, len(pipelines) + 1, path, kind='loop' if in_loop else 'run'))
         return pipelines
 
-    def _validate_rules(self, G: nx.DiGraph, components: List[Dict], pipelines: List[Dict]) -> Dict:
+    def _index_pipelines(self, pipelines: List[Dict]) -> Dict[str, List[str]]:
+        """节点 → 经过该节点的管线ID"""
+        index = {}
+        for pipeline in pipelines:
+            for node in dict.fromkeys(pipeline['path']):
+                index.setdefault(node, []).append(pipeline['id'])
+        return index
+
+    def _validate_rules(self, core: PIDGraphCore, components: List[Dict], pipelines: List[Dict],
+                        pipeline_index: Dict[str, List[str]] = None) -> Dict:
         """验证P&ID规则"""
         violations = []
+        types = [t or '' for t in core.types]
 
         # 规则1: 泵后必须有阀门
-        for node, data in G.nodes(data=True):
-            if 'pump' in data.get('type', ''):
-                successors = list(G.successors(node))
-                has_valve = any(
-                    'valve' in G.nodes[s].get('type', '')
-                    for s in successors
-                )
+        for i, node_type in enumerate(types):
+            if 'pump' in node_type:
+                has_valve = any('valve' in types[j] for j in core.successors(i).tolist())
                 if not has_valve:
                     violations.append({
                         'rule': 'pump_must_have_valve',
-                        'component': node,
+                        'component': core.tags[i],
                         'severity': 'warning',
-                        'message': f'泵 {node} 后缺少阀门'
+                        'message': f'泵 {core.tags[i]} 后缺少阀门'
                     })
 
         # 规则2: 孤立组件检查
-        isolated = list(nx.isolates(G))
-        for node in isolated:
+        isolated = core.isolates().tolist()
+        for i in isolated:
             violations.append({
                 'rule': 'no_isolated_components',
-                'component': node,
+                'component': core.tags[i],
                 'severity': 'error',
-                'message': f'组件 {node} 未连接到任何管线'
+                'message': f'组件 {core.tags[i]} 未连接到任何管线'
             })
 
         # 规则3: 仪表必须在主管线上
-        for node, data in G.nodes(data=True):
-            if 'indicator' in data.get('type', ''):
+        if pipeline_index is None:
+            pipeline_index = self._index_pipelines(pipelines)
+        degree = core.degree
+        for i, node_type in enumerate(types):
+            if 'indicator' in node_type:
                 # 检查是否在任何管线路径上
-                on_pipeline = any(node in p['path'] for p in pipelines)
-                if not on_pipeline and G.degree(node) == 0:
+                on_pipeline = core.tags[i] in pipeline_index
+                if not on_pipeline and degree[i] == 0:
                     violations.append({
                         'rule': 'indicator_on_pipeline',
-                        'component': node,
+                        'component': core.tags[i],
                         'severity': 'warning',
-                        'message': f'仪表 {node} 不在主管线上'
+                        'message': f'仪表 {core.tags[i]} 不在主管线上'
                     })
 
         return {
@@ -242,7 +322,7 @@ class PIDGraphAnalyzer:
             'passed': len(violations) == 0
         }
 
-    def _extract_assembly_constraints(self, G: nx.DiGraph, components: List[Dict], pipelines: List[Dict]) -> List[Dict]:
+    def _extract_assembly_constraints(self, core: PIDGraphCore, components: List[Dict], pipelines: List[Dict]) -> List[Dict]:
         """提取装配约束"""
         constraints = []
 
@@ -261,33 +341,33 @@ class PIDGraphAnalyzer:
                     'priority': 'high'
                 })
 
-        # 约束2: 位置约束(基于实际坐标)
-        for comp in components:
-            pos = comp.get('position')
-            if pos:
-                # 找出附近的组件
-                nearby = []
-                for other in components:
-                    if other['tag_number'] == comp['tag_number']:
-                        continue
-
-                    other_pos = other.get('position')
-                    if other_pos:
-                        dist = math.sqrt((pos[0] - other_pos[0])**2 + (pos[1] - other_pos[1])**2)
-                        if dist < 100:  # 100px内
-                            nearby.append({
-                                'tag': other['tag_number'],
-                                'distance': round(dist, 2)
-                            })
-
-                if nearby:
-                    constraints.append({
-                        'type': 'proximity',
-                        'component': comp['tag_number'],
-                        'nearby_components': nearby,
-                        'constraint': 'maintain_proximity',
-                        'priority': 'medium'
-                    })
+        # 约束2: 位置约束(基于实际坐标，网格索引找100px内的组件，按组件顺序列出)
+        located = [i for i, comp in enumerate(components) if comp.get('position')]
+        a, b, dist = radius_pairs([components[i]['position'] for i in located], 100)
+        if len(a):
+            first = np.concatenate([a, b])
+            second = np.concatenate([b, a])
+            dist = np.concatenate([dist, dist])
+            order = np.lexsort((second, first))
+            first, second, dist = first[order].tolist(), second[order].tolist(), dist[order].tolist()
+        else:
+            first, second, dist = [], [], []
+        bounds = np.searchsorted(first, np.arange(len(located) + 1)).tolist()
+        for k, i in enumerate(located):
+            comp = components[i]
+            nearby = [
+                {'tag': components[located[j]]['tag_number'], 'distance': round(d, 2)}
+                for j, d in zip(second[bounds[k]:bounds[k + 1]], dist[bounds[k]:bounds[k + 1]])
+                if components[located[j]]['tag_number'] != comp['tag_number']
+            ]
+            if nearby:
+                constraints.append({
+                    'type': 'proximity',
+                    'component': comp['tag_number'],
+                    'nearby_components': nearby,
+                    'constraint': 'maintain_proximity',
+                    'priority': 'medium'
+                })
 
         # 约束3: 方向约束(基于流向)
         for pipeline in pipelines:
@@ -326,8 +406,11 @@ class PIDGraphAnalyzer:
             'flow_descriptions': flow_descriptions
         }
 
-    def export_graph_visualization(self, G: nx.DiGraph, output_path: str):
+    def export_graph_visualization(self, G: 'nx.DiGraph', output_path: str):
         """导出图可视化"""
+        if not HAS_NETWORKX:
+            print("  ⚠️  NetworkX未安装，跳过图可视化")
+            return
         if not HAS_MATPLOTLIB:
             print("  ⚠️  Matplotlib未安装，跳过图可视化")
             return
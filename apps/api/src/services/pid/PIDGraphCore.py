@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+PID图核心（数组存储）
+- 节点为整数id（按组件顺序，连接中出现的未知位号追加在后），位号 ↔ id 双向映射
+- 节点/边属性按列存储（列表 / NumPy数组），不为每个节点、每条边建字典
+- 出边/入边均为CSR数组（indptr + indices），同一节点的邻接顺序 = 连接首次出现的顺序，
+  与NetworkX DiGraph的邻接顺序一致，遍历结果可直接对照
+- 连通分量、强连通分量：SciPy csgraph（可选），未安装时用纯Python线性算法
+- NetworkX只作为可选的导出格式（to_networkx）
+"""
+import heapq
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components as _csgraph_components
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+
+def _csr(keys: np.ndarray, values: np.ndarray, n: int):
+    """按keys分组（组内保持原顺序）→ (indptr, indices, 边序号)"""
+    order = np.argsort(keys, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=indptr[1:])
+    return indptr, values[order], order
+
+
+class PIDGraphCore:
+    """CSR有向图
+
+    节点列：tags / types / positions / parameters / confidences，described[i] 为该节点是否来自组件
+    （仅在连接中出现的位号无属性）；边列：src / dst / distance / confidence（None存为NaN）。
+    重复的节点/边只保留首次出现的位置，属性取最后一次（与NetworkX的add_node/add_edge语义一致）。
+    """
+
+    def __init__(self, tags: List[str], types: List, positions: List, parameters: List, confidences: List,
+                 described: List[bool], src, dst, distance=None, confidence=None):
+        self.tags = tags
+        self.types = types
+        self.positions = positions
+        self.parameters = parameters
+        self.confidences = confidences
+        self.described = np.asarray(described, dtype=bool)
+        self.ids = {tag: i for i, tag in enumerate(tags)}
+        self.src = np.asarray(src, dtype=np.int64)
+        self.dst = np.asarray(dst, dtype=np.int64)
+        self.distance = np.full(len(self.src), np.nan) if distance is None else np.asarray(distance, dtype=np.float64)
+        self.confidence = np.zeros(len(self.src)) if confidence is None else np.asarray(confidence, dtype=np.float64)
+
+        n = len(tags)
+        self.out_indptr, self.out_indices, self.out_edges = _csr(self.src, self.dst, n)
+        self.in_indptr, self.in_indices, self.in_edges = _csr(self.dst, self.src, n)
+        self.out_degree = np.diff(self.out_indptr)
+        self.in_degree = np.diff(self.in_indptr)
+        self._successor_lists: Optional[List[List[int]]] = None
+
+    @classmethod
+    def from_components(cls, components: List[Dict], connections: List[Dict]) -> 'PIDGraphCore':
+        ids: Dict[str, int] = {}
+        tags: List[str] = []
+        types, positions, parameters, confidences, described = [], [], [], [], []
+
+        def node_id(tag) -> int:
+            if tag not in ids:
+                ids[tag] = len(tags)
+                tags.append(tag)
+                types.append(None)
+                positions.append(None)
+                parameters.append(None)
+                confidences.append(None)
+                described.append(False)
+            return ids[tag]
+
+        for comp in components:
+            i = node_id(comp['tag_number'])
+            types[i] = comp.get('symbol_type')
+            positions[i] = comp.get('position')
+            parameters[i] = comp.get('parameters', {})
+            confidences[i] = comp.get('confidence', 0)
+            described[i] = True
+
+        edge_ids: Dict[tuple, int] = {}
+        src, dst, distance, confidence = [], [], [], []
+        for conn in connections:
+            key = (node_id(conn['from']), node_id(conn['to']))
+            d, c = conn.get('distance'), conn.get('confidence', 0)
+            d, c = np.nan if d is None else d, np.nan if c is None else c
+            if key in edge_ids:
+                e = edge_ids[key]
+                distance[e], confidence[e] = d, c
+                continue
+            edge_ids[key] = len(src)
+            src.append(key[0])
+            dst.append(key[1])
+            distance.append(d)
+            confidence.append(c)
+
+        return cls(tags, types, positions, parameters, confidences, described, src, dst, distance, confidence)
+
+    # ------------------------------------------------------------ 基本属性
+
+    @property
+    def n(self) -> int:
+        return len(self.tags)
+
+    @property
+    def m(self) -> int:
+        return len(self.src)
+
+    @property
+    def degree(self) -> np.ndarray:
+        """入度 + 出度（自环计2）"""
+        return self.in_degree + self.out_degree
+
+    def successors(self, i: int) -> np.ndarray:
+        return self.out_indices[self.out_indptr[i]:self.out_indptr[i + 1]]
+
+    def predecessors(self, i: int) -> np.ndarray:
+        return self.in_indices[self.in_indptr[i]:self.in_indptr[i + 1]]
+
+    def successor_lists(self) -> List[List[int]]:
+        """逐节点的后继列表（Python整数，逐节点遍历时比数组切片快）"""
+        if self._successor_lists is None:
+            flat = self.out_indices.tolist()
+            ptr = self.out_indptr.tolist()
+            self._successor_lists = [flat[ptr[i]:ptr[i + 1]] for i in range(self.n)]
+        return self._successor_lists
+
+    def density(self) -> float:
+        n = self.n
+        if self.m == 0 or n <= 1:
+            return 0  # 与 nx.density 一致
+        return self.m / (n * (n - 1))
+
+    def isolates(self) -> np.ndarray:
+        return np.flatnonzero(self.degree == 0)
+
+    def degree_centrality(self) -> np.ndarray:
+        n = self.n
+        if n <= 1:
+            return np.ones(n, dtype=np.int64)  # 与 nx.degree_centrality 一致
+        return self.degree / (n - 1)
+
+    # ------------------------------------------------------------ 连通性
+
+    def weak_components(self) -> np.ndarray:
+        """弱连通分量标签：按分量中最小节点id的顺序编号为 0, 1, 2, ..."""
+        n = self.n
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+        if HAS_SCIPY:
+            _, labels = _csgraph_components(self._matrix(), directed=True, connection='weak')
+        else:
+            labels = self._union_find_labels()
+        # 重新编号：分量按首次出现的节点排序
+        _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+        rank = np.empty(len(first), dtype=np.int64)
+        rank[np.argsort(first, kind='stable')] = np.arange(len(first))
+        return rank[inverse]
+
+    def strong_components(self) -> np.ndarray:
+        """强连通分量标签（编号无特定顺序）"""
+        if self.n == 0:
+            return np.empty(0, dtype=np.int64)
+        if HAS_SCIPY:
+            _, labels = _csgraph_components(self._matrix(), directed=True, connection='strong')
+            return labels.astype(np.int64)
+        return self._tarjan_labels()
+
+    def condensation_order(self, labels: np.ndarray = None) -> np.ndarray:
+        """强连通分量缩合图的拓扑序：返回每个节点所在分量的序号（上游在前）
+
+        同时可出队的分量按其最小节点id优先，结果确定。
+        """
+        if labels is None:
+            labels = self.strong_components()
+        k = int(labels.max()) + 1 if len(labels) else 0
+        first = np.full(k, self.n, dtype=np.int64)
+        np.minimum.at(first, labels, np.arange(self.n))
+
+        a, b = labels[self.src], labels[self.dst]
+        cross = a != b
+        pairs = np.unique(np.stack([a[cross], b[cross]], axis=1), axis=0) if cross.any() else np.empty((0, 2), np.int64)
+        indptr, indices, _ = _csr(pairs[:, 0], pairs[:, 1], k)
+        indegree = np.bincount(pairs[:, 1], minlength=k).tolist()
+        indptr, indices, first_list = indptr.tolist(), indices.tolist(), first.tolist()
+
+        heap = [(first_list[c], c) for c in range(k) if indegree[c] == 0]
+        heapq.heapify(heap)
+        rank = np.empty(k, dtype=np.int64)
+        position = 0
+        while heap:
+            _, c = heapq.heappop(heap)
+            rank[c] = position
+            position += 1
+            for d in indices[indptr[c]:indptr[c + 1]]:
+                indegree[d] -= 1
+                if indegree[d] == 0:
+                    heapq.heappush(heap, (first_list[d], d))
+        return rank[labels]
+
+    def is_acyclic(self) -> bool:
+        if np.any(self.src == self.dst):
+            return False
+        labels = self.strong_components()
+        return len(np.unique(labels)) == self.n
+
+    def topological_order(self) -> Optional[List[int]]:
+        """拓扑序（Kahn，同时可出队时按节点id），有环时返回None"""
+        indegree = self.in_degree.tolist()
+        successors = self.successor_lists()
+        heap = [i for i in range(self.n) if indegree[i] == 0]
+        heapq.heapify(heap)
+        order = []
+        while heap:
+            i = heapq.heappop(heap)
+            order.append(i)
+            for j in successors[i]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    heapq.heappush(heap, j)
+        return order if len(order) == self.n else None
+
+    # ------------------------------------------------------------ 遍历
+
+    def bfs(self, source: int, directed: bool = True) -> List[int]:
+        """广度优先访问顺序（directed=False 时同时沿入边走）"""
+        seen = np.zeros(self.n, dtype=bool)
+        seen[source] = True
+        order = [source]
+        head = 0
+        while head < len(order):
+            i = order[head]
+            head += 1
+            neighbors = self.successors(i) if directed else np.concatenate([self.successors(i), self.predecessors(i)])
+            fresh = neighbors[~seen[neighbors]]
+            if len(fresh):
+                fresh = fresh[np.sort(np.unique(fresh, return_index=True)[1])]
+                seen[fresh] = True
+                order.extend(fresh.tolist())
+        return order
+
+    def simple_paths(self, source: int, target: int, cutoff: int) -> Iterator[List[int]]:
+        """source → target 的所有简单路径（边数不超过cutoff），顺序与 networkx.all_simple_paths 一致"""
+        if source == target:
+            return
+        successors = self.successor_lists()
+        path = [source]
+        on_path = {source}
+        stack = [iter(successors[source])]
+        while stack:
+            nxt = next((v for v in stack[-1] if v not in on_path), None)
+            if nxt is None:
+                stack.pop()
+                on_path.discard(path.pop())
+                continue
+            if nxt == target:
+                yield path + [nxt]
+                continue
+            if len(path) < cutoff:
+                path.append(nxt)
+                on_path.add(nxt)
+                stack.append(iter(successors[nxt]))
+
+    # ------------------------------------------------------------ 内部
+
+    def _matrix(self):
+        data = np.ones(self.m, dtype=np.int8)
+        return csr_matrix((data, (self.src, self.dst)), shape=(self.n, self.n))
+
+    def _union_find_labels(self) -> np.ndarray:
+        parent = list(range(self.n))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for a, b in zip(self.src.tolist(), self.dst.tolist()):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+        return np.array([find(i) for i in range(self.n)], dtype=np.int64)
+
+    def _tarjan_labels(self) -> np.ndarray:
+        """迭代式Tarjan强连通分量"""
+        n = self.n
+        successors = self.successor_lists()
+        index = [-1] * n
+        low = [0] * n
+        on_stack = [False] * n
+        labels = np.empty(n, dtype=np.int64)
+        stack = []
+        counter = 0
+        label = 0
+        for root in range(n):
+            if index[root] >= 0:
+                continue
+            work = [(root, 0)]
+            while work:
+                v, pos = work[-1]
+                if pos == 0:
+                    index[v] = low[v] = counter
+                    counter += 1
+                    stack.append(v)
+                    on_stack[v] = True
+                children = successors[v]
+                while pos < len(children):
+                    w = children[pos]
+                    pos += 1
+                    if index[w] < 0:
+                        work[-1] = (v, pos)
+                        work.append((w, 0))
+                        break
+                    if on_stack[w]:
+                        low[v] = min(low[v], index[w])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[v])
+                    if low[v] == index[v]:
+                        while True:
+                            w = stack.pop()
+                            on_stack[w] = False
+                            labels[w] = label
+                            if w == v:
+                                break
+                        label += 1
+        return labels
+
+    # ------------------------------------------------------------ 导出
+
+    def to_networkx(self):
+        """导出为NetworkX DiGraph（需安装networkx）"""
+        import networkx as nx
+
+        def value(v):
+            return None if v != v else v  # NaN → None
+
+        G = nx.DiGraph()
+        for i, tag in enumerate(self.tags):
+            if self.described[i]:
+                G.add_node(tag, type=self.types[i], position=self.positions[i],
+                           parameters=self.parameters[i], confidence=self.confidences[i])
+            else:
+                G.add_node(tag)
+        for a, b, d, c in zip(self.src.tolist(), self.dst.tolist(), self.distance.tolist(), self.confidence.tolist()):
+            G.add_edge(self.tags[a], self.tags[b], distance=value(d), confidence=value(c))
+        return G
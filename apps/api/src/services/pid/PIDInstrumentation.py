@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+PID识别分阶段监测
+- 每个阶段记录调用次数、墙钟/CPU耗时、阶段内峰值RSS（后台线程采样）及计数
+- 可选逐阶段性能剖析：cProfile（取累计耗时前N个函数）或 pyinstrument（文本调用树）
+- 报告为JSON可序列化字典；页面工作进程的报告可合并到主进程
+"""
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import psutil
+    _process = psutil.Process()
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+_MB = 1024 * 1024
+
+
+def current_rss() -> int:
+    """当前常驻内存（字节）"""
+    if psutil is not None:
+        return _process.memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return peak_rss()
+
+
+def peak_rss(children: bool = False) -> int:
+    """进程（或已结束子进程）生命周期内的峰值常驻内存（字节），不可用时为0"""
+    if resource is None:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # Linux单位为KB，macOS为字节
+    return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+
+def _cprofile_rows(profile: cProfile.Profile, top: int) -> List[Dict]:
+    stats = pstats.Stats(profile).stats
+    rows = [
+        {
+            'function': f'{filename}:{line}({name})',
+            'calls': nc,
+            'tottime': round(tt, 4),
+            'cumtime': round(ct, 4)
+        }
+        for (filename, line, name), (cc, nc, tt, ct, callers) in stats.items()
+    ]
+    rows.sort(key=lambda r: -r['cumtime'])
+    return rows[:top]
+
+
+class PIDInstrumentation:
+    """阶段计时器
+
+    用法:
+        with instrumentation.stage('symbols') as counters:
+            symbols = detect(...)
+            counters['symbols'] = len(symbols)
+
+    同名阶段多次进入时累加（如逐页的OCR）。阶段可在不同线程中并发进入，
+    但剖析器不支持同一线程内嵌套阶段：内层阶段只计时，不剖析。
+    """
+
+    def __init__(self, profiler: str = None, sample_interval: float = 0.05, top: int = 25):
+        self.profiler = profiler if profiler in PROFILERS else None
+        self.sample_interval = sample_interval
+        self.top = top
+        self.stages: Dict[str, Dict] = {}
+        self.started_at = time.perf_counter()
+
+        self._lock = threading.Lock()
+        self._active: List[Dict] = []
+        self._sampler: Optional[threading.Thread] = None
+        self._sampler_stop = threading.Event()
+        self._profiling = threading.local()
+
+    # ------------------------------------------------------------ 内存采样
+
+    def _sample_loop(self, stop: threading.Event):
+        while not stop.wait(self.sample_interval):
+            self._observe_rss()
+
+    def _observe_rss(self):
+        rss = current_rss()
+        with self._lock:
+            for active in self._active:
+                active['peak_rss'] = max(active['peak_rss'], rss)
+
+    def _activate(self, active: Dict):
+        with self._lock:
+            self._active.append(active)
+            if self._sampler is None:
+                self._sampler_stop = threading.Event()
+                self._sampler = threading.Thread(target=self._sample_loop, args=(self._sampler_stop,), daemon=True)
+                self._sampler.start()
+
+    def _deactivate(self, active: Dict):
+        with self._lock:
+            # 按身份移除：并发阶段的采样字典可能取值相同
+            self._active = [a for a in self._active if a is not active]
+            if not self._active and self._sampler is not None:
+                self._sampler_stop.set()
+                self._sampler = None
+
+    # ------------------------------------------------------------ 剖析
+
+    def _start_profiler(self):
+        if self.profiler is None or getattr(self._profiling, 'active', False):
+            return None
+        try:
+            if self.profiler == 'cprofile':
+                profiler = cProfile.Profile()
+                profiler.enable()
+            elif PyinstrumentProfiler is not None:
+                profiler = PyinstrumentProfiler()
+                profiler.start()
+            else:
+                return None
+        except (ValueError, RuntimeError):
+            # 其他线程已启用剖析器（Python 3.12+ 的 cProfile 为全局单例）
+            return None
+        self._profiling.active = True
+        return profiler
+
+    def _stop_profiler(self, profiler) -> Dict:
+        self._profiling.active = False
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            return {'profile': _cprofile_rows(profiler, self.top)}
+        profiler.stop()
+        return {'profile_text': [profiler.output_text(unicode=False, color=False)]}
+
+    # ------------------------------------------------------------ 阶段
+
+    @contextmanager
+    def stage(self, name: str, **counters):
+        rss_start = current_rss()
+        active = {'peak_rss': rss_start}
+        self._activate(active)
+        profiler = self._start_profiler()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield counters
+        finally:
+            seconds = time.perf_counter() - wall_start
+            cpu_seconds = time.process_time() - cpu_start
+            profile = self._stop_profiler(profiler) if profiler is not None else {}
+            self._observe_rss()
+            self._deactivate(active)
+            rss_end = current_rss()
+            self._record(name, {
+                'calls': 1,
+                'seconds': seconds,
+                'cpu_seconds': cpu_seconds,
+                'peak_rss_mb': active['peak_rss'] / _MB,
+                'rss_delta_mb': (rss_end - rss_start) / _MB,
+                'counters': counters,
+                **profile
+            })
+
+    def count(self, name: str, **counters):
+        """只累加计数（不计时）"""
+        self._record(name, {'calls': 0, 'counters': counters})
+
+    def _record(self, name: str, record: Dict):
+        with self._lock:
+            stage = self.stages.setdefault(name, {
+                'calls': 0, 'seconds': 0.0, 'cpu_seconds': 0.0,
+                'peak_rss_mb': 0.0, 'rss_delta_mb': 0.0, 'counters': {}
+            })
+            stage['calls'] += record.get('calls', 0)
+            stage['seconds'] += record.get('seconds', 0.0)
+            stage['cpu_seconds'] += record.get('cpu_seconds', 0.0)
+            stage['peak_rss_mb'] = max(stage['peak_rss_mb'], record.get('peak_rss_mb', 0.0))
+            stage['rss_delta_mb'] = max(stage['rss_delta_mb'], record.get('rss_delta_mb', 0.0))
+            for key, value in record.get('counters', {}).items():
+                stage['counters'][key] = stage['counters'].get(key, 0) + value
+            if 'profile' in record:
+                stage['profile'] = self._merge_profile(stage.get('profile', []), record['profile'])
+            if 'profile_text' in record:
+                stage.setdefault('profile_text', []).extend(record['profile_text'])
+
+    def _merge_profile(self, rows: List[Dict], more: List[Dict]) -> List[Dict]:
+        merged = {r['function']: dict(r) for r in rows}
+        for row in more:
+            if row['function'] in merged:
+                target = merged[row['function']]
+                for key in ('calls', 'tottime', 'cumtime'):
+                    target[key] = round(target[key] + row[key], 4)
+            else:
+                merged[row['function']] = dict(row)
+        return sorted(merged.values(), key=lambda r: -r['cumtime'])[:self.top]
+
+    def merge(self, report: Optional[Dict]):
+        """合并另一个实例（通常来自页面工作进程）的报告"""
+        if not report:
+            return
+        for name, stage in report.get('stages', {}).items():
+            self._record(name, stage)
+
+    # ------------------------------------------------------------ 报告
+
+    def report(self, include_profile: bool = True) -> Dict:
+        stages = {}
+        with self._lock:
+            for name, stage in self.stages.items():
+                entry = {
+                    'calls': stage['calls'],
+                    'seconds': round(stage['seconds'], 4),
+                    'cpu_seconds': round(stage['cpu_seconds'], 4),
+                    'peak_rss_mb': round(stage['peak_rss_mb'], 1),
+                    'rss_delta_mb': round(stage['rss_delta_mb'], 1),
+                    'counters': dict(stage['counters'])
+                }
+                if include_profile:
+                    for key in ('profile', 'profile_text'):
+                        if key in stage:
+                            entry[key] = stage[key]
+                stages[name] = entry
+
+        return {
+            'total_seconds': round(time.perf_counter() - self.started_at, 4),
+            'peak_rss_mb': round(peak_rss() / _MB, 1),
+            'children_peak_rss_mb': round(peak_rss(children=True) / _MB, 1),
+            'profiler': self.profiler,
+            'stages': stages
+        }
+
+    def write(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def print_summary(self):
+        print(f"  ⏱️  阶段耗时:")
+        for name, stage in self.report(include_profile=False)['stages'].items():
+            if not stage['calls']:
+                continue
+            counters = ' '.join(f'{k}={v}' for k, v in stage['counters'].items())
+            print(f"     {name:<14} {stage['seconds']:>8.2f}s  峰值内存 {stage['peak_rss_mb']:>7.0f}MB  {counters}")
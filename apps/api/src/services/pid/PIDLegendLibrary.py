@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+PID图例库（跨图纸持久化）
+- 同一项目的图纸共用一张符号表：以图例区域的感知哈希（dHash）为键
+- 持久化图例定义与模板库描述子，命中时跳过图例OCR与轮廓提取
+- 查找按汉明距离容忍渲染差异（抗锯齿、扫描噪声、轻微偏移）
+- 多个识别进程共用同一目录：写索引时加文件锁，先重读磁盘上的索引再合并写回，互不覆盖
+"""
+import contextlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from PIDLegendMatcher import LegendTemplateBank
+
+try:
+    import fcntl
+except ImportError:  # Windows：不加锁
+    fcntl = None
+
+# dHash尺寸：HASH_SIZE×HASH_SIZE位
+HASH_SIZE = 16
+
+# 判定为同一图例的最大汉明距离（256位中）
+MAX_HASH_DISTANCE = 12
+
+LIBRARY_VERSION = 1
+
+
+def legend_region(height: int, width: int) -> Tuple[int, int, int, int]:
+    """图例区域 (x1, y1, x2, y2)：底部25%、左侧60%（右侧40%为标题栏）"""
+    return 0, int(height * 0.75), int(width * 0.60), height
+
+
+def legend_hash(gray_roi: np.ndarray) -> Optional[str]:
+    """图例区域的差分哈希（十六进制字符串），区域内无内容时返回None
+
+    先裁剪到墨迹外接矩形：图例区域大部分是空白，直接缩放时空白主导哈希，不同图例会碰撞。
+    """
+    ys, xs = np.nonzero(gray_roi < 128)
+    if len(ys) == 0:
+        return None
+    ink = gray_roi[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+    small = cv2.resize(ink, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return np.packbits(bits).tobytes().hex()
+
+
+def hash_distance(a: str, b: str) -> int:
+    """两个哈希的汉明距离"""
+    x = np.frombuffer(bytes.fromhex(a), dtype=np.uint8)
+    y = np.frombuffer(bytes.fromhex(b), dtype=np.uint8)
+    if len(x) != len(y):
+        return HASH_SIZE * HASH_SIZE
+    return int(np.unpackbits(x ^ y).sum())
+
+
+def _json_default(obj):
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f'无法序列化: {type(obj)}')
+
+
+class PIDLegendLibrary:
+    """图例库：目录下 index.json 记录哈希 → 条目文件，每个条目一个JSON文件"""
+
+    def __init__(self, library_dir: str, max_distance: int = MAX_HASH_DISTANCE):
+        self.library_dir = Path(library_dir)
+        self.library_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.library_dir / 'index.json'
+        self.lock_path = self.library_dir / 'index.lock'
+        self.max_distance = max_distance
+        self.index = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict]:
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"  ⚠️  图例库索引读取失败: {e}")
+            return {}
+        if data.get('version') != LIBRARY_VERSION:
+            return {}
+        return data.get('entries', {})
+
+    @contextlib.contextmanager
+    def _index_lock(self):
+        """索引文件的排他锁（跨进程）"""
+        with open(self.lock_path, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _save_index(self):
+        tmp = self.index_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': LIBRARY_VERSION, 'entries': self.index}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.index_path)
+
+    def find(self, key: str) -> Optional[str]:
+        """查找与key汉明距离最近且不超过阈值的已存哈希"""
+        if key in self.index:
+            return key
+        best_key, best_dist = None, self.max_distance + 1
+        for stored in self.index:
+            dist = hash_distance(key, stored)
+            if dist < best_dist:
+                best_key, best_dist = stored, dist
+        return best_key
+
+    def lookup(self, key: str) -> Optional[Tuple[List[Dict], LegendTemplateBank]]:
+        """命中时返回 (图例定义, 模板库)；内存中的索引未命中时重读磁盘索引（其它进程可能已写入）"""
+        stored = self.find(key)
+        if stored is None:
+            self.index = self._load_index()
+            stored = self.find(key)
+        if stored is None:
+            return None
+        try:
+            with open(self.library_dir / self.index[stored]['file'], 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"  ⚠️  图例库条目读取失败: {e}")
+            return None
+        return entry['legend_symbols'], LegendTemplateBank.from_dict(entry['template_bank'])
+
+    def store(self, key: str, legend_symbols: List[Dict], template_bank: LegendTemplateBank,
+              source: str = '') -> str:
+        """写入条目（同键覆盖），返回条目文件名"""
+        filename = f'{key}.json'
+        entry = {
+            'key': key,
+            'source': source,
+            'legend_symbols': legend_symbols,
+            'template_bank': template_bank.to_dict()
+        }
+        tmp = self.library_dir / f'{filename}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, default=_json_default)
+        os.replace(tmp, self.library_dir / filename)
+
+        with self._index_lock():
+            # 合并其它进程在本实例加载索引之后写入的条目
+            self.index = self._load_index()
+            self.index[key] = {
+                'file': filename,
+                'source': source,
+                'symbols': len(legend_symbols),
+                'templates': len(template_bank),
+                'created_at': time.strftime('%Y-%m-%d %H:%M:%S')
+            }
+            self._save_index()
+        return filename
+
+    def __len__(self):
+        return len(self.index)
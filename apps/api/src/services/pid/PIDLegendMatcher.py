@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+PID图例模板匹配
+- 每张图纸只构建一次模板库：图例符号轮廓 → 旋转/缩放不变描述子（log Hu矩 + 矩形度）
+- 候选轮廓批量计算描述子，与模板库做向量化距离矩阵匹配
+- 模板库可序列化（纯NumPy数组 + 字典），供多进程页面识别复用、图例库持久化
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from PIDContourStats import contour_hu_moments, contour_stats
+
+# Hu矩对数变换的尺度：sign(h)·log10(1 + |h|/HU_EPS)，近零分量连续趋于0
+# （对称图形的高阶矩≈0，直接取对数只剩噪声；cv2.matchShapes跳过这些分量，会让三角形与菱形难以区分）
+HU_EPS = 1e-5
+
+# 矩形度（面积/外接矩形面积）的权重：Hu矩旋转不变，无法区分菱形与正方形，矩形度可以
+EXTENT_WEIGHT = 2.0
+
+# 已分类符号的图例标注阈值、未分类候选的提升阈值（距离越小越相似）
+MATCH_THRESHOLD = 0.6
+PROMOTE_THRESHOLD = 0.2
+
+# 歧义判定：最佳距离须小于次佳距离的该比例，否则视为无可信匹配
+AMBIGUITY_RATIO = 0.7
+
+
+def shape_descriptors(contours: Sequence[np.ndarray]) -> np.ndarray:
+    """轮廓描述子 N×8：7维对数Hu矩 + 矩形度"""
+    hu = contour_hu_moments(contours)
+    stats = contour_stats(contours)
+
+    log_hu = np.sign(hu) * np.log10(1 + np.abs(hu) / HU_EPS)
+
+    bbox_area = (stats['w'] * stats['h']).astype(np.float64)
+    extent = np.divide(stats['area'], bbox_area, out=np.zeros_like(stats['area']), where=bbox_area > 0)
+    return np.column_stack([log_hu, extent])
+
+
+def descriptor_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """描述子距离矩阵 (N×T)：对数Hu矩L1距离 + 加权矩形度差"""
+    hu_dist = np.abs(a[:, None, :7] - b[None, :, :7]).sum(axis=2)
+    extent_dist = np.abs(a[:, None, 7] - b[None, :, 7])
+    return hu_dist + EXTENT_WEIGHT * extent_dist
+
+
+class LegendTemplateBank:
+    """图例模板库"""
+
+    def __init__(self, descriptors: np.ndarray = None, entries: List[Dict] = None):
+        self.descriptors = descriptors if descriptors is not None else np.empty((0, 8))
+        # 每个模板的元数据：type / description / vertices
+        self.entries = entries or []
+
+    @classmethod
+    def from_templates(cls, templates: List[Dict]) -> 'LegendTemplateBank':
+        """从图例提取结果构建（templates中每项含 contour / type / description / vertices）"""
+        templates = [t for t in templates if t.get('contour') is not None]
+        if not templates:
+            return cls()
+
+        descriptors = shape_descriptors([t['contour'] for t in templates])
+        entries = [
+            {
+                'type': t.get('type', 'unknown'),
+                'description': t.get('description', ''),
+                'vertices': int(t.get('vertices', 0))
+            }
+            for t in templates
+        ]
+        return cls(descriptors, entries)
+
+    def to_dict(self) -> Dict:
+        """JSON可序列化形式"""
+        return {'descriptors': self.descriptors.tolist(), 'entries': self.entries}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LegendTemplateBank':
+        descriptors = np.asarray(data.get('descriptors', []), dtype=np.float64).reshape(-1, 8)
+        return cls(descriptors, list(data.get('entries', [])))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def match(self, descriptors: np.ndarray,
+              threshold: float = MATCH_THRESHOLD) -> Tuple[np.ndarray, np.ndarray]:
+        """每个候选的最佳模板下标及距离（无可信匹配时下标为-1）"""
+        n = len(descriptors)
+        if n == 0 or len(self) == 0:
+            return np.full(n, -1, dtype=np.int64), np.full(n, np.inf)
+
+        dist = descriptor_distance(descriptors, self.descriptors)
+        rows = np.arange(n)
+        best = np.argmin(dist, axis=1)
+        best_dist = dist[rows, best]
+
+        confident = best_dist < threshold
+        if len(self) > 1:
+            dist[rows, best] = np.inf
+            confident &= best_dist < AMBIGUITY_RATIO * dist.min(axis=1)
+
+        return np.where(confident, best, -1), best_dist
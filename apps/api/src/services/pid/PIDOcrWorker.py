@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+PID OCR工作服务（EasyOCR）
+- 独立进程启动时加载一次模型（可预热），之后常驻
+- 通过本地 multiprocessing 管理器暴露请求队列，多个识别进程共享同一个模型实例
+- 请求以批为单位：一次提交一张图纸的所有ROI，一次往返取回全部结果
+- 未配置工作服务时回退为进程内懒加载的阅读器，接口相同
+
+启动: python PIDOcrWorker.py [--address 127.0.0.1:50070] [--gpu] [--no-warmup]
+客户端: 设置 PID_OCR_WORKER_ADDRESS=127.0.0.1:50070（可选 PID_OCR_WORKER_AUTHKEY）
+管理器通道使用pickle：内置默认密钥只允许监听本机回环地址，监听其它地址时必须设置 PID_OCR_WORKER_AUTHKEY
+"""
+import ipaddress
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from multiprocessing import AuthenticationError
+from multiprocessing.managers import BaseManager
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import easyocr
+    EASYOCR_AVAILABLE = True
+except ImportError:
+    print("⚠️  EasyOCR未安装，图例文字识别受限")
+    EASYOCR_AVAILABLE = False
+
+DEFAULT_ADDRESS = '127.0.0.1:50070'
+# 内置默认密钥（公开已知，仅限回环地址）
+DEFAULT_AUTHKEY = 'pid-ocr'
+
+# 进程内阅读器（本地回退模式，每个进程只加载一次）
+_local_reader = None
+_local_reader_lock = threading.Lock()
+
+
+def _parse_address(address: str) -> Tuple[str, int]:
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+def _is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host.strip('[]')).is_loopback
+    except ValueError:
+        return False
+
+
+def _load_reader(languages: Sequence[str] = ('en',), gpu: bool = False):
+    print(f"  📥 加载EasyOCR模型 ({','.join(languages)}, gpu={gpu})...")
+    start = time.time()
+    reader = easyocr.Reader(list(languages), gpu=gpu)
+    print(f"  ✅ EasyOCR模型加载完成 ({time.time() - start:.1f}s)")
+    return reader
+
+
+def _warmup_reader(reader):
+    """用空白小图跑一次推理，触发模型首轮初始化"""
+    reader.readtext(np.full((32, 128, 3), 255, dtype=np.uint8), detail=0)
+
+
+def _readtext_batch(reader, images: Sequence[np.ndarray], detail: int) -> List[List]:
+    """逐ROI识别（ROI尺寸不一，readtext_batched会统一缩放，坐标不再对应原图）"""
+    return [reader.readtext(image, detail=detail) for image in images]
+
+
+class LocalOcrReader:
+    """进程内阅读器：首次使用时加载模型"""
+
+    available = EASYOCR_AVAILABLE
+
+    def __init__(self, languages: Sequence[str] = ('en',), gpu: bool = False):
+        self.languages = tuple(languages)
+        self.gpu = gpu
+
+    def _reader(self):
+        global _local_reader
+        with _local_reader_lock:
+            if _local_reader is None:
+                _local_reader = _load_reader(self.languages, self.gpu)
+        return _local_reader
+
+    def warmup(self):
+        if self.available:
+            _warmup_reader(self._reader())
+
+    def readtext_batch(self, images: Sequence[np.ndarray], detail: int = 1) -> List[List]:
+        if not self.available:
+            raise RuntimeError('EasyOCR未安装')
+        return _readtext_batch(self._reader(), images, detail)
+
+
+# ---------------------------------------------------------------- 工作服务
+
+class _OcrManager(BaseManager):
+    pass
+
+
+class OcrClient:
+    """工作服务客户端：请求放入共享队列，结果从本客户端的专属响应队列取回"""
+
+    available = True
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, authkey: str = DEFAULT_AUTHKEY, timeout: float = 300):
+        _OcrManager.register('get_request_queue')
+        _OcrManager.register('get_response_queue')
+        _OcrManager.register('release_response_queue')
+        self.manager = _OcrManager(address=_parse_address(address), authkey=authkey.encode())
+        self.manager.connect()
+        self.timeout = timeout
+        self.client_id = uuid.uuid4().hex
+        self.requests = self.manager.get_request_queue()
+        self.responses = self.manager.get_response_queue(self.client_id)
+
+    def warmup(self):
+        """模型在工作服务启动时已加载"""
+
+    def readtext_batch(self, images: Sequence[np.ndarray], detail: int = 1) -> List[List]:
+        request_id = uuid.uuid4().hex
+        self.requests.put((self.client_id, request_id, list(images), detail))
+        while True:
+            try:
+                response_id, ok, payload = self.responses.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f'OCR工作服务{self.timeout}s内无响应')
+            if response_id != request_id:
+                continue  # 之前超时请求的迟到结果
+            if not ok:
+                raise RuntimeError(f'OCR工作服务识别失败: {payload}')
+            return payload
+
+    def close(self):
+        try:
+            self.manager.release_response_queue(self.client_id)
+        except (OSError, EOFError, AuthenticationError):
+            pass
+
+
+def get_ocr_reader(address: str = None, authkey: str = None):
+    """配置了工作服务地址时连接工作服务，连接失败或未配置时回退为进程内阅读器"""
+    address = address or os.getenv('PID_OCR_WORKER_ADDRESS')
+    if address:
+        try:
+            return OcrClient(address, authkey or os.getenv('PID_OCR_WORKER_AUTHKEY', DEFAULT_AUTHKEY))
+        except (OSError, EOFError, AuthenticationError) as e:
+            print(f"  ⚠️  OCR工作服务连接失败({address}): {e}，使用进程内EasyOCR")
+    return LocalOcrReader()
+
+
+def serve(address: str = DEFAULT_ADDRESS, authkey: str = None,
+          languages: Sequence[str] = ('en',), gpu: bool = False, warmup: bool = True):
+    """启动OCR工作服务（阻塞）：管理器线程收发队列，主循环串行执行识别
+
+    authkey为None时使用内置默认密钥，此时只允许监听回环地址。
+    """
+    if not EASYOCR_AVAILABLE:
+        raise RuntimeError('EasyOCR未安装，无法启动OCR工作服务')
+    if not authkey or authkey == DEFAULT_AUTHKEY:
+        if not _is_loopback(_parse_address(address)[0]):
+            raise RuntimeError(f'监听非本机地址 {address} 时必须设置 PID_OCR_WORKER_AUTHKEY（不能使用内置默认密钥）')
+        authkey = DEFAULT_AUTHKEY
+
+    reader = _load_reader(languages, gpu)
+    if warmup:
+        _warmup_reader(reader)
+
+    requests_queue = queue.Queue()
+    response_queues = {}
+    lock = threading.Lock()
+
+    def get_response_queue(client_id: str):
+        with lock:
+            return response_queues.setdefault(client_id, queue.Queue())
+
+    def release_response_queue(client_id: str):
+        with lock:
+            response_queues.pop(client_id, None)
+
+    _OcrManager.register('get_request_queue', callable=lambda: requests_queue)
+    _OcrManager.register('get_response_queue', callable=get_response_queue)
+    _OcrManager.register('release_response_queue', callable=release_response_queue)
+    manager = _OcrManager(address=_parse_address(address), authkey=authkey.encode())
+    server = manager.get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"🚀 OCR工作服务已启动: {address}")
+
+    while True:
+        client_id, request_id, images, detail = requests_queue.get()
+        try:
+            response = (request_id, True, _readtext_batch(reader, images, detail))
+        except Exception as e:
+            response = (request_id, False, str(e))
+        get_response_queue(client_id).put(response)
+
+
+def main():
+    args = sys.argv[1:]
+    address = os.getenv('PID_OCR_WORKER_ADDRESS', DEFAULT_ADDRESS)
+    if '--address' in args:
+        address = args[args.index('--address') + 1]
+    serve(
+        address=address,
+        authkey=os.getenv('PID_OCR_WORKER_AUTHKEY'),
+        gpu='--gpu' in args,
+        warmup='--no-warmup' not in args
+    )
+
+
+if __name__ == '__main__':
+    main()
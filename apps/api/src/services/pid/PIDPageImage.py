@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+PID页面图像
+- PyMuPDF直接渲染到NumPy缓冲区（不经过PNG落盘/解码）
+- 灰度/二值/边缘等派生图按需计算并缓存，供各识别阶段共享
+"""
+import cv2
+import numpy as np
+
+try:
+    import fitz  # PyMuPDF
+    HAS_PYMUPDF = True
+except ImportError:
+    HAS_PYMUPDF = False
+
+# 默认渲染倍率（3倍分辨率，提高OCR准确率）
+DEFAULT_ZOOM = 3
+
+
+class PIDPageImage:
+    """单页图像及其派生图缓存"""
+
+    def __init__(self, image: np.ndarray, page_num: int = 0):
+        # BGR格式，与cv2.imread结果一致
+        self.image = image
+        self.page_num = page_num
+        self._gray = None
+        self._binary = None
+        self._edges = None
+
+    @classmethod
+    def from_pdf_page(cls, page, page_num: int, zoom: float = DEFAULT_ZOOM) -> 'PIDPageImage':
+        """从PyMuPDF页面渲染"""
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        buf = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        if pix.n == 1:
+            image = cv2.cvtColor(buf, cv2.COLOR_GRAY2BGR)
+        else:
+            # RGB → BGR（cvtColor生成新数组，不再引用pixmap内存）
+            image = cv2.cvtColor(buf, cv2.COLOR_RGB2BGR)
+        return cls(image, page_num)
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @property
+    def gray(self) -> np.ndarray:
+        """灰度图"""
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def binary(self) -> np.ndarray:
+        """OTSU反相二值图（线条/文字为255）"""
+        if self._binary is None:
+            _, self._binary = cv2.threshold(self.gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        return self._binary
+
+    @property
+    def edges(self) -> np.ndarray:
+        """Canny边缘图（50/150）"""
+        if self._edges is None:
+            self._edges = cv2.Canny(self.gray, 50, 150)
+        return self._edges
+
+    def release_derivatives(self):
+        """释放派生图缓存（检测阶段结束后调用以降低内存）"""
+        self._gray = None
+        self._binary = None
+        self._edges = None
+
+    def encode_png(self, image: np.ndarray = None) -> bytes:
+        """内存中编码为PNG（用于上传OCR服务）"""
+        ok, buf = cv2.imencode('.png', self.image if image is None else image)
+        if not ok:
+            raise ValueError('PNG编码失败')
+        return buf.tobytes()
+
+
+def get_pdf_page_count(pdf_path: str) -> int:
+    """PDF页数"""
+    if not HAS_PYMUPDF:
+        return 0
+    doc = fitz.open(pdf_path)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+
+def render_pdf_page(pdf_path: str, page_num: int, zoom: float = DEFAULT_ZOOM) -> PIDPageImage:
+    """渲染PDF的单页（供页面并行的工作进程使用）"""
+    doc = fitz.open(pdf_path)
+    try:
+        return PIDPageImage.from_pdf_page(doc[page_num], page_num, zoom)
+    finally:
+        doc.close()
+
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+PID管线骨架图追踪
+- 二值图开运算提取水平/垂直线层（去除文字与小符号），整页一次取中线得到单像素骨架
+- 骨架 → 像素图：端点（1邻居）与交叉点（≥3邻居）聚类为节点，其间的骨架段为边（长度=像素数）
+- 组件端口经网格索引吸附到附近节点
+- 多源最短路（按管线长度划分各组件的“管网势力范围”），两端归属不同组件的边即为一条连接，
+  弯头沿路径自然跟随；三通/交叉点上汇合的组件两两相连；长管廊上的多个支路只连相邻组件而非两两全连
+"""
+import heapq
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from PIDSpatialIndex import GridIndex
+
+try:
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import dijkstra as sp_dijkstra
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+# 8邻域偏移
+_NEIGHBORS = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+
+
+def _run_midpoints(layer: np.ndarray, axis: int, max_width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """沿axis方向每段连续前景的中点坐标 (rows, cols)；超过max_width的粗段不是管线，跳过"""
+    fg = layer > 0
+    h, w = fg.shape
+    start = fg.copy()
+    if axis == 0:
+        start[1:] &= ~fg[:-1]
+    else:
+        start[:, 1:] &= ~fg[:, :-1]
+    rows, cols = np.nonzero(start)
+
+    # 从段首向后逐像素探测段尾（线宽只有几个像素，探测次数有上限）
+    width = np.zeros(len(rows), dtype=np.int64)
+    open_run = np.ones(len(rows), dtype=bool)
+    for k in range(1, max_width + 1):
+        r = rows + k if axis == 0 else rows
+        c = cols if axis == 0 else cols + k
+        limit = h if axis == 0 else w
+        inside = (r if axis == 0 else c) < limit
+        cont = np.zeros(len(rows), dtype=bool)
+        cont[inside] = fg[r[inside], c[inside]]
+        ended = open_run & ~cont
+        width[ended] = k
+        open_run &= cont
+        if not open_run.any():
+            break
+
+    keep = ~open_run
+    offset = (width[keep] - 1) // 2
+    if axis == 0:
+        return rows[keep] + offset, cols[keep]
+    return rows[keep], cols[keep] + offset
+
+
+def centerline(horizontal: np.ndarray, vertical: np.ndarray, max_width: int = 15) -> np.ndarray:
+    """水平/垂直线层的单像素中线骨架（0/1）
+
+    线层由水平、垂直开运算得到，笔画轴对齐：水平笔画在每列上是一段连续像素，取中点即中轴，
+    垂直笔画同理按行取中点。两组中线在交叉、弯头处相交，保持8连通。
+    与迭代细化相比一次扫描完成，工作量与图像大小成正比。
+    """
+    skeleton = np.zeros(horizontal.shape, dtype=np.uint8)
+    skeleton[_run_midpoints(horizontal, 0, max_width)] = 1
+    skeleton[_run_midpoints(vertical, 1, max_width)] = 1
+    return skeleton
+
+
+def _multi_source_dijkstra(n_nodes: int, u: np.ndarray, v: np.ndarray, w: np.ndarray,
+                           sources: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """多源最短路，返回 (距离, 最近源下标)；不可达为 (inf, -1)"""
+    if HAS_SCIPY:
+        graph = coo_matrix((w, (u, v)), shape=(n_nodes, n_nodes)).tocsr()
+        dist, _, origin = sp_dijkstra(graph, directed=False, indices=sources,
+                                      min_only=True, return_predecessors=True)
+        return dist, origin.astype(np.int64)
+
+    adjacency = [[] for _ in range(n_nodes)]
+    for a, b, weight in zip(u.tolist(), v.tolist(), w.tolist()):
+        adjacency[a].append((b, weight))
+        adjacency[b].append((a, weight))
+
+    dist = np.full(n_nodes, np.inf)
+    origin = np.full(n_nodes, -1, dtype=np.int64)
+    heap = []
+    for s in sources.tolist():
+        dist[s] = 0.0
+        origin[s] = s
+        heap.append((0.0, s))
+    heapq.heapify(heap)
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        for nxt, weight in adjacency[node]:
+            nd = d + weight
+            if nd < dist[nxt]:
+                dist[nxt] = nd
+                origin[nxt] = origin[node]
+                heapq.heappush(heap, (nd, nxt))
+    return dist, origin
+
+
+class PIDPipeTracer:
+    """管线骨架图追踪引擎"""
+
+    def __init__(self, min_line_length: int = 60, snap_radius: int = 30, border: int = 50):
+        # 线层开运算核长度：短于该长度的笔画（文字、小符号）不进入线层
+        self.min_line_length = min_line_length
+        # 端口到骨架节点的吸附半径
+        self.snap_radius = snap_radius
+        self.border = border
+
+    def line_layers(self, page) -> Tuple[np.ndarray, np.ndarray]:
+        """水平、垂直线层（排除边框、底部图例与右侧标题栏，与原管线检测的有效区域一致）"""
+        h, w = page.gray.shape
+        binary = page.binary
+        horizontal = cv2.morphologyEx(
+            binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (self.min_line_length, 1)))
+        vertical = cv2.morphologyEx(
+            binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, self.min_line_length)))
+
+        for layer in (horizontal, vertical):
+            layer[:self.border, :] = 0
+            layer[int(h * 0.75):, :] = 0
+            layer[:, :self.border] = 0
+            layer[:, int(w * 0.90):] = 0
+        return horizontal, vertical
+
+    def build_graph(self, skeleton: np.ndarray) -> Dict[str, np.ndarray]:
+        """骨架 → 节点（坐标）与边（u, v, 长度）"""
+        kernel = np.ones((3, 3), dtype=np.float32)
+        kernel[1, 1] = 0
+        neighbors = cv2.filter2D(skeleton, cv2.CV_8U, kernel, borderType=cv2.BORDER_CONSTANT)
+        node_mask = ((skeleton > 0) & (neighbors != 2) & (neighbors != 0)).astype(np.uint8)
+
+        n_nodes, node_labels = cv2.connectedComponents(node_mask, connectivity=8)
+        edge_mask = cv2.subtract(skeleton, node_mask)
+        n_edges, edge_labels = cv2.connectedComponents(edge_mask, connectivity=8)
+
+        # 节点坐标：节点像素质心（节点像素很少，不做整图统计）
+        node_ys, node_xs = np.nonzero(node_mask)
+        node_ids = node_labels[node_ys, node_xs]
+        counts = np.bincount(node_ids, minlength=n_nodes)[1:]
+        centroids = np.column_stack([
+            np.bincount(node_ids, weights=node_xs, minlength=n_nodes)[1:] / counts,
+            np.bincount(node_ids, weights=node_ys, minlength=n_nodes)[1:] / counts
+        ])
+
+        # 边段像素的8邻域中出现的节点标签 → (边段, 节点) 关联
+        ys, xs = np.nonzero(edge_mask)
+        h, w = skeleton.shape
+        pairs = []
+        for dy, dx in _NEIGHBORS:
+            ny, nx = ys + dy, xs + dx
+            inside = (ny >= 0) & (ny < h) & (nx >= 0) & (nx < w)
+            labels = node_labels[ny[inside], nx[inside]]
+            hit = labels > 0
+            pairs.append(np.column_stack([edge_labels[ys[inside][hit], xs[inside][hit]], labels[hit]]))
+        pairs = np.unique(np.concatenate(pairs), axis=0) if pairs else np.empty((0, 2), dtype=np.int64)
+        lengths = np.bincount(edge_labels[ys, xs], minlength=n_edges)
+
+        # 每个边段连接其关联的节点（通常恰好2个；只关联1个的是毛刺或闭环，忽略）
+        u, v, weight = [], [], []
+        starts = np.flatnonzero(np.r_[True, pairs[1:, 0] != pairs[:-1, 0]]) if len(pairs) else []
+        bounds = list(starts) + [len(pairs)]
+        for k in range(len(starts)):
+            edge = pairs[bounds[k], 0]
+            nodes = pairs[bounds[k]:bounds[k + 1], 1]
+            for i in range(len(nodes)):
+                for j in range(i + 1, len(nodes)):
+                    u.append(nodes[i] - 1)
+                    v.append(nodes[j] - 1)
+                    weight.append(lengths[edge] + 1)
+
+        # 直接相邻的节点（无中间边段）已在连通域标记时合并为同一节点
+        return {
+            'nodes': centroids,
+            'u': np.asarray(u, dtype=np.int64),
+            'v': np.asarray(v, dtype=np.int64),
+            'weight': np.asarray(weight, dtype=np.float64)
+        }
+
+    def snap_components(self, nodes: np.ndarray, components: List[Dict]) -> np.ndarray:
+        """每个节点吸附到最近的组件锚点（端口与中心），返回节点 → 组件下标（-1为未吸附）"""
+        owner = np.full(len(nodes), -1, dtype=np.int64)
+        best = np.full(len(nodes), np.inf)
+        if len(nodes) == 0:
+            return owner
+
+        index = GridIndex(self.snap_radius)
+        for i, (x, y) in enumerate(nodes):
+            index.insert(i, x, y)
+
+        for c, comp in enumerate(components):
+            anchors = list(comp.get('ports') or [])
+            if comp.get('position'):
+                anchors.append(comp['position'])
+            for ax, ay in anchors:
+                for i in index.candidates(ax, ay, self.snap_radius):
+                    d = np.hypot(nodes[i][0] - ax, nodes[i][1] - ay)
+                    if d < self.snap_radius and d < best[i]:
+                        best[i] = d
+                        owner[i] = c
+        return owner
+
+    def _junction_pairs(self, n_nodes: int, u: np.ndarray, v: np.ndarray, weight: np.ndarray,
+                        region: np.ndarray, dist: np.ndarray) -> Dict[Tuple[int, int], float]:
+        """度≥3节点上交汇的组件对及经该节点的管线长度"""
+        degree = np.bincount(u, minlength=n_nodes) + np.bincount(v, minlength=n_nodes)
+        # 每个交叉点到各组件的最短长度：经相邻节点（边长+相邻节点距离）或自身归属
+        reach: Dict[int, Dict[int, float]] = {}
+        for a, b, w in zip(np.r_[u, v].tolist(), np.r_[v, u].tolist(), np.r_[weight, weight].tolist()):
+            if degree[a] < 3 or region[b] < 0:
+                continue
+            by_region = reach.setdefault(a, {})
+            d = w + dist[b]
+            if d < by_region.get(region[b], np.inf):
+                by_region[region[b]] = d
+
+        pairs = {}
+        for node, by_region in reach.items():
+            if region[node] >= 0:
+                by_region[region[node]] = min(by_region.get(region[node], np.inf), dist[node])
+            members = sorted(by_region)
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    key = (members[x], members[y])
+                    d = by_region[members[x]] + by_region[members[y]]
+                    if d < pairs.get(key, np.inf):
+                        pairs[key] = d
+        return pairs
+
+    def skeleton_graph(self, page) -> Dict[str, np.ndarray]:
+        """页面 → 管线骨架图（与组件无关，可在页面识别时构建，合并组件后再追踪）"""
+        skeleton = centerline(*self.line_layers(page))
+        graph = self.build_graph(skeleton)
+        del skeleton
+        print(f"  🧵 管线骨架图: {len(graph['nodes'])} 个节点, {len(graph['u'])} 条边")
+        return graph
+
+    def trace(self, page, components: List[Dict]) -> List[Dict]:
+        """追踪管线连接（只处理与该页同页的组件）"""
+        return self.trace_graph(self.skeleton_graph(page), components, page.page_num)
+
+    def trace_graph(self, graph: Dict[str, np.ndarray], components: List[Dict], page_num: int) -> List[Dict]:
+        """在已构建的骨架图上追踪管线连接（只处理第page_num页的组件）"""
+        page_components = [c for c in components if c.get('page', page_num) == page_num and c.get('position')]
+        if len(page_components) < 2:
+            return []
+
+        nodes = graph['nodes']
+        owner = self.snap_components(nodes, page_components)
+        sources = np.flatnonzero(owner >= 0)
+        if len(sources) == 0 or len(graph['u']) == 0:
+            return []
+
+        dist, origin = _multi_source_dijkstra(len(nodes), graph['u'], graph['v'], graph['weight'], sources)
+        reached = origin >= 0
+        region = np.full(len(nodes), -1, dtype=np.int64)
+        region[reached] = owner[origin[reached]]
+
+        # 两端属于不同组件势力范围的边 → 组件对，取最短管线长度
+        u, v, weight = graph['u'], graph['v'], graph['weight']
+        a, b = region[u], region[v]
+        cross = (a >= 0) & (b >= 0) & (a != b)
+        lo = np.minimum(a[cross], b[cross])
+        hi = np.maximum(a[cross], b[cross])
+        length = dist[u[cross]] + weight[cross] + dist[v[cross]]
+
+        shortest = {}
+        for i, j, d in zip(lo.tolist(), hi.tolist(), length.tolist()):
+            if d < shortest.get((i, j), np.inf):
+                shortest[(i, j)] = d
+
+        # 三通/交叉点：汇于同一交叉点的各组件两两相连（最短路划分只会把交叉点归给其中一个组件）
+        for (i, j), d in self._junction_pairs(len(nodes), u, v, weight, region, dist).items():
+            if d < shortest.get((i, j), np.inf):
+                shortest[(i, j)] = d
+
+        connections = []
+        for (i, j), d in sorted(shortest.items()):
+            comp1 = page_components[i]
+            comp2 = page_components[j]
+            connections.append({
+                'from': comp1['tag_number'],
+                'to': comp2['tag_number'],
+                'line_length': round(d, 2),
+                'confidence': 0.85,
+                'page': comp1.get('page', page_num),
+                'source': 'pipe_trace'
+            })
+        return connections
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+PID装置级图（多图纸合并）
+- 每张图纸（sheet）的组件/连接单独登记；位号索引记录每个位号出现在哪些图纸上
+- 不同图纸上的相同位号合并为同一节点；跨图连接符（off-page connector，如 OPC-12）按位号配对，
+  把各图纸的管线串成装置级的图，只出现在一张图纸上的连接符列为未配对
+- 自动生成的位号（source=auto_generated）只在本图纸内有效，不跨图合并
+- 单张图纸重新识别后 update_sheet 只撤销该图纸原有的节点/边并登记新的，
+  代价与该图纸的规模成正比，不重建整个装置图
+"""
+import os
+import re
+from typing import Dict, Hashable, List, Tuple
+
+from PIDGraphCore import PIDGraphCore
+
+# 跨图连接符位号（也加入识别服务的位号正则）
+OFF_PAGE_PATTERN = r'(?:OPC|OPR|OFC)-\d+[A-Z]?'
+OFF_PAGE_TYPES = ('off_page_connector',)
+
+
+def split_sheets(components: List[Dict], connections: List[Dict]) -> Dict[Hashable, Tuple[List[Dict], List[Dict]]]:
+    """按页码拆分识别结果 → {页码: (组件, 连接)}，按页码排序
+
+    连接无页码时按两端位号推断：取两端共同所在的页，否则取只出现在一页上的一端所在的页；
+    共用位号出现在多页、无法确定页码时抛出 ValueError（此类连接须带 page）。
+    """
+    pages: Dict[str, Dict[Hashable, None]] = {}
+    sheets: Dict[Hashable, Tuple[List[Dict], List[Dict]]] = {}
+    for comp in components:
+        pages.setdefault(comp['tag_number'], {})[comp.get('page')] = None
+        sheets.setdefault(comp.get('page'), ([], []))[0].append(comp)
+    for conn in connections:
+        if 'page' in conn:
+            page = conn['page']
+        else:
+            page = _connection_page(pages.get(conn['from'], {}), pages.get(conn['to'], {}))
+            if page is _AMBIGUOUS:
+                raise ValueError(f"连接 {conn['from']}→{conn['to']} 无页码，且两端位号出现在多页上，无法确定所属图纸")
+        sheets.setdefault(page, ([], []))[1].append(conn)
+    return dict(sorted(sheets.items(), key=lambda item: (item[0] is None, item[0] or 0)))
+
+
+_AMBIGUOUS = object()
+
+
+def _connection_page(from_pages: Dict, to_pages: Dict):
+    """无页码连接的所属页：两端共同所在的页，否则起点（再否则终点）唯一所在的页"""
+    for candidates in ([p for p in from_pages if p in to_pages], list(from_pages), list(to_pages)):
+        if len(candidates) == 1:
+            return candidates[0]
+        if candidates:
+            return _AMBIGUOUS
+    return None
+
+
+def _sheet_label(sheet: Hashable) -> str:
+    return '/'.join(str(s) for s in sheet) if isinstance(sheet, tuple) else str(sheet)
+
+
+class PIDPlantGraph:
+    """装置级图
+
+    节点键：跨图纸共用的位号为位号字符串，自动位号为 (图纸, 位号)。
+    _nodes: 节点键 → {图纸: 组件或None（只在连接中出现）}，即位号索引；
+    _edges: (起点键, 终点键) → {图纸: 连接}。
+    导出（components / connections）按图纸登记顺序、图纸内原顺序排列，与更新历史无关；
+    同一节点的属性取登记顺序最靠前、画有该组件的图纸。
+    """
+
+    def __init__(self, off_page_pattern: str = None):
+        self.off_page_pattern = re.compile(off_page_pattern or os.getenv('PID_OFF_PAGE_PATTERN', OFF_PAGE_PATTERN))
+        self._sheets: Dict[Hashable, Dict] = {}
+        self._order: Dict[Hashable, int] = {}
+        self._next_order = 0
+        self._nodes: Dict[Hashable, Dict[Hashable, Dict]] = {}
+        self._edges: Dict[Tuple, Dict[Hashable, Dict]] = {}
+        # 自动位号 → 使用它的图纸、其中登记最早的图纸（导出时判断是否重名）
+        self._auto_sheets: Dict[str, set] = {}
+        self._auto_first: Dict[str, Hashable] = {}
+        # 跨图连接符节点键 → 画有该连接符的图纸
+        self._connectors: Dict[Hashable, set] = {}
+
+    # ------------------------------------------------------------ 登记/更新
+
+    @property
+    def sheets(self) -> List[Hashable]:
+        return list(self._sheets)
+
+    def is_connector(self, component: Dict) -> bool:
+        return (component.get('symbol_type') in OFF_PAGE_TYPES
+                or self.off_page_pattern.fullmatch(component.get('tag_number', '')) is not None)
+
+    def update_sheet(self, sheet: Hashable, components: List[Dict], connections: List[Dict]) -> Dict:
+        """登记或替换一张图纸，返回变化：新增/移除的节点与边（导出名）、受影响的跨图连接符"""
+        old_nodes, old_edges, old_connectors = self._remove(sheet)
+        if sheet not in self._order:
+            self._order[sheet] = self._next_order
+            self._next_order += 1
+
+        local: Dict[str, Hashable] = {}
+        nodes: Dict[Hashable, None] = {}
+        referenced: Dict[Hashable, None] = {}
+        connectors = set()
+        for comp in components:
+            tag = comp['tag_number']
+            key = (sheet, tag) if comp.get('source') == 'auto_generated' else tag
+            local[tag] = key
+            nodes[key] = None
+            self._nodes.setdefault(key, {})[sheet] = comp
+            if isinstance(key, tuple):
+                self._auto_sheets.setdefault(tag, set()).add(sheet)
+                first = self._auto_first.get(tag)
+                if first is None or self._order[sheet] < self._order[first]:
+                    self._auto_first[tag] = sheet
+            elif self.is_connector(comp):
+                connectors.add(key)
+                self._connectors.setdefault(key, set()).add(sheet)
+
+        edges: Dict[Tuple, None] = {}
+        for conn in connections:
+            a, b = local.get(conn['from'], conn['from']), local.get(conn['to'], conn['to'])
+            for key in (a, b):
+                if key not in nodes and key not in referenced:
+                    referenced[key] = None
+                    self._nodes.setdefault(key, {}).setdefault(sheet, None)
+            edges[(a, b)] = None
+            self._edges.setdefault((a, b), {})[sheet] = conn
+
+        self._sheets[sheet] = {'nodes': list(nodes), 'referenced': list(referenced), 'edges': list(edges)}
+
+        new_nodes = set(nodes) | set(referenced)
+        return {
+            'sheet': sheet,
+            'added_nodes': [self.name(k) for k in new_nodes - old_nodes if len(self._nodes[k]) == 1],
+            'removed_nodes': [self.name(k) for k in old_nodes - new_nodes if k not in self._nodes],
+            'added_edges': [(self.name(a), self.name(b)) for a, b in edges if (a, b) not in old_edges
+                            and len(self._edges[(a, b)]) == 1],
+            'removed_edges': [(self.name(a), self.name(b)) for a, b in old_edges - set(edges)
+                              if (a, b) not in self._edges],
+            'connectors': {self.name(k): self._connector_status(k) for k in sorted(connectors | old_connectors)}
+        }
+
+    def remove_sheet(self, sheet: Hashable) -> bool:
+        if sheet not in self._sheets:
+            return False
+        self._remove(sheet)
+        del self._sheets[sheet]
+        del self._order[sheet]
+        return True
+
+    def add_document(self, document: Hashable, components: List[Dict], connections: List[Dict]) -> List[Dict]:
+        """按页登记一份识别结果，图纸标识为 (document, 页码)；该文档已不存在的页从装置图中移除
+
+        无页码且无法按两端位号确定所属页的连接抛出 ValueError（见 split_sheets）。
+        """
+        sheets = split_sheets(components, connections)
+        changes = [self.update_sheet((document, page), comps, conns) for page, (comps, conns) in sheets.items()]
+        for sheet in self.sheets:
+            if isinstance(sheet, tuple) and sheet[0] == document and sheet[1] not in sheets:
+                self.remove_sheet(sheet)
+        return changes
+
+    def _remove(self, sheet: Hashable) -> Tuple[set, set, set]:
+        """撤销一张图纸的节点/边，返回其原有的节点键、边、连接符"""
+        entry = self._sheets.get(sheet)
+        if entry is None:
+            return set(), set(), set()
+
+        connectors = set()
+        for key in entry['nodes'] + entry['referenced']:
+            occurrences = self._nodes[key]
+            comp = occurrences.pop(sheet, None)
+            if not occurrences:
+                del self._nodes[key]
+            if isinstance(key, tuple):
+                self._remove_auto(key[1], sheet)
+            elif comp is not None and key in self._connectors and sheet in self._connectors[key]:
+                connectors.add(key)
+                self._remove_from(self._connectors, key, sheet)
+        for edge in entry['edges']:
+            occurrences = self._edges[edge]
+            occurrences.pop(sheet, None)
+            if not occurrences:
+                del self._edges[edge]
+        nodes, edges = set(entry['nodes']) | set(entry['referenced']), set(entry['edges'])
+        entry['nodes'], entry['referenced'], entry['edges'] = [], [], []
+        return nodes, edges, connectors
+
+    def _remove_auto(self, tag: str, sheet: Hashable):
+        self._remove_from(self._auto_sheets, tag, sheet)
+        if tag not in self._auto_sheets:
+            self._auto_first.pop(tag, None)
+        elif self._auto_first.get(tag) == sheet:
+            # 只有移除的恰是登记最早的图纸时才重新求最小值
+            self._auto_first[tag] = min(self._auto_sheets[tag], key=self._order.__getitem__)
+
+    @staticmethod
+    def _remove_from(index: Dict, key, sheet):
+        sheets = index.get(key)
+        if sheets is not None:
+            sheets.discard(sheet)
+            if not sheets:
+                del index[key]
+
+    # ------------------------------------------------------------ 查询
+
+    def name(self, key: Hashable) -> str:
+        """导出名：自动位号与共用位号重名、或与登记更早的图纸上的自动位号重名时，加 @图纸 后缀"""
+        if not isinstance(key, tuple):
+            return key
+        sheet, tag = key
+        if tag in self._nodes or self._auto_first.get(tag, sheet) != sheet:
+            return f'{tag}@{_sheet_label(sheet)}'
+        return tag
+
+    def lookup(self, tag: str) -> List[Dict]:
+        """位号索引：位号出现的所有图纸 → [{'sheet', 'node', 'component'}]，按图纸登记顺序"""
+        hits = [(sheet, tag, comp) for sheet, comp in self._nodes.get(tag, {}).items()]
+        hits += [(sheet, (sheet, tag), self._nodes[(sheet, tag)][sheet]) for sheet in self._auto_sheets.get(tag, ())]
+        hits.sort(key=lambda hit: self._order[hit[0]])
+        return [{'sheet': sheet, 'node': self.name(key), 'component': comp} for sheet, key, comp in hits]
+
+    def shared_tags(self) -> List[str]:
+        """出现在多张图纸上的位号（跨图连接符除外）"""
+        return [key for key, occurrences in self._nodes.items()
+                if not isinstance(key, tuple) and key not in self._connectors and len(occurrences) > 1]
+
+    def connectors(self) -> Dict[str, List[Dict]]:
+        """跨图连接符配对情况：画在两张及以上图纸上为已配对，否则为未配对"""
+        resolved, unresolved = [], []
+        for key in sorted(self._connectors):
+            status = self._connector_status(key)
+            (resolved if status['resolved'] else unresolved).append(dict(status, tag=key))
+        return {'resolved': resolved, 'unresolved': unresolved}
+
+    def _connector_status(self, key: Hashable) -> Dict:
+        sheets = sorted(self._connectors.get(key, ()), key=self._order.__getitem__)
+        return {'sheets': sheets, 'resolved': len(sheets) > 1}
+
+    # ------------------------------------------------------------ 导出
+
+    def components(self) -> List[Dict]:
+        """合并后的组件列表（每个节点一条），附 sheets：画有该组件的图纸"""
+        merged = []
+        seen = set()
+        for entry in self._sheets.values():
+            for key in entry['nodes']:
+                if key in seen:
+                    continue
+                seen.add(key)
+                drawn = sorted((s for s, comp in self._nodes[key].items() if comp is not None),
+                               key=self._order.__getitem__)
+                merged.append(dict(self._nodes[key][drawn[0]], tag_number=self.name(key), sheets=drawn))
+        return merged
+
+    def connections(self) -> List[Dict]:
+        """合并后的连接列表（每条边一条），属性取登记顺序最靠前的图纸"""
+        merged = []
+        seen = set()
+        for sheet, entry in self._sheets.items():
+            for edge in entry['edges']:
+                if edge in seen:
+                    continue
+                seen.add(edge)
+                merged.append(dict(self._edges[edge][sheet], **{'from': self.name(edge[0]), 'to': self.name(edge[1])}))
+        return merged
+
+    def to_core(self) -> PIDGraphCore:
+        return PIDGraphCore.from_components(self.components(), self.connections())
+
+    def summary(self) -> Dict:
+        connectors = self.connectors()
+        return {
+            'sheets': len(self._sheets),
+            'nodes': len(self._nodes),
+            'edges': len(self._edges),
+            'shared_tags': len(self.shared_tags()),
+            'connectors_resolved': len(connectors['resolved']),
+            'connectors_unresolved': [c['tag'] for c in connectors['unresolved']]
+        }
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+PID标注图预览
+- 降采样预览图（最长边不超过 max_side，WebP）：网页查看器先加载预览
+- 全分辨率瓦片（tile_size 见方，WebP）+ 清单JSON：放大时按需加载可见区域，
+  不必下载整张上百MB的PNG
+"""
+import json
+from pathlib import Path
+from typing import Dict
+
+import cv2
+import numpy as np
+
+PREVIEW_MAX_SIDE = 2048
+TILE_SIZE = 512
+WEBP_QUALITY = 80
+
+
+def _write_webp(path: Path, image: np.ndarray, quality: int):
+    """写WebP；OpenCV未编译WebP支持或写入失败时抛出OSError（不返回未写出的路径）"""
+    try:
+        ok = cv2.imwrite(str(path), image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    except cv2.error as e:
+        raise OSError(f'WebP写入失败: {path}: {e}') from e
+    if not ok:
+        raise OSError(f'WebP写入失败: {path}')
+
+
+def write_preview(image: np.ndarray, path: Path, max_side: int = PREVIEW_MAX_SIDE,
+                  quality: int = WEBP_QUALITY) -> Dict:
+    """写降采样预览图，返回 {'path', 'width', 'height', 'scale'}（scale = 预览/原图）；写入失败抛出OSError"""
+    h, w = image.shape[:2]
+    scale = min(1.0, max_side / max(h, w))
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    _write_webp(path, image, quality)
+    return {'path': str(path), 'width': image.shape[1], 'height': image.shape[0], 'scale': round(scale, 6)}
+
+
+def write_tiles(image: np.ndarray, tile_dir: Path, tile_size: int = TILE_SIZE,
+                quality: int = WEBP_QUALITY) -> Dict:
+    """按行列切全分辨率瓦片（{行}_{列}.webp），写清单 manifest.json，返回清单；任一瓦片写入失败抛出OSError"""
+    tile_dir.mkdir(parents=True, exist_ok=True)
+    h, w = image.shape[:2]
+    rows = (h + tile_size - 1) // tile_size
+    cols = (w + tile_size - 1) // tile_size
+    for r in range(rows):
+        for c in range(cols):
+            tile = image[r * tile_size:(r + 1) * tile_size, c * tile_size:(c + 1) * tile_size]
+            _write_webp(tile_dir / f'{r}_{c}.webp', tile, quality)
+
+    manifest = {
+        'width': w,
+        'height': h,
+        'tile_size': tile_size,
+        'rows': rows,
+        'cols': cols,
+        'format': 'webp',
+        'pattern': '{row}_{col}.webp'
+    }
+    with open(tile_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return dict(manifest, path=str(tile_dir / 'manifest.json'))
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+PID识别结果缓存（持久化）
+- 图纸以PDF内容的sha256标识，与文件名、路径无关
+- 按阶段缓存（图例、逐页识别、合并/连接），每个阶段的键 = 图纸哈希 + 阶段名 + 影响该阶段的配置 + 版本，
+  只改动某一阶段的参数时，其余阶段直接命中
+- 结构化数据存紧凑JSON，数值数组（如图例模板描述子）存同名NPZ
+- 元组（端口、bbox等坐标）在JSON中带标记保存，读出后仍为元组，命中与未命中时返回的对象一致
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+CACHE_VERSION = 2
+
+_CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path: str) -> str:
+    """文件内容的sha256（分块读取）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _json_default(obj):
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f'无法序列化: {type(obj)}')
+
+
+_TUPLE_KEY = '__tuple__'
+
+
+def _encode_tuples(obj):
+    """元组 → {'__tuple__': [...]}（json默认把元组写成列表）"""
+    if isinstance(obj, tuple):
+        return {_TUPLE_KEY: [_encode_tuples(v) for v in obj]}
+    if isinstance(obj, list):
+        return [_encode_tuples(v) for v in obj]
+    if isinstance(obj, dict):
+        return {k: _encode_tuples(v) for k, v in obj.items()}
+    return obj
+
+
+def _decode_tuples(obj: Dict):
+    if len(obj) == 1 and _TUPLE_KEY in obj:
+        return tuple(obj[_TUPLE_KEY])
+    return obj
+
+
+class PIDRecognitionCache:
+    """识别缓存：目录下每张图纸一个子目录，每个阶段条目一个JSON（可附带NPZ）"""
+
+    def __init__(self, cache_dir: str, version=None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.version = version
+        # (路径, 修改时间, 大小) → sha256，同一进程内不重复读取PDF
+        self._document_keys: Dict[Tuple[str, int, int], str] = {}
+
+    def document_key(self, pdf_path: str) -> str:
+        stat = os.stat(pdf_path)
+        memo = (str(Path(pdf_path).resolve()), stat.st_mtime_ns, stat.st_size)
+        if memo not in self._document_keys:
+            self._document_keys[memo] = file_sha256(pdf_path)
+        return self._document_keys[memo]
+
+    def stage_key(self, document: str, stage: str, config: Dict) -> str:
+        """阶段键：图纸哈希 + 阶段名 + 阶段配置 + 缓存/识别版本"""
+        payload = json.dumps({
+            'document': document,
+            'stage': stage,
+            'config': config,
+            'cache_version': CACHE_VERSION,
+            'version': self.version
+        }, sort_keys=True, default=_json_default)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+    def _paths(self, document: str, stage: str, key: str) -> Tuple[Path, Path]:
+        base = self.cache_dir / document / f'{stage}-{key}'
+        return base.with_suffix('.json'), base.with_suffix('.npz')
+
+    def load(self, document: str, stage: str, key: str) -> Optional[Tuple[Dict, Dict[str, np.ndarray]]]:
+        """命中时返回 (数据, 数组)"""
+        json_path, npz_path = self._paths(document, stage, key)
+        if not json_path.exists():
+            return None
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f, object_hook=_decode_tuples)
+            arrays = {}
+            if npz_path.exists():
+                with np.load(npz_path, allow_pickle=False) as npz:
+                    arrays = {name: npz[name] for name in npz.files}
+        except (OSError, ValueError) as e:
+            print(f"  ⚠️  识别缓存读取失败({stage}): {e}")
+            return None
+        return data, arrays
+
+    def store(self, document: str, stage: str, key: str, data: Dict, arrays: Dict[str, np.ndarray] = None):
+        """写入阶段条目（先写临时文件再替换，并发写同一条目时不会读到半截文件）"""
+        json_path, npz_path = self._paths(document, stage, key)
+        json_path.parent.mkdir(parents=True, exist_ok=True)
+        if arrays:
+            tmp = npz_path.with_name(npz_path.stem + '.tmp.npz')
+            np.savez_compressed(tmp, **arrays)
+            os.replace(tmp, npz_path)
+        tmp = json_path.with_name(json_path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(_encode_tuples(data), f, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+        os.replace(tmp, json_path)
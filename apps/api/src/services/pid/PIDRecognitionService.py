@@ -7,21 +7,15 @@ PID图纸识别服务
 """
 import os
 import json
-import re
 import requests
 from pathlib import Path
-from typing import List, Dict, Tuple
-import tempfile
+from typing import List, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+import threading
 import uuid
 import base64
 
-try:
-    import fitz  # PyMuPDF
-    HAS_PYMUPDF = True
-except ImportError:
-    print("⚠️  PyMuPDF未安装，PDF功能受限")
-    HAS_PYMUPDF = False
-
 try:
     import cv2
     import numpy as np
@@ -30,21 +24,122 @@ except ImportError:
     print("⚠️  OpenCV未安装，符号检测功能受限")
     HAS_OPENCV = False
 
-try:
-    import easyocr
-    EASYOCR_AVAILABLE = True
-except ImportError:
-    print("⚠️  EasyOCR未安装，图例文字识别受限")
-    EASYOCR_AVAILABLE = False
+# 以下模块依赖OpenCV，只在OpenCV可用时导入（其自身的导入错误照常抛出，不当作OpenCV未安装）
+if HAS_OPENCV:
+    from PIDPageImage import HAS_PYMUPDF, PIDPageImage, get_pdf_page_count, render_pdf_page
+    from PIDSpatialIndex import GridIndex, PointGroupIndex, radius_pairs
+    from PIDContourStats import contour_stats
+    from PIDTiledDetector import PIDTiledDetector
+    from PIDLegendMatcher import LegendTemplateBank, shape_descriptors, PROMOTE_THRESHOLD
+    from PIDLegendLibrary import PIDLegendLibrary, legend_hash, legend_region
+    from PIDRemoteOcrClient import PIDRemoteOcrClient, parse_ocr_lines
+    from PIDPipeTracer import PIDPipeTracer
+    from PIDPreview import PREVIEW_MAX_SIDE, write_preview, write_tiles
+    if not HAS_PYMUPDF:
+        print("⚠️  PyMuPDF未安装，PDF功能受限")
+else:
+    HAS_PYMUPDF = False
+
+from PIDOcrWorker import get_ocr_reader
+from PIDTagLexer import TagIndex, TagLexer
+from PIDRecognitionCache import PIDRecognitionCache
+from PIDInstrumentation import PIDInstrumentation
+from PIDPlantGraph import OFF_PAGE_PATTERN, PIDPlantGraph, split_sheets
+
+# 识别算法版本：检测/合并逻辑变化时递增，使识别缓存失效
+RECOGNITION_VERSION = 2
+
+# 可视化标注图输出目录
+VISUALIZATION_DIR = Path(__file__).parent.parent.parent / 'uploads' / 'pid_annotations'
+
+# 可视化模式：sync（识别返回前生成）/ background（后台线程生成，先返回计划路径）/ off（只在按需调用时生成）
+VISUALIZATION_MODES = ('sync', 'background', 'off')
+
+# 页面并行工作进程内复用的服务实例
+_worker_service = None
+
+
+def _get_worker_service(ocr_service_url: str) -> 'PIDRecognitionService':
+    """工作进程内懒加载服务实例"""
+    global _worker_service
+    if _worker_service is None:
+        _worker_service = PIDRecognitionService()
+    _worker_service.ocr_service_url = ocr_service_url
+    return _worker_service
+
+
+def _recognize_page_worker(args) -> Dict:
+    """页面并行工作函数：渲染 → OCR/符号检测 → 页内合并"""
+    pdf_path, page_num, legend_symbols, template_bank, ocr_service_url = args
+    service = _get_worker_service(ocr_service_url)
+    metrics = PIDInstrumentation(service.profiler)
+    with metrics.stage('render', pages=1):
+        page = render_pdf_page(pdf_path, page_num)
+    return service._recognize_page(page, page_num, legend_symbols, template_bank, metrics)
+
+
+def _visualize_page_worker(args) -> Dict:
+    """页面并行工作函数：重新渲染页面并生成可视化标注图"""
+    pdf_path, page_num, components, legend_symbols, outputs, ocr_service_url = args
+    service = _get_worker_service(ocr_service_url)
+    page = render_pdf_page(pdf_path, page_num)
+    return service._create_visualization(page, components, page_num, legend_symbols, outputs)
 
-# Global EasyOCR reader instance (lazy initialization)
-_easyocr_reader = None
 
 class PIDRecognitionService:
     def __init__(self):
         # DeepSeek-OCR服务地址
         self.ocr_service_url = os.getenv('DOCUMENT_RECOGNITION_SERVICE', 'http://10.10.18.3:7000/ocr')
 
+        # DeepSeek-OCR分块识别：全分辨率图块并发上传（0则整页降采样单次上传）
+        self.ocr_tiled = os.getenv('PID_OCR_TILED', '1') == '1'
+        self.ocr_tile_size = int(os.getenv('PID_OCR_TILE_SIZE', '1280'))
+        self.ocr_tile_overlap = int(os.getenv('PID_OCR_TILE_OVERLAP', '256'))
+        self.ocr_concurrency = int(os.getenv('PID_OCR_CONCURRENCY', '4'))
+        self.ocr_retries = int(os.getenv('PID_OCR_RETRIES', '3'))
+        self.ocr_timeout = float(os.getenv('PID_OCR_TIMEOUT', '60'))
+        self._remote_ocr_client = None
+
+        # 可视化：默认同步生成；background时识别结果先返回，标注图在后台线程中写出
+        self.visualization_mode = os.getenv('PID_VISUALIZATION', 'sync')
+        # 全分辨率PNG（0则只写预览/瓦片）、WebP预览最长边（0关闭）
+        self.visualization_png = os.getenv('PID_VISUALIZATION_PNG', '1') == '1'
+        self.visualization_preview_size = int(os.getenv('PID_VISUALIZATION_PREVIEW_SIZE', str(PREVIEW_MAX_SIDE if HAS_OPENCV else 0)))
+        # WebP瓦片边长（默认0不切瓦片，如512）：瓦片只在按需调用render_visualizations或background模式下生成，
+        # sync模式的识别请求不切瓦片
+        self.visualization_tile_size = int(os.getenv('PID_VISUALIZATION_TILE_SIZE', '0')) if HAS_OPENCV else 0
+        self._visualization_jobs: List[threading.Thread] = []
+
+        # 管线骨架追踪：在端口邻接之外补充经管线相连的组件对
+        self.pipe_tracing = os.getenv('PID_PIPE_TRACING', '1') == '1'
+
+        # EasyOCR：配置PID_OCR_WORKER_ADDRESS时使用共享工作服务，否则进程内懒加载
+        self.ocr_reader = get_ocr_reader()
+        if os.getenv('PID_OCR_WARMUP', '0') == '1':
+            self.ocr_reader.warmup()
+
+        # 分块符号检测：auto（页面像素超过阈值时启用）/ on / off
+        self.tiled_detection = os.getenv('PID_TILED_DETECTION', 'auto')
+        self.tiled_min_pixels = int(os.getenv('PID_TILED_MIN_PIXELS', str(40_000_000)))
+        self.tile_size = int(os.getenv('PID_TILE_SIZE', '2048'))
+        self.tile_overlap = int(os.getenv('PID_TILE_OVERLAP', '256'))
+        self.tile_workers = int(os.getenv('PID_TILE_WORKERS', '0')) or None
+
+        # 图例库目录：设置后按图例区域感知哈希复用已提取的图例，跳过图例OCR
+        legend_library_dir = os.getenv('PID_LEGEND_LIBRARY_DIR')
+        self.legend_library = PIDLegendLibrary(legend_library_dir) if legend_library_dir and HAS_OPENCV else None
+
+        # 分阶段监测（每次recognize_pid重建）；PID_PROFILER=cprofile/pyinstrument 时逐阶段剖析
+        self.profiler = os.getenv('PID_PROFILER') or None
+        self.instrumentation = PIDInstrumentation(self.profiler)
+
+        # 装置级图：recognize_pid 按页登记各图纸，recognize_sheet 在此基础上增量更新单张图纸
+        self.plant_graph: Optional[PIDPlantGraph] = None
+
+        # 识别结果缓存目录：设置后按PDF内容哈希缓存各阶段结果（图例、逐页识别、合并/连接）
+        cache_dir = os.getenv('PID_RECOGNITION_CACHE_DIR')
+        self.recognition_cache = PIDRecognitionCache(cache_dir, RECOGNITION_VERSION) if cache_dir else None
+
         # PID符号正则表达式
         self.tag_patterns = {
             'pump': r'P-\d+[A-Z]?',
@@ -56,6 +151,7 @@ class PIDRecognitionService:
             'flow_indicator': r'FI-\d+[A-Z]?',
             'level_indicator': r'LI-\d+[A-Z]?',
             'control_valve': r'CV-\d+[A-Z]?',
+            'off_page_connector': OFF_PAGE_PATTERN,
         }
 
         # 工艺参数正则
@@ -67,231 +163,615 @@ class PIDRecognitionService:
             'pressure_class': r'(PN\d+|Class\d+)'
         }
 
-    def recognize_pid(self, pdf_path: str) -> Dict:
-        """识别PID图纸（含可视化）"""
-        print(f"🔍 识别PID图纸: {Path(pdf_path).name}")
+        # 位号与参数正则合并编译，每行文字只扫描一遍
+        self.tag_lexer = TagLexer(self.tag_patterns, self.parameter_patterns)
 
-        # 步骤1: PDF转图片
-        images = self._pdf_to_images(pdf_path)
-        print(f"  ✅ 提取 {len(images)} 页图片")
+    def recognize_pid(self, pdf_path: str, workers: int = None, max_pages: int = None,
+                      visualization: str = None) -> Dict:
+        """识别PID图纸（含可视化）
 
-        # 步骤2: DeepSeek-OCR识别所有文字
-        all_text_regions = []
-        for page_num, img_path in enumerate(images):
-            try:
-                page_text = self._ocr_with_deepseek(img_path, page_num)
-                all_text_regions.extend(page_text)
-            except Exception as e:
-                print(f"  ⚠️  第{page_num+1}页OCR失败: {e}")
+        Args:
+            pdf_path: PDF路径
+            workers: 页面并行进程数，None时读取PID_PAGE_WORKERS（默认1，串行）
+            max_pages: 最多识别页数，None为全部页面
+            visualization: 可视化模式 sync/background/off，None时读取PID_VISUALIZATION（默认sync）
+        """
+        print(f"🔍 识别PID图纸: {Path(pdf_path).name}")
 
-        print(f"  ✅ 识别文字: {len(all_text_regions)} 个区域")
+        if workers is None:
+            workers = int(os.getenv('PID_PAGE_WORKERS', '1'))
+        self.instrumentation = PIDInstrumentation(self.profiler)
 
-        # 步骤3: 提取图例（CHART OF SYMBOLS）
-        legend_symbols = []
-        if HAS_OPENCV and len(images) > 0:
-            try:
-                legend_symbols = self._extract_legend(images[0], all_text_regions)
-                print(f"  ✅ 提取图例: {len(legend_symbols)} 个符号定义")
-            except Exception as e:
-                print(f"  ⚠️  图例提取失败: {e}")
+        # 步骤1: 统计页数，渲染第1页（图例提取与第1页识别共用）
+        with self.instrumentation.stage('render') as counters:
+            page_count = self._get_page_count(pdf_path)
+            if max_pages is not None:
+                page_count = min(page_count, max_pages)
+            first_image = render_pdf_page(pdf_path, 0) if page_count > 0 else None
+            counters['pages'] = 1 if first_image is not None else 0
+        print(f"  ✅ PDF共 {page_count} 页")
 
-        # 步骤4: 多尺度符号检测（使用图例模板）
-        all_symbols = []
-        original_image_paths = []
+        cache_keys = self._cache_keys(pdf_path, page_count)
 
-        if HAS_OPENCV:
-            for page_num, img_path in enumerate(images):
+        # 步骤2: 提取图例（CHART OF SYMBOLS），构建模板库，所有页面共用
+        legend_symbols = []
+        template_bank = None
+        with self.instrumentation.stage('legend') as counters:
+            cached_legend = self._cache_load(cache_keys, 'legend')
+            if cached_legend is not None:
+                legend_symbols, template_bank = self._legend_from_cache(*cached_legend)
+                print(f"  💾 图例缓存命中: {len(legend_symbols)} 个符号定义, {len(template_bank)} 个匹配模板")
+            elif first_image is not None:
                 try:
-                    page_symbols = self._detect_symbols_multiscale(img_path, page_num, legend_symbols)
-                    all_symbols.extend(page_symbols)
-                    original_image_paths.append(img_path)
+                    legend_symbols, template_bank = self._load_legend(first_image, source=Path(pdf_path).name)
+                    print(f"  ✅ 提取图例: {len(legend_symbols)} 个符号定义, {len(template_bank)} 个匹配模板")
+                    self._cache_store(cache_keys, 'legend',
+                                      {'legend_symbols': legend_symbols, 'entries': template_bank.entries},
+                                      {'descriptors': template_bank.descriptors})
                 except Exception as e:
-                    print(f"  ⚠️  第{page_num+1}页符号检测失败: {e}")
-            print(f"  ✅ 检测符号: {len(all_symbols)} 个")
-        else:
-            print(f"  ⚠️  OpenCV未安装，跳过符号检测")
+                    print(f"  ⚠️  图例提取失败: {e}")
+            counters['symbols'] = len(legend_symbols)
+
+        # 合并/连接结果命中缓存时跳过步骤3-5
+        cached_result = self._cache_load(cache_keys, 'result')
+        if cached_result is not None:
+            result = cached_result[0]
+            components, connections = result['components'], result['connections']
+            print(f"  💾 识别缓存命中: {len(components)} 个组件, {len(connections)} 条连接")
+            return self._finish_recognition(pdf_path, page_count, components, connections, legend_symbols,
+                                            result['detected_pages'], workers, first_image, visualization)
+
+        # 步骤3: 逐页识别（OCR与符号检测重叠执行，可跨进程并行）
+        page_results = self._recognize_pages(pdf_path, page_count, legend_symbols, workers, first_image,
+                                             template_bank, cache_keys)
+
+        # 按页码顺序合并，结果与并行度无关
+        all_text_regions = []
+        all_symbols = []
+        text_components = []
+        text_to_symbol_map = {}
+        for result in page_results:
+            all_text_regions.extend(result['text_regions'])
+            all_symbols.extend(result['symbols'])
+            text_components.extend(result['text_components'])
+            text_to_symbol_map.update(result['text_to_symbol'])
 
-        # 步骤4: 从文字中提取组件
-        text_components = self._extract_components_from_text(all_text_regions)
+        print(f"  ✅ 识别文字: {len(all_text_regions)} 个区域")
+        print(f"  ✅ 检测符号: {len(all_symbols)} 个")
         print(f"  ✅ 从文字提取组件: {len(text_components)} 个")
+        if text_to_symbol_map:
+            print(f"  ✅ 引线追踪: 关联 {len(text_to_symbol_map)} 个文字-符号对")
+
+        # 步骤4: 合并组件（使用引线追踪代替邻近匹配，自动位号全局编号）
+        with self.instrumentation.stage('merge') as counters:
+            components = self._merge_components(text_components, all_symbols, text_to_symbol_map, all_text_regions)
+            counters['components'] = len(components)
+
+        # 步骤5: 逐页推断连接（端口邻接 + 在页面识别时构建的骨架图上追踪，只在同一页内配对；
+        # 跨页由装置级图经连接符/共用位号串起）
+        pipe_graphs = {r['page_num']: r.pop('pipe_graph', None) for r in page_results}
+        with self.instrumentation.stage('connections') as counters:
+            connections = []
+            for page_num, (page_components, _) in split_sheets(components, []).items():
+                connections.extend(self._infer_sheet_connections(page_components, page_num,
+                                                                 pipe_graphs.get(page_num), self.pipe_tracing))
+            counters['connections'] = len(connections)
+        del pipe_graphs
+
+        detected_pages = [r['page_num'] for r in page_results if r['detected']]
+        if all(self._page_cacheable(r) for r in page_results):
+            self._cache_store(cache_keys, 'result', {
+                'components': components,
+                'connections': connections,
+                'detected_pages': detected_pages
+            })
 
-        # 步骤5: 检测引线（连接文字和符号的细线）
-        first_image = original_image_paths[0] if len(original_image_paths) > 0 else None
-        leader_lines = []
-        if HAS_OPENCV and first_image:
-            try:
-                leader_lines = self._detect_leader_lines(first_image)
-                print(f"  ✅ 检测引线: {len(leader_lines)} 条")
-            except Exception as e:
-                print(f"  ⚠️  引线检测失败: {e}")
+        return self._finish_recognition(pdf_path, page_count, components, connections, legend_symbols,
+                                        detected_pages, workers, first_image, visualization)
+
+    def _finish_recognition(self, pdf_path: str, page_count: int, components: List[Dict],
+                            connections: List[Dict], legend_symbols: List[Dict], detected_pages: List[int],
+                            workers: int, first_image: 'PIDPageImage' = None, visualization: str = None) -> Dict:
+        """步骤6-7：装置级图、图拓扑分析与可视化（不缓存，每次基于识别结果重新生成）"""
+        # 步骤6: 按页登记装置级图（相同位号跨页合并、跨图连接符配对），在合并后的图上做拓扑分析
+        with self.instrumentation.stage('graph'):
+            self.plant_graph = PIDPlantGraph()
+            for page_num, (page_components, page_connections) in split_sheets(components, connections).items():
+                self.plant_graph.update_sheet(page_num, page_components, page_connections)
+            graph_analysis = self._analyze_plant(self.plant_graph)
+
+        # 步骤7: 生成可视化标注图（background时不阻塞返回，off时可之后按需调用render_visualizations）
+        mode = visualization or self.visualization_mode
+        if mode not in VISUALIZATION_MODES:
+            print(f"  ⚠️  未知可视化模式 {mode}，按sync处理")
+            mode = 'sync'
+        if mode == 'off':
+            visualization_result = self._visualization_result([], None, 'off')
+        else:
+            visualization_result = self.render_visualizations(
+                pdf_path, components, connections, legend_symbols, detected_pages, workers, first_image,
+                background=(mode == 'background'), tiles=(mode == 'background')
+            )
 
-        # 步骤6: 引线追踪（文字→符号关联）
-        text_to_symbol_map = {}
-        if leader_lines and all_text_regions and all_symbols:
-            try:
-                text_to_symbol_map = self._trace_text_to_symbol(all_text_regions, leader_lines, all_symbols)
-                print(f"  ✅ 引线追踪: 关联 {len(text_to_symbol_map)} 个文字-符号对")
-            except Exception as e:
-                print(f"  ⚠️  引线追踪失败: {e}")
+        self.instrumentation.print_summary()
 
-        # 步骤7: 合并组件（使用引线追踪代替邻近匹配）
-        try:
-            components = self._merge_with_leader_trace(text_components, all_symbols, text_to_symbol_map)
-            print(f"  ✅ 合并后组件: {len(components)} 个")
-        except Exception as e:
-            print(f"  ⚠️  组件合并失败，回退到邻近匹配: {e}")
-            components = self._merge_text_and_symbols(text_components, all_symbols, all_text_regions)
-            print(f"  ✅ 合并后组件(回退): {len(components)} 个")
+        return {
+            'components': components,
+            'connections': connections,
+            'legend': legend_symbols,
+            'page_count': page_count,
+            **visualization_result,
+            'graph_analysis': graph_analysis,
+            'plant': self.plant_graph.summary(),
+            'metrics': self.instrumentation.report(include_profile=False)
+        }
 
-        # 步骤8: 推断连接（基于端口邻接）
-        connections = []
-        if first_image and components:
-            try:
-                connections = self._infer_connections_by_ports(components, leader_lines, first_image)
-                print(f"  ✅ 推断连接(端口邻接): {len(connections)} 条")
-            except Exception as e:
-                print(f"  ⚠️  端口连接推断失败，回退到旧方法: {e}")
-                connections = self._infer_connections(components, first_image)
-                print(f"  ✅ 推断连接(回退): {len(connections)} 条")
-
-        # 步骤9: 生成可视化标注图
-        visualization_paths = []
-        upload_dir = None
-
-        if HAS_OPENCV and len(original_image_paths) > 0:
-            for page_num, img_path in enumerate(original_image_paths):
-                page_components = [c for c in components if c.get('page') == page_num]
-                vis_path = self._create_visualization(img_path, page_components, page_num, legend_symbols)
-                if vis_path:
-                    visualization_paths.append(vis_path)
-                    upload_dir = Path(vis_path).parent
-
-        # 步骤8: 图拓扑分析
-        graph_analysis = None
-        if len(components) > 0:
-            try:
-                import sys
-                import os
-                sys.path.insert(0, os.path.dirname(__file__))
-                from PIDGraphAnalyzer import PIDGraphAnalyzer
+    def recognize_sheet(self, pdf_path: str, page_num: int, plant: PIDPlantGraph = None, sheet=None) -> Dict:
+        """重新识别单张图纸并增量更新装置级图：其余图纸不重新识别，装置图只替换该图纸的节点/边
 
-                analyzer = PIDGraphAnalyzer()
-                graph_analysis = analyzer.analyze(components, connections)
+        Args:
+            pdf_path: PDF路径
+            page_num: 页码
+            plant: 要更新的装置级图，None时使用上一次 recognize_pid 建立的装置图（没有则新建）
+            sheet: 该图纸在装置图中的标识，None时为页码
+        """
+        print(f"🔍 重新识别图纸: {Path(pdf_path).name} 第{page_num + 1}页")
+        if plant is None:
+            plant = self.plant_graph = self.plant_graph or PIDPlantGraph()
+        self.instrumentation = PIDInstrumentation(self.profiler)
 
-                # 导出图可视化
-                if upload_dir and HAS_OPENCV:
-                    graph_vis_path = upload_dir / f'graph_topology_{uuid.uuid4().hex[:8]}.png'
-                    G = analyzer._build_graph(components, connections)
-                    analyzer.export_graph_visualization(G, str(graph_vis_path))
-                    visualization_paths.append(str(graph_vis_path))
+        with self.instrumentation.stage('render', pages=1):
+            page = render_pdf_page(pdf_path, page_num)
 
-            except Exception as e:
-                print(f"  ⚠️  图分析失败: {e}")
-                graph_analysis = {'error': str(e)}
+        # 图例（所有页面共用）：优先读缓存，否则从第1页提取
+        legend_symbols = []
+        template_bank = None
+        with self.instrumentation.stage('legend') as counters:
+            cached_legend = self._cache_load(self._cache_keys(pdf_path, self._get_page_count(pdf_path)), 'legend')
+            if cached_legend is not None:
+                legend_symbols, template_bank = self._legend_from_cache(*cached_legend)
+            else:
+                try:
+                    legend_page = page if page_num == 0 else render_pdf_page(pdf_path, 0)
+                    legend_symbols, template_bank = self._load_legend(legend_page, source=Path(pdf_path).name)
+                except Exception as e:
+                    print(f"  ⚠️  图例提取失败: {e}")
+            counters['symbols'] = len(legend_symbols)
 
-        # 清理临时图片
-        for img_path in images:
-            try:
-                if img_path not in original_image_paths:
-                    os.unlink(img_path)
-            except:
-                pass
+        metrics = PIDInstrumentation(self.profiler)
+        result = self._recognize_page(page, page_num, legend_symbols, template_bank, metrics)
+        self.instrumentation.merge(result.pop('metrics', None))
+        del page
+
+        with self.instrumentation.stage('merge') as counters:
+            components = self._merge_components(result['text_components'], result['symbols'],
+                                                result['text_to_symbol'], result['text_regions'])
+            counters['components'] = len(components)
+
+        with self.instrumentation.stage('connections') as counters:
+            connections = self._infer_sheet_connections(components, page_num, result['pipe_graph'], self.pipe_tracing)
+            counters['connections'] = len(connections)
+
+        with self.instrumentation.stage('graph'):
+            changes = plant.update_sheet(page_num if sheet is None else sheet, components, connections)
+        print(f"  ✅ 装置图更新: 节点 +{len(changes['added_nodes'])}/-{len(changes['removed_nodes'])}, "
+              f"连接 +{len(changes['added_edges'])}/-{len(changes['removed_edges'])}")
+        self.instrumentation.print_summary()
 
         return {
             'components': components,
             'connections': connections,
-            'legend': legend_symbols,
-            'page_count': len(images),
-            'visualization_images': visualization_paths,
-            'graph_analysis': graph_analysis
+            'changes': changes,
+            'plant': plant.summary(),
+            'metrics': self.instrumentation.report(include_profile=False)
+        }
+
+    def _analyze_plant(self, plant: PIDPlantGraph) -> Optional[Dict]:
+        """在装置级图（合并后的组件/连接）上做图拓扑分析"""
+        components = plant.components()
+        if not components:
+            return None
+        try:
+            import sys
+            sys.path.insert(0, os.path.dirname(__file__))
+            from PIDGraphAnalyzer import PIDGraphAnalyzer
+
+            analyzer = PIDGraphAnalyzer()
+            return analyzer.analyze(components, plant.connections())
+
+        except Exception as e:
+            print(f"  ⚠️  图分析失败: {e}")
+            return {'error': str(e)}
+
+    def render_visualizations(self, pdf_path: str, components: List[Dict], connections: List[Dict],
+                              legend_symbols: List[Dict] = None, page_nums: List[int] = None, workers: int = 1,
+                              first_image: 'PIDPageImage' = None, background: bool = False,
+                              tiles: bool = True) -> Dict:
+        """按识别结果生成可视化：每页全分辨率PNG、WebP预览与瓦片，以及拓扑图
+
+        可在识别之后按需调用（如基于缓存的识别结果）。background=True时在后台线程中生成，
+        立即返回计划写出的路径（visualization_status为pending），wait_visualizations()等待完成。
+        tiles=False时不切瓦片（sync模式的识别请求）。
+        """
+        if page_nums is None:
+            page_nums = sorted({c.get('page', 0) for c in components})
+        run_id = uuid.uuid4().hex[:8]
+        plan = [self._visualization_outputs(n, run_id, tiles) for n in page_nums] if HAS_OPENCV else []
+        graph_path = None
+        if components and self._graph_visualization_available():
+            graph_path = str(VISUALIZATION_DIR / f'graph_topology_{run_id}.png')
+        instrumentation = self.instrumentation
+
+        def render() -> Dict:
+            with instrumentation.stage('visualization') as counters:
+                try:
+                    written = self._visualize_pages(pdf_path, plan, components, legend_symbols or [],
+                                                    workers, first_image)
+                    graph_written = graph_path is not None and \
+                        self._export_graph_visualization(components, connections, graph_path)
+                except Exception as e:
+                    print(f"  ⚠️  可视化生成失败: {e}")
+                    written, graph_written = [], False
+                counters['images'] = len(written) + int(graph_written)
+            return self._visualization_result(written, graph_path if graph_written else None, 'done')
+
+        if not background:
+            return render()
+
+        thread = threading.Thread(target=render, name=f'pid-visualization-{run_id}')
+        thread.start()
+        self._visualization_jobs = [t for t in self._visualization_jobs if t.is_alive()] + [thread]
+        print(f"  🖼️  可视化在后台生成: {len(plan)} 页")
+        return self._visualization_result(plan, graph_path, 'pending')
+
+    def wait_visualizations(self, timeout: float = None) -> bool:
+        """等待后台可视化完成，返回是否已全部完成"""
+        for thread in list(self._visualization_jobs):
+            thread.join(timeout)
+        self._visualization_jobs = [t for t in self._visualization_jobs if t.is_alive()]
+        return not self._visualization_jobs
+
+    def _visualization_outputs(self, page_num: int, run_id: str, tiles: bool = True) -> Dict:
+        """单页可视化的输出路径（按配置省略PNG/预览/瓦片）"""
+        stem = f'annotated_{page_num}_{run_id}'
+        return {
+            'page': page_num,
+            'image': str(VISUALIZATION_DIR / f'{stem}.png') if self.visualization_png else None,
+            'preview': str(VISUALIZATION_DIR / f'{stem}_preview.webp') if self.visualization_preview_size else None,
+            'tiles': str(VISUALIZATION_DIR / f'{stem}_tiles' / 'manifest.json') if tiles and self.visualization_tile_size else None
         }
 
-    def _pdf_to_images(self, pdf_path: str) -> List[str]:
-        """PDF转图片 (使用PyMuPDF)"""
+    def _visualization_result(self, outputs: List[Dict], graph_path: Optional[str], status: str) -> Dict:
+        """visualization_images 保持原格式（每页一张图：PNG，未生成PNG时为预览图；末尾为拓扑图）"""
+        images = [o.get('image') or o.get('preview') for o in outputs]
+        images = [path for path in images if path]
+        if graph_path:
+            images.append(graph_path)
+        return {
+            'visualization_images': images,
+            'visualization_previews': [
+                {'page': o['page'], 'preview': o.get('preview'), 'tiles': o.get('tiles')}
+                for o in outputs if o.get('preview') or o.get('tiles')
+            ],
+            'visualization_status': status
+        }
+
+    def _graph_visualization_available(self) -> bool:
+        try:
+            from PIDGraphAnalyzer import HAS_MATPLOTLIB
+        except ImportError:
+            return False
+        return HAS_OPENCV and HAS_MATPLOTLIB
+
+    def _export_graph_visualization(self, components: List[Dict], connections: List[Dict], output_path: str) -> bool:
+        """导出拓扑图，返回是否写出"""
+        try:
+            from PIDGraphAnalyzer import PIDGraphAnalyzer
+
+            analyzer = PIDGraphAnalyzer()
+            VISUALIZATION_DIR.mkdir(parents=True, exist_ok=True)
+            analyzer.export_graph_visualization(analyzer._build_graph(components, connections), output_path)
+        except Exception as e:
+            print(f"  ⚠️  拓扑图导出失败: {e}")
+            return False
+        return Path(output_path).exists()
+
+    def _get_page_count(self, pdf_path: str) -> int:
+        """PDF页数（无PyMuPDF/OpenCV时为0）"""
         if not HAS_PYMUPDF:
             print("  ❌ PyMuPDF未安装")
-            return []
+            return 0
+
+        if not HAS_OPENCV:
+            print("  ❌ OpenCV未安装")
+            return 0
 
-        images = []
         try:
-            doc = fitz.open(pdf_path)
-            for page_num in range(min(doc.page_count, 10)):
-                page = doc[page_num]
-
-                # 渲染为PNG (3倍分辨率，提高OCR准确率)
-                mat = fitz.Matrix(3, 3)
-                pix = page.get_pixmap(matrix=mat)
-
-                # 保存到临时文件
-                temp_file = tempfile.NamedTemporaryFile(
-                    delete=False,
-                    suffix='.png',
-                    prefix=f'pid_page_{page_num}_'
-                )
-                pix.save(temp_file.name)
-                images.append(temp_file.name)
-                temp_file.close()
-
-            doc.close()
-            return images
+            return get_pdf_page_count(pdf_path)
         except Exception as e:
-            print(f"  ❌ PDF转图片失败: {e}")
+            print(f"  ❌ PDF读取失败: {e}")
+            return 0
+
+    def _recognize_pages(self, pdf_path: str, page_count: int, legend_symbols: List[Dict],
+                         workers: int, first_image: 'PIDPageImage' = None,
+                         template_bank: 'LegendTemplateBank' = None, cache_keys: Dict = None) -> List[Dict]:
+        """逐页识别，workers>1时使用进程池，结果按页码顺序返回；命中缓存的页直接读取"""
+        if page_count == 0:
             return []
 
-    def _ocr_with_deepseek(self, image_path: str, page_num: int) -> List[Dict]:
-        """调用DeepSeek-OCR识别（大图降采样）"""
+        results = {}
+        for page_num in range(page_count):
+            cached = self._cache_load(cache_keys, f'page{page_num:04d}')
+            if cached is not None:
+                results[page_num] = dict(cached[0], pipe_graph=cached[1] or None)
+        pending = [n for n in range(page_count) if n not in results]
+        if results:
+            print(f"  💾 页面缓存命中: {len(results)}/{page_count} 页")
+            self.instrumentation.count('cache', pages=len(results))
+
+        if workers > 1 and len(pending) > 1:
+            tasks = [(pdf_path, n, legend_symbols, template_bank, self.ocr_service_url) for n in pending]
+            # spawn避免fork后OpenCV线程池死锁
+            ctx = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=ctx) as pool:
+                results.update(zip(pending, pool.map(_recognize_page_worker, tasks)))
+        else:
+            for page_num in pending:
+                metrics = PIDInstrumentation(self.profiler)
+                if page_num == 0 and first_image is not None:
+                    page = first_image
+                else:
+                    with metrics.stage('render', pages=1):
+                        page = render_pdf_page(pdf_path, page_num)
+                results[page_num] = self._recognize_page(page, page_num, legend_symbols, template_bank, metrics)
+                if page is not first_image:
+                    del page
+
+        # 页面监测数据并入本次识别（不写入缓存）
+        for page_num in pending:
+            self.instrumentation.merge(results[page_num].pop('metrics', None))
+        for page_num in pending:
+            if self._page_cacheable(results[page_num]):
+                data = {k: v for k, v in results[page_num].items() if k != 'pipe_graph'}
+                self._cache_store(cache_keys, f'page{page_num:04d}', data, results[page_num].get('pipe_graph'))
+        return [results[n] for n in range(page_count)]
+
+    def _page_cacheable(self, result: Dict) -> bool:
+        """OCR无结果或符号检测失败的页不写缓存（多为服务暂不可用），下次重新识别"""
+        return result['detected'] and bool(result['text_regions'])
+
+    def _cache_keys(self, pdf_path: str, page_count: int) -> Optional[Dict]:
+        """各阶段缓存键：阶段配置中包含上游阶段的键，上游变化时下游随之失效"""
+        if self.recognition_cache is None:
+            return None
+
+        cache = self.recognition_cache
+        document = cache.document_key(pdf_path)
+        keys = {'document': document, 'stages': {}}
+        stages = keys['stages']
+
+        stages['legend'] = cache.stage_key(document, 'legend', {
+            'legend_library': self.legend_library is not None,
+            'easyocr': self.ocr_reader.available
+        })
+        page_config = {
+            'legend': stages['legend'],
+            'ocr': [self.ocr_service_url, self.ocr_tiled, self.ocr_tile_size, self.ocr_tile_overlap],
+            'detection': [self.tiled_detection, self.tiled_min_pixels, self.tile_size, self.tile_overlap],
+            'pipe_tracing': self.pipe_tracing
+        }
+        for page_num in range(page_count):
+            stage = f'page{page_num:04d}'
+            stages[stage] = cache.stage_key(document, stage, page_config)
+        stages['result'] = cache.stage_key(document, 'result', {
+            'pages': [stages[f'page{n:04d}'] for n in range(page_count)],
+            'pipe_tracing': self.pipe_tracing
+        })
+        return keys
+
+    def _cache_load(self, cache_keys: Optional[Dict], stage: str):
+        if cache_keys is None:
+            return None
+        return self.recognition_cache.load(cache_keys['document'], stage, cache_keys['stages'][stage])
+
+    def _cache_store(self, cache_keys: Optional[Dict], stage: str, data: Dict, arrays: Dict = None):
+        if cache_keys is None:
+            return
         try:
-            # 读取图片检查尺寸
-            img = cv2.imread(image_path)
-            if img is None:
+            self.recognition_cache.store(cache_keys['document'], stage, cache_keys['stages'][stage], data, arrays)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"  ⚠️  识别缓存写入失败({stage}): {e}")
+
+    def _legend_from_cache(self, data: Dict, arrays: Dict) -> Tuple[List[Dict], 'LegendTemplateBank']:
+        descriptors = arrays.get('descriptors')
+        return data['legend_symbols'], LegendTemplateBank.from_dict({
+            'descriptors': descriptors if descriptors is not None else [],
+            'entries': data['entries']
+        })
+
+    def cached_recognition(self, pdf_path: str, max_pages: int = None) -> Optional[Dict]:
+        """读取缓存中的识别结果（组件、连接、图例），供下游阶段直接使用；未命中返回None"""
+        if self.recognition_cache is None:
+            return None
+
+        page_count = self._get_page_count(pdf_path)
+        if max_pages is not None:
+            page_count = min(page_count, max_pages)
+        cache_keys = self._cache_keys(pdf_path, page_count)
+        cached_result = self._cache_load(cache_keys, 'result')
+        if cached_result is None:
+            return None
+        cached_legend = self._cache_load(cache_keys, 'legend')
+
+        return {
+            'components': cached_result[0]['components'],
+            'connections': cached_result[0]['connections'],
+            'legend': cached_legend[0]['legend_symbols'] if cached_legend is not None else [],
+            'page_count': page_count,
+            'detected_pages': cached_result[0]['detected_pages']
+        }
+
+    def _recognize_page(self, page: 'PIDPageImage', page_num: int, legend_symbols: List[Dict],
+                        template_bank: 'LegendTemplateBank' = None, metrics: 'PIDInstrumentation' = None) -> Dict:
+        """单页识别：OCR请求在后台线程中与本地OpenCV符号检测重叠执行，然后做页内引线关联
+
+        各阶段监测数据放在结果的 metrics 中（可跨进程返回）。
+        """
+        metrics = metrics or PIDInstrumentation(self.profiler)
+        symbols = []
+        detected = False
+        leader_lines = []
+
+        def run_ocr():
+            with metrics.stage('ocr') as counters:
+                regions = self._ocr_with_deepseek(page, page_num)
+                counters['text_regions'] = len(regions)
+            return regions
+
+        with ThreadPoolExecutor(max_workers=1) as ocr_pool:
+            ocr_future = ocr_pool.submit(run_ocr)
+
+            with metrics.stage('symbols') as counters:
+                try:
+                    symbols = self._detect_symbols_multiscale(page, page_num, legend_symbols, template_bank)
+                    detected = True
+                except Exception as e:
+                    print(f"  ⚠️  第{page_num+1}页符号检测失败: {e}")
+                counters['symbols'] = len(symbols)
+
+            # 检测引线（连接文字和符号的细线）
+            if detected:
+                with metrics.stage('leader_trace'):
+                    try:
+                        leader_lines = self._detect_leader_lines(page)
+                    except Exception as e:
+                        print(f"  ⚠️  第{page_num+1}页引线检测失败: {e}")
+
+            # 管线骨架图在页面图像在手时构建，合并组件后再吸附/追踪（连接阶段不再重新渲染页面）
+            pipe_graph = None
+            if self.pipe_tracing:
+                with metrics.stage('pipe_graph') as counters:
+                    try:
+                        pipe_graph = PIDPipeTracer().skeleton_graph(page)
+                        counters['nodes'] = len(pipe_graph['nodes'])
+                    except Exception as e:
+                        print(f"  ⚠️  第{page_num+1}页管线骨架图构建失败: {e}")
+
+            try:
+                text_regions = ocr_future.result()
+            except Exception as e:
+                print(f"  ⚠️  第{page_num+1}页OCR失败: {e}")
+                text_regions = []
+
+        page.release_derivatives()
+
+        # 页内: 从文字提取组件，引线追踪（文字→符号关联）
+        text_components = self._extract_components_from_text(text_regions)
+        text_to_symbol = {}
+        if leader_lines and text_regions and symbols:
+            with metrics.stage('leader_trace') as counters:
+                try:
+                    text_to_symbol = self._trace_text_to_symbol(text_regions, leader_lines, symbols)
+                except Exception as e:
+                    print(f"  ⚠️  第{page_num+1}页引线追踪失败: {e}")
+                counters['associations'] = len(text_to_symbol)
+
+        return {
+            'page_num': page_num,
+            'detected': detected,
+            'text_regions': text_regions,
+            'symbols': symbols,
+            'text_components': text_components,
+            'text_to_symbol': text_to_symbol,
+            'pipe_graph': pipe_graph,
+            'metrics': metrics.report()
+        }
+
+    def _visualize_pages(self, pdf_path: str, plan: List[Dict], components: List[Dict],
+                         legend_symbols: List[Dict], workers: int,
+                         first_image: 'PIDPageImage' = None) -> List[Dict]:
+        """按输出计划为各页生成可视化标注图（只保留第1页图像，其余页面重新渲染），返回实际写出的文件"""
+        if not HAS_OPENCV or not plan:
+            return []
+
+        by_page = {o['page']: [c for c in components if c.get('page') == o['page']] for o in plan}
+
+        if workers > 1 and len(plan) > 1:
+            tasks = [(pdf_path, o['page'], by_page[o['page']], legend_symbols, o, self.ocr_service_url) for o in plan]
+            ctx = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=min(workers, len(plan)), mp_context=ctx) as pool:
+                written = list(pool.map(_visualize_page_worker, tasks))
+        else:
+            written = []
+            for o in plan:
+                n = o['page']
+                page = first_image if n == 0 and first_image is not None else render_pdf_page(pdf_path, n)
+                written.append(self._create_visualization(page, by_page[n], n, legend_symbols, o))
+
+        return [w for w in written if w]
+
+    def _get_remote_ocr_client(self) -> 'PIDRemoteOcrClient':
+        """懒加载分块OCR客户端（地址变更时重建）"""
+        if self._remote_ocr_client is None or self._remote_ocr_client.url != self.ocr_service_url:
+            self._remote_ocr_client = PIDRemoteOcrClient(
+                self.ocr_service_url,
+                tile_size=self.ocr_tile_size,
+                overlap=self.ocr_tile_overlap,
+                concurrency=self.ocr_concurrency,
+                retries=self.ocr_retries,
+                timeout=self.ocr_timeout
+            )
+        return self._remote_ocr_client
+
+    def _ocr_with_deepseek(self, page: 'PIDPageImage', page_num: int) -> List[Dict]:
+        """调用DeepSeek-OCR识别（默认全分辨率分块并发；关闭分块时大图降采样单次上传）"""
+        if self.ocr_tiled:
+            try:
+                h, w = page.image.shape[:2]
+                print(f"  🚀 调用DeepSeek-OCR识别第{page_num+1}页 ({w}x{h}px)...")
+                return self._get_remote_ocr_client().recognize(page.image, page_num, page.encode_png)
+            except Exception as e:
+                print(f"  ❌ OCR异常: {e}")
                 return []
 
+        try:
+            img = page.image
             h, w = img.shape[:2]
             print(f"  🚀 调用DeepSeek-OCR识别第{page_num+1}页 ({w}x{h}px)...")
 
             # 如果图片过大，缩小到1200px以内
             max_size = 1200
             scale = 1.0
-            ocr_image_path = image_path
+            ocr_image = img
 
             if w > max_size or h > max_size:
                 scale = min(max_size / w, max_size / h)
                 new_w = int(w * scale)
                 new_h = int(h * scale)
                 print(f"  📐 图片过大，缩放至 {new_w}x{new_h}px")
-                resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
-
-                # 保存临时缩放图
-                temp_resized = f"/tmp/ocr_resized_{uuid.uuid4().hex[:8]}.png"
-                cv2.imwrite(temp_resized, resized)
-                ocr_image_path = temp_resized
+                ocr_image = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
 
             # 调用OCR
-            try:
-                with open(ocr_image_path, 'rb') as f:
-                    files = {'file': (os.path.basename(ocr_image_path), f, 'image/png')}
-                    response = requests.post(self.ocr_service_url, files=files, timeout=90)
-
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get('success') and data.get('text'):
-                        # 解析并还原坐标（如果缩放过）
-                        regions = self._parse_ocr_response(data, page_num)
-                        if scale != 1.0:
-                            for region in regions:
-                                if 'bbox' in region:
-                                    bx, by, bw, bh = region['bbox']
-                                    region['bbox'] = (int(bx/scale), int(by/scale), int(bw/scale), int(bh/scale))
-                                if 'position' in region:
-                                    px, py = region['position']
-                                    region['position'] = (int(px/scale), int(py/scale))
-                        return regions
-                    else:
-                        print(f"  ⚠️  OCR返回失败: {data.get('text', '')}")
-            finally:
-                # 清理临时文件
-                if ocr_image_path != image_path and os.path.exists(ocr_image_path):
-                    os.remove(ocr_image_path)
+            png_bytes = page.encode_png(ocr_image)
+            files = {'file': (f'pid_page_{page_num}.png', png_bytes, 'image/png')}
+            response = requests.post(self.ocr_service_url, files=files, timeout=90)
+
+            if response.status_code == 200:
+                data = response.json()
+                if data.get('success') and data.get('text'):
+                    # 解析并还原坐标（如果缩放过）
+                    regions = self._parse_ocr_response(data, page_num, ocr_image.shape[1], ocr_image.shape[0])
+                    if scale != 1.0:
+                        for region in regions:
+                            if 'bbox' in region:
+                                bx, by, bw, bh = region['bbox']
+                                region['bbox'] = (int(bx/scale), int(by/scale), int(bw/scale), int(bh/scale))
+                            if 'position' in region:
+                                px, py = region['position']
+                                region['position'] = (int(px/scale), int(py/scale))
+                    return regions
+                else:
+                    print(f"  ⚠️  OCR返回失败: {data.get('text', '')}")
 
             print(f"  ⚠️  OCR服务无响应，使用纯符号检测模式")
             return []
@@ -300,8 +780,8 @@ class PIDRecognitionService:
             print(f"  ❌ OCR异常: {e}")
             return []
 
-    def _parse_ocr_response(self, data: Dict, page_num: int) -> List[Dict]:
-        """解析OCR响应"""
+    def _parse_ocr_response(self, data: Dict, page_num: int, width: int, height: int) -> List[Dict]:
+        """解析OCR响应（带定位框的文字还原为上传图像的像素坐标）"""
         text = data.get('text', '')
         print(f"  ✅ OCR成功: {len(text)} 字符")
         if len(text) > 0:
@@ -309,13 +789,13 @@ class PIDRecognitionService:
 
         # 将文字拆分成多个文本区域（按行）
         text_regions = []
-        for i, line in enumerate(text.split('\n')):
-            if line.strip():
-                text_regions.append({
-                    'text': line.strip(),
-                    'page': page_num,
-                    'line': i
-                })
+        for i, line in enumerate(parse_ocr_lines(text, width, height)):
+            line['page'] = page_num
+            line['line'] = i
+            if 'bbox' in line:
+                bx, by, bw, bh = line['bbox']
+                line['position'] = (bx + bw // 2, by + bh // 2)
+            text_regions.append(line)
 
         return text_regions
 
@@ -327,33 +807,15 @@ class PIDRecognitionService:
             text = region['text']
             page = region['page']
 
-            # 匹配位号
-            tag_number = None
-            symbol_type = None
-
-            for tag_type, pattern in self.tag_patterns.items():
-                match = re.search(pattern, text)
-                if match:
-                    tag_number = match.group(0)
-                    symbol_type = tag_type
-                    break
+            # 匹配位号与参数（单次扫描）
+            lexed = self.tag_lexer.lex(text)
+            tag_number = lexed['tag']
+            symbol_type = lexed['type']
+            parameters = lexed['parameters']
 
             if not tag_number:
                 continue
 
-            # 提取参数
-            parameters = {}
-            for param_type, pattern in self.parameter_patterns.items():
-                match = re.search(pattern, text)
-                if match:
-                    try:
-                        parameters[param_type] = {
-                            'value': float(match.group(1)),
-                            'unit': match.group(2)
-                        }
-                    except:
-                        pass
-
             components.append({
                 'symbol_type': symbol_type,
                 'tag_number': tag_number,
@@ -366,19 +828,16 @@ class PIDRecognitionService:
 
         return components
 
-    def _detect_symbols_multiscale(self, image_path: str, page_num: int, legend_symbols: List[Dict] = None) -> List[Dict]:
-        """多尺度符号检测（增强版：圆+菱形+三角+小矩形+端口提取，基于图例匹配）"""
+    def _detect_symbols_multiscale(self, page: 'PIDPageImage', page_num: int, legend_symbols: List[Dict] = None,
+                                   template_bank: 'LegendTemplateBank' = None) -> List[Dict]:
+        """多尺度符号检测（增强版：圆+菱形+三角+小矩形+端口提取，基于图例模板匹配）"""
         if legend_symbols is None:
             legend_symbols = []
 
-        if not HAS_OPENCV:
+        if not HAS_OPENCV or page is None:
             return []
 
-        img = cv2.imread(image_path)
-        if img is None:
-            return []
-
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = page.gray
         h, w = gray.shape
         print(f"  🔍 符号检测输入图片: {w}x{h}px")
 
@@ -386,11 +845,57 @@ class PIDRecognitionService:
         valid_y_max = int(h * 0.85)
         valid_x_max = int(w * 0.95)
 
-        symbols = []
+        if self._use_tiled_detection(h, w):
+            # 大幅面图纸：分块并行检测，接缝处按核心区域归属拼接
+            detector = PIDTiledDetector(self, tile_size=self.tile_size, overlap=self.tile_overlap,
+                                        workers=self.tile_workers)
+            symbols, contour_symbols, vertex_counts = detector.detect(page, page_num, valid_x_max, valid_y_max,
+                                                                      template_bank)
+            symbols.extend(contour_symbols)
+        else:
+            # 1. 圆形检测（仅检测真正的仪表圆，严格控制）
+            # 只检测单一尺寸范围（18-35px半径）
+            circles = self._detect_circles(gray, minR=18, maxR=35, minDist=60, edges=page.edges)
+            symbols = self._circle_symbols(circles, page_num, valid_x_max, valid_y_max)
+
+            # 2. 轮廓检测（菱形、三角形、矩形） - 增强版
+            # 使用二值化代替Canny，检测更完整的轮廓
+            # 形态学闭运算，连接断裂边缘（生成新数组，不修改页面缓存）
+            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+            binary = cv2.morphologyEx(page.binary, cv2.MORPH_CLOSE, kernel)
+
+            # 排除图例区域
+            binary[valid_y_max:, :] = 0
+            binary[:, valid_x_max:] = 0
+
+            contour_symbols, vertex_counts = self._detect_contour_symbols(binary, page_num, valid_x_max, valid_y_max,
+                                                                          template_bank)
+            symbols.extend(contour_symbols)
 
-        # 1. 圆形检测（仅检测真正的仪表圆，严格控制）
-        # 只检测单一尺寸范围（18-35px半径）
-        circles = self._detect_circles(gray, minR=18, maxR=35, minDist=60)
+        circle_count = len([s for s in symbols if s['shape'] == 'circle'])
+        diamond_count = len([s for s in symbols if s['shape'] == 'diamond'])
+        triangle_count = len([s for s in symbols if s['shape'] == 'triangle'])
+        rect_count = len([s for s in symbols if s['shape'] == 'rectangle'])
+        legend_count = len([s for s in symbols if 'legend_description' in s])
+
+        print(f"  🔍 轮廓顶点分布: {sorted(vertex_counts.items())}")
+        print(f"  ✅ 检测符号: {len(symbols)} 个 (圆:{circle_count}, 菱形:{diamond_count}, 三角:{triangle_count}, 矩:{rect_count})")
+        if template_bank is not None and len(template_bank) > 0:
+            print(f"  ✅ 图例模板匹配: {legend_count} 个")
+
+        return self._deduplicate_symbols(symbols)
+
+    def _use_tiled_detection(self, h: int, w: int) -> bool:
+        """是否使用分块检测"""
+        if self.tiled_detection == 'on':
+            return True
+        if self.tiled_detection == 'off':
+            return False
+        return h * w > self.tiled_min_pixels
+
+    def _circle_symbols(self, circles, page_num: int, valid_x_max: int, valid_y_max: int) -> List[Dict]:
+        """Hough圆 → 仪表符号（排除图例/标题栏区域）"""
+        symbols = []
         for x, y, r in circles:
             if y < valid_y_max and x < valid_x_max:
                 symbols.append({
@@ -403,127 +908,105 @@ class PIDRecognitionService:
                     'source': 'opencv_circle',
                     'ports': [(int(x), int(y-r)), (int(x), int(y+r)), (int(x-r), int(y)), (int(x+r), int(y))]
                 })
+        return symbols
 
-        # 2. 轮廓检测（菱形、三角形、矩形） - 增强版
-        # 使用二值化代替Canny，检测更完整的轮廓
-        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-
-        # 形态学闭运算，连接断裂边缘
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
-
-        # 排除图例区域
-        binary[valid_y_max:, :] = 0
-        binary[:, valid_x_max:] = 0
+    def _detect_contour_symbols(self, binary, page_num: int, valid_x_max: int, valid_y_max: int,
+                                template_bank: 'LegendTemplateBank' = None) -> Tuple[List[Dict], Dict[int, int]]:
+        """轮廓符号检测（菱形、三角形、矩形 + 图例模板匹配），返回 (符号列表, 候选轮廓顶点分布)"""
+        symbols = []
 
         contours, _ = cv2.findContours(binary, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
 
-        # 调试：统计顶点分布
-        vertex_counts = {}
+        # 批量计算面积/质心/外接矩形，先向量化过滤，只对候选做多边形近似
+        stats = contour_stats(contours)
+        area = stats['area']
+        cx_all, cy_all = stats['cx'], stats['cy']
+        bw, bh = stats['w'], stats['h']
 
-        for cnt in contours:
-            area = cv2.contourArea(cnt)
-            if area < 60:  # 过小噪点
-                continue
-            if area > 50000:  # 过大边框
-                continue
+        # 过小噪点(<60)、过大边框(>50000)、各类符号面积上限(15000)之外、质心无效或在排除区域
+        candidate = (
+            (area >= 60) & (area < 15000) & (stats['m00'] != 0) &
+            (cy_all < valid_y_max) & (cx_all < valid_x_max)
+        )
+        idx = np.flatnonzero(candidate)
 
-            # 多边形近似（尝试多个epsilon值，选择最佳）
+        # 多边形近似（仅候选轮廓）
+        approxes = []
+        for i in idx:
+            cnt = contours[i]
             perimeter = cv2.arcLength(cnt, True)
-            if perimeter == 0:
-                continue
-
-            # 先用更保守的参数尝试
-            approx = cv2.approxPolyDP(cnt, 0.03 * perimeter, True)  # 从0.02调回0.03
-            vertices = len(approx)
-
-            vertex_counts[vertices] = vertex_counts.get(vertices, 0) + 1
-
-            # 中心点
-            M = cv2.moments(cnt)
-            if M['m00'] == 0:
-                continue
-            cx = int(M['m10'] / M['m00'])
-            cy = int(M['m01'] / M['m00'])
-
-            if cy >= valid_y_max or cx >= valid_x_max:
-                continue
-
-            # 外接矩形
-            x, y, w, h = cv2.boundingRect(cnt)
-            aspect_ratio = float(w) / h if h > 0 else 0
-            bbox_area = w * h
-            area_ratio = area / bbox_area if bbox_area > 0 else 0
-
-            # 3. 三角形（手动阀门、流向指示）
-            if vertices == 3 and 30 < area < 8000:  # 降低下限从80→30
-                ports = [tuple(pt[0].astype(int)) for pt in approx]
-                symbols.append({
-                    'symbol_type': 'manual_valve',
-                    'shape': 'triangle',
-                    'position': [cx, cy],
-                    'bbox': (x, y, w, h),
-                    'page': page_num,
-                    'confidence': 0.8,
-                    'source': 'opencv_triangle',
-                    'ports': ports
-                })
-
-            # 4. 四边形 - 区分菱形和矩形
-            elif vertices == 4:
-                # 菱形：宽高比0.4-2.5，面积比0.2-0.8（进一步放宽）
-                if 0.4 < aspect_ratio < 2.5 and 0.20 < area_ratio < 0.80 and 30 < area < 15000:  # 降低下限从80→30
-                    ports = [tuple(pt[0].astype(int)) for pt in approx]
-                    symbols.append({
-                        'symbol_type': 'valve',
-                        'shape': 'diamond',
-                        'position': [cx, cy],
-                        'bbox': (x, y, w, h),
-                        'page': page_num,
-                        'confidence': 0.85,
-                        'source': 'opencv_diamond',
-                        'ports': ports
-                    })
-
-                # 正方形矩形（控制器、过滤器）
-                elif 0.7 < aspect_ratio < 1.4 and area_ratio > 0.75 and 60 < area < 2000:
-                    ports = [tuple(pt[0].astype(int)) for pt in approx]
-                    symbols.append({
-                        'symbol_type': 'filter_or_controller',
-                        'shape': 'rectangle',
-                        'position': [cx, cy],
-                        'bbox': (x, y, w, h),
-                        'page': page_num,
-                        'confidence': 0.75,
-                        'source': 'opencv_square_rect',
-                        'ports': ports
-                    })
-
-                # 长矩形（流量计、管道配件）
-                elif (aspect_ratio > 1.4 or aspect_ratio < 0.7) and area_ratio > 0.75 and 100 < area < 4000:
-                    ports = [tuple(pt[0].astype(int)) for pt in approx]
-                    symbols.append({
-                        'symbol_type': 'flow_meter',
-                        'shape': 'rectangle',
-                        'position': [cx, cy],
-                        'bbox': (x, y, w, h),
-                        'page': page_num,
-                        'confidence': 0.7,
-                        'source': 'opencv_long_rect',
-                        'ports': ports
-                    })
-
-        circle_count = len([s for s in symbols if s['shape'] == 'circle'])
-        diamond_count = len([s for s in symbols if s['shape'] == 'diamond'])
-        triangle_count = len([s for s in symbols if s['shape'] == 'triangle'])
-        rect_count = len([s for s in symbols if s['shape'] == 'rectangle'])
-
-        print(f"  🔍 轮廓顶点分布: {sorted(vertex_counts.items())}")
-        print(f"  ✅ 检测符号: {len(symbols)} 个 (圆:{circle_count}, 菱形:{diamond_count}, 三角:{triangle_count}, 矩:{rect_count})")
-
-        return self._deduplicate_symbols(symbols)
-
-    def _detect_leader_lines(self, image_path: str) -> List[Dict]:
+            approxes.append(cv2.approxPolyDP(cnt, 0.03 * perimeter, True))  # 从0.02调回0.03
+        vertices = np.fromiter((len(a) for a in approxes), dtype=np.int64, count=len(approxes))
+
+        # 调试：统计候选轮廓的顶点分布
+        v_values, v_counts = np.unique(vertices, return_counts=True)
+        vertex_counts = dict(zip(v_values.tolist(), v_counts.tolist()))
+
+        # 形状分类（数组掩码）
+        c_area = area[idx]
+        aspect_ratio = bw[idx] / bh[idx]
+        area_ratio = c_area / (bw[idx] * bh[idx])
+
+        # 3. 三角形（手动阀门、流向指示）
+        is_triangle = (vertices == 3) & (c_area < 8000)
+        # 4. 四边形 - 区分菱形和矩形
+        is_quad = vertices == 4
+        # 菱形：宽高比0.4-2.5，面积比0.2-0.8（进一步放宽）
+        is_diamond = is_quad & (aspect_ratio > 0.4) & (aspect_ratio < 2.5) & \
+            (area_ratio > 0.20) & (area_ratio < 0.80)
+        # 正方形矩形（控制器、过滤器）
+        is_square = is_quad & ~is_diamond & (aspect_ratio > 0.7) & (aspect_ratio < 1.4) & \
+            (area_ratio > 0.75) & (c_area > 60) & (c_area < 2000)
+        # 长矩形（流量计、管道配件）
+        is_long = is_quad & ~is_diamond & ~is_square & ((aspect_ratio > 1.4) | (aspect_ratio < 0.7)) & \
+            (area_ratio > 0.75) & (c_area > 100) & (c_area < 4000)
+
+        contour_classes = [
+            (is_triangle, 'manual_valve', 'triangle', 0.8, 'opencv_triangle'),
+            (is_diamond, 'valve', 'diamond', 0.85, 'opencv_diamond'),
+            (is_square, 'filter_or_controller', 'rectangle', 0.75, 'opencv_square_rect'),
+            (is_long, 'flow_meter', 'rectangle', 0.7, 'opencv_long_rect'),
+        ]
+        labels = np.full(len(idx), -1, dtype=np.int64)
+        for k, (mask, *_) in enumerate(contour_classes):
+            labels[mask] = k
+
+        # 图例模板匹配：候选轮廓批量计算描述子，与本图纸的模板库比对
+        matched = np.full(len(idx), -1, dtype=np.int64)
+        match_dist = np.full(len(idx), np.inf)
+        if template_bank is not None and len(template_bank) > 0 and len(idx) > 0:
+            matched, match_dist = template_bank.match(shape_descriptors([contours[i] for i in idx]))
+        # 未按顶点分类、但与图例模板高度相似的候选提升为图例符号
+        promoted = (labels < 0) & (matched >= 0) & (match_dist < PROMOTE_THRESHOLD)
+
+        # 只为分类成功或提升的轮廓生成符号（保持轮廓原顺序）
+        for j in np.flatnonzero((labels >= 0) | promoted):
+            i = idx[j]
+            if labels[j] >= 0:
+                symbol_type, shape, confidence, source = contour_classes[labels[j]][1:]
+            else:
+                entry = template_bank.entries[matched[j]]
+                symbol_type, shape, confidence, source = 'legend_symbol', entry['type'], 0.7, 'legend_template'
+            symbol = {
+                'symbol_type': symbol_type,
+                'shape': shape,
+                'position': [int(cx_all[i]), int(cy_all[i])],
+                'bbox': (int(stats['x'][i]), int(stats['y'][i]), int(bw[i]), int(bh[i])),
+                'page': page_num,
+                'confidence': confidence,
+                'source': source,
+                'ports': [tuple(pt[0].astype(int)) for pt in approxes[j]]
+            }
+            if matched[j] >= 0:
+                entry = template_bank.entries[matched[j]]
+                symbol['legend_type'] = entry['type']
+                symbol['legend_description'] = entry['description']
+                symbol['legend_distance'] = round(float(match_dist[j]), 3)
+            symbols.append(symbol)
+
+        return symbols, vertex_counts
+
+    def _detect_leader_lines(self, page: 'PIDPageImage') -> List[Dict]:
         """检测引线（细线，通常连接文字和符号）- 简化版，禁用以提高性能"""
         # 引线检测在没有OCR文字的情况下意义不大，暂时禁用
         # 返回空列表，避免过多无用的线段检测
@@ -532,9 +1015,22 @@ class PIDRecognitionService:
 
     def _trace_text_to_symbol(self, text_regions: List[Dict], leader_lines: List[Dict],
                                symbols: List[Dict]) -> Dict[str, Dict]:
-        """追踪文字→引线→符号的关联"""
+        """追踪文字→引线→符号的关联
+
+        引线端点与符号锚点（中心、端口）分别放入网格索引，单元边长取匹配容差，
+        每个出射点/引线端只与相邻单元内的候选比较；候选按原下标顺序遍历，结果与全量扫描一致。
+        """
         text_to_symbol = {}
 
+        endpoint_index = PointGroupIndex(10)
+        for i, line in enumerate(leader_lines):
+            endpoint_index.insert(i, (line['start'], line['end']))
+
+        anchor_index = PointGroupIndex(30)
+        for j, symbol in enumerate(symbols):
+            if 'position' in symbol:
+                anchor_index.insert(j, [symbol['position']] + list(symbol.get('ports') or []))
+
         for text_region in text_regions:
             if 'bbox' not in text_region:
                 continue
@@ -554,7 +1050,8 @@ class PIDRecognitionService:
             min_dist = float('inf')
 
             for shoot_pt in shoot_pts:
-                for line in leader_lines:
+                for i in endpoint_index.candidates(*shoot_pt):
+                    line = leader_lines[i]
                     dist_start = self._point_distance(shoot_pt, line['start'])
                     dist_end = self._point_distance(shoot_pt, line['end'])
                     dist = min(dist_start, dist_end)
@@ -572,9 +1069,8 @@ class PIDRecognitionService:
                 closest_symbol = None
                 min_sym_dist = float('inf')
 
-                for symbol in symbols:
-                    if 'position' not in symbol:
-                        continue
+                for j in anchor_index.candidates(*line_far_end):
+                    symbol = symbols[j]
                     sym_pos = tuple(symbol['position'])
                     dist = self._point_distance(line_far_end, sym_pos)
 
@@ -595,18 +1091,62 @@ class PIDRecognitionService:
 
         return text_to_symbol
 
+    def _merge_components(self, text_components: List[Dict], symbols: List[Dict],
+                          text_to_symbol_map: Dict[str, Dict], text_regions: List[Dict]) -> List[Dict]:
+        """合并文字与符号：引线追踪关联，失败时回退到邻近匹配"""
+        try:
+            components = self._merge_with_leader_trace(text_components, symbols, text_to_symbol_map)
+            print(f"  ✅ 合并后组件: {len(components)} 个")
+        except Exception as e:
+            print(f"  ⚠️  组件合并失败，回退到邻近匹配: {e}")
+            components = self._merge_text_and_symbols(text_components, symbols, text_regions)
+            print(f"  ✅ 合并后组件(回退): {len(components)} 个")
+        return components
+
+    def _infer_sheet_connections(self, components: List[Dict], page_num: int, pipe_graph: Dict = None,
+                                 trace: bool = True) -> List[Dict]:
+        """推断一张图纸内的连接：端口邻接，trace且有骨架图时再沿管线骨架追踪补充"""
+        if not components:
+            return []
+        try:
+            connections = self._infer_connections_by_ports(components, [])
+            print(f"  ✅ 推断连接(端口邻接): {len(connections)} 条")
+        except Exception as e:
+            print(f"  ⚠️  端口连接推断失败，回退到旧方法: {e}")
+            connections = self._infer_connections(components, page_num, pipe_graph)
+            print(f"  ✅ 推断连接(回退): {len(connections)} 条")
+            return connections
+
+        if trace and pipe_graph is not None:
+            try:
+                traced = self._infer_connections(components, page_num, pipe_graph)
+                known = {frozenset((c['from'], c['to'])) for c in connections}
+                added = [c for c in traced if frozenset((c['from'], c['to'])) not in known]
+                connections.extend(added)
+                print(f"  ✅ 推断连接(管线追踪): 新增 {len(added)} 条")
+            except Exception as e:
+                print(f"  ⚠️  管线追踪失败: {e}")
+        return connections
+
     def _merge_with_leader_trace(self, text_components: List[Dict], symbols: List[Dict],
                                   text_to_symbol_map: Dict[str, Dict]) -> List[Dict]:
         """用引线追踪结果合并文字和符号"""
         merged = []
         symbol_counter = {}
 
+        # 已占用位置集合（原为逐个比较merged中的位置）；键带上类型，保持 list 与 tuple 不相等的比较语义
+        used_positions = set()
+
+        def position_key(pos):
+            return None if pos is None else (type(pos), tuple(pos))
+
         # 先添加有引线关联的组件
         for text_comp in text_components:
             tag = text_comp.get('tag_number', '')
             if tag in text_to_symbol_map:
                 symbol = text_to_symbol_map[tag]
-                merged.append({
+                used_positions.add(position_key(symbol.get('position')))
+                merged.append(self._copy_legend_fields(symbol, {
                     'tag_number': tag,
                     'symbol_type': symbol.get('symbol_type'),
                     'position': symbol.get('position'),
@@ -615,13 +1155,14 @@ class PIDRecognitionService:
                     'page': symbol.get('page'),
                     'source': 'leader_traced',
                     'confidence': min(text_comp.get('confidence', 0.9), symbol.get('confidence', 0.8))
-                })
+                }))
 
         # 剩余未关联符号分配自动位号
         for symbol in symbols:
-            already_used = any(m.get('position') == symbol.get('position') for m in merged)
-            if already_used:
+            key = position_key(symbol.get('position'))
+            if key in used_positions:
                 continue
+            used_positions.add(key)
 
             symbol_type = symbol.get('symbol_type', 'unknown')
             if symbol_type not in symbol_counter:
@@ -629,7 +1170,7 @@ class PIDRecognitionService:
             symbol_counter[symbol_type] += 1
 
             auto_tag = self._generate_auto_tag(symbol_type, symbol_counter[symbol_type])
-            merged.append({
+            merged.append(self._copy_legend_fields(symbol, {
                 'tag_number': auto_tag,
                 'symbol_type': symbol_type,
                 'position': symbol.get('position'),
@@ -638,11 +1179,18 @@ class PIDRecognitionService:
                 'page': symbol.get('page'),
                 'source': 'auto_generated',
                 'confidence': symbol.get('confidence', 0.7)
-            })
+            }))
 
         print(f"  ✅ 合并后组件: {len(merged)} 个 (引线关联:{len([m for m in merged if m['source']=='leader_traced'])}, 自动生成:{len([m for m in merged if m['source']=='auto_generated'])})")
         return merged
 
+    def _copy_legend_fields(self, symbol: Dict, component: Dict) -> Dict:
+        """将符号的图例匹配结果（如有）带入组件"""
+        for key in ('legend_type', 'legend_description', 'legend_distance'):
+            if key in symbol:
+                component[key] = symbol[key]
+        return component
+
     def _generate_auto_tag(self, symbol_type: str, index: int) -> str:
         """生成自动位号"""
         prefix_map = {
@@ -657,44 +1205,60 @@ class PIDRecognitionService:
         return f"{prefix}-{index:03d}"
 
     def _infer_connections_by_ports(self, components: List[Dict], leader_lines: List[Dict],
-                                     image_path: str = None) -> List[Dict]:
-        """基于端口邻接推断连接"""
-        connections = []
-
-        # 端口对端口连接检测
-        for i, comp1 in enumerate(components):
-            if 'ports' not in comp1 or not comp1['ports']:
-                continue
-
-            for j, comp2 in enumerate(components[i+1:], start=i+1):
-                if 'ports' not in comp2 or not comp2['ports']:
-                    continue
+                                     page: 'PIDPageImage' = None) -> List[Dict]:
+        """基于端口邻接推断连接
 
-                # 检查任意端口对之间的距离
-                for port1 in comp1['ports']:
-                    for port2 in comp2['ports']:
-                        dist = self._point_distance(port1, port2)
+        所有端口放入网格索引，只比较200px半径内的端口对（原为逐对组件×逐对端口）。
+        每对组件取端口双重循环顺序下第一对距离<200的端口，输出顺序与逐对比较一致。
+        """
+        connections = []
 
-                        # 端口距离小于200px认为连接（放宽阈值以提高检测率）
-                        if dist < 200:
-                            connections.append({
-                                'from': comp1['tag_number'],
-                                'to': comp2['tag_number'],
-                                'port_distance': round(dist, 2),
-                                'confidence': max(0.3, 1.0 - dist / 200),  # 调整置信度计算
-                                'page': comp1['page']
-                            })
-                            break  # 找到一对即可
-                    else:
-                        continue
-                    break  # 双重循环break
+        # 按组件顺序展开所有端口（同一组件的端口下标连续）
+        points = []
+        owners = []
+        for i, comp in enumerate(components):
+            for port in comp.get('ports') or []:
+                points.append((port[0], port[1]))
+                owners.append(i)
+
+        if not points:
+            print(f"  ✅ 推断连接: 0 条（基于端口邻接）")
+            return connections
+
+        owners = np.asarray(owners, dtype=np.int64)
+
+        # 端口距离小于200px认为连接（放宽阈值以提高检测率）
+        a, b, dist = radius_pairs(points, 200)
+
+        # 同一组件内部的端口对不算连接；a < b 保证 owners[a] <= owners[b]
+        between = owners[a] < owners[b]
+        a, b, dist = a[between], b[between], dist[between]
+
+        # 按 (组件i, 组件j, 端口1, 端口2) 排序，每对组件取第一对端口
+        ordering = np.lexsort((b, a, owners[b], owners[a]))
+        a, b, dist = a[ordering], b[ordering], dist[ordering]
+        pair_keys = owners[a] * len(components) + owners[b]
+        first = np.ones(len(pair_keys), dtype=bool)
+        first[1:] = pair_keys[1:] != pair_keys[:-1]
+
+        for port1, port2, d in zip(a[first], b[first], dist[first]):
+            comp1 = components[owners[port1]]
+            comp2 = components[owners[port2]]
+            connections.append({
+                'from': comp1['tag_number'],
+                'to': comp2['tag_number'],
+                'port_distance': round(d, 2),
+                'confidence': max(0.3, 1.0 - d / 200),  # 调整置信度计算
+                'page': comp1['page']
+            })
 
         print(f"  ✅ 推断连接: {len(connections)} 条（基于端口邻接）")
         return connections
 
-    def _detect_circles(self, gray_img, minR: int, maxR: int, minDist: int) -> List[Tuple[int, int, int]]:
-        """检测指定尺寸范围的圆形符号"""
-        edges = cv2.Canny(gray_img, 50, 150)
+    def _detect_circles(self, gray_img, minR: int, maxR: int, minDist: int, edges=None) -> List[Tuple[int, int, int]]:
+        """检测指定尺寸范围的圆形符号（可传入已缓存的Canny边缘图）"""
+        if edges is None:
+            edges = cv2.Canny(gray_img, 50, 150)
 
         # 形态学闭运算
         kernel = np.ones((3,3), np.uint8)
@@ -764,11 +1328,16 @@ class PIDRecognitionService:
         return rectangles
 
     def _deduplicate_symbols(self, symbols: List[Dict]) -> List[Dict]:
-        """去重：合并重叠的符号"""
+        """去重：合并重叠的符号
+
+        已保留的符号按40px网格索引，只检查相邻单元；命中规则与顺序扫描一致
+        （取下标最小的重复项，置信度更高时替换并移动到新位置所在单元）。
+        """
         if len(symbols) == 0:
             return []
 
         filtered = []
+        grid = GridIndex(40)
 
         for sym in symbols:
             pos1 = sym.get('position')
@@ -778,12 +1347,9 @@ class PIDRecognitionService:
             x1, y1 = pos1
             is_dup = False
 
-            for j, existing in enumerate(filtered):
-                pos2 = existing.get('position')
-                if not pos2:
-                    continue
-
-                x2, y2 = pos2
+            for j in grid.candidates(x1, y1):
+                existing = filtered[j]
+                x2, y2 = existing['position']
                 distance = np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
 
                 # 距离小于40px认为重复
@@ -791,10 +1357,12 @@ class PIDRecognitionService:
                     # 保留置信度更高的
                     if sym.get('confidence', 0) > existing.get('confidence', 0):
                         filtered[j] = sym
+                        grid.move(j, (x2, y2), (x1, y1))
                     is_dup = True
                     break
 
             if not is_dup:
+                grid.insert(len(filtered), x1, y1)
                 filtered.append(sym)
 
         return filtered
@@ -807,6 +1375,14 @@ class PIDRecognitionService:
         for comp in text_components:
             merged.append(comp)
 
+        # 位号 → 第一个该位号的组件（原为逐个扫描merged）
+        by_tag = {}
+        for comp in merged:
+            by_tag.setdefault(comp.get('tag_number'), comp)
+
+        # 位号文字只分析一次，按坐标建索引
+        tag_index = TagIndex(all_text_regions, self.tag_lexer)
+
         # 为没有匹配文字的符号分配位号
         symbol_counter = {}
 
@@ -816,11 +1392,11 @@ class PIDRecognitionService:
                 continue
 
             # 检查附近是否有文字位号
-            nearby_tag = self._find_nearby_tag(pos, all_text_regions)
+            nearby_tag = self._find_nearby_tag(pos, tag_index, symbol.get('page'))
 
             if nearby_tag:
                 # 检查是否已经存在该位号
-                existing = next((c for c in merged if c.get('tag_number') == nearby_tag['tag']), None)
+                existing = by_tag.get(nearby_tag['tag'])
 
                 if existing:
                     # 更新位置信息
@@ -830,9 +1406,10 @@ class PIDRecognitionService:
                         existing['radius'] = symbol['radius']
                     if 'bbox' in symbol:
                         existing['bbox'] = symbol['bbox']
+                    self._copy_legend_fields(symbol, existing)
                 else:
                     # 新建组件
-                    merged.append({
+                    component = self._copy_legend_fields(symbol, {
                         'tag_number': nearby_tag['tag'],
                         'symbol_type': nearby_tag.get('type', symbol.get('symbol_type')),
                         'parameters': nearby_tag.get('parameters', {}),
@@ -842,6 +1419,8 @@ class PIDRecognitionService:
                         'source': 'symbol_with_text',
                         'confidence': min(symbol.get('confidence', 0.7), nearby_tag.get('confidence', 0.9))
                     })
+                    merged.append(component)
+                    by_tag[nearby_tag['tag']] = component
             else:
                 # 没有找到附近文字,生成自动位号
                 symbol_type = symbol.get('symbol_type', 'unknown')
@@ -858,7 +1437,7 @@ class PIDRecognitionService:
                     'tank_or_equipment': 'T',
                 }.get(symbol_type, 'X')
 
-                merged.append({
+                merged.append(self._copy_legend_fields(symbol, {
                     'tag_number': f"{tag_prefix}-{symbol_counter[symbol_type]:03d}",
                     'symbol_type': symbol_type,
                     'parameters': {},
@@ -870,188 +1449,38 @@ class PIDRecognitionService:
                     'size': symbol.get('size'),
                     'source': 'symbol_detection',
                     'confidence': symbol.get('confidence', 0.7)
-                })
+                }))
+                by_tag.setdefault(merged[-1]['tag_number'], merged[-1])
 
                 symbol_counter[symbol_type] += 1
 
         return merged
 
-    def _find_nearby_tag(self, position: List[int], text_regions: List[Dict]) -> Dict:
-        """在符号附近查找位号文字"""
+    def _find_nearby_tag(self, position: List[int], tag_index: 'TagIndex', page: int = None) -> Dict:
+        """在符号附近查找位号文字（位号索引中距离最近的一条）"""
         x, y = position
+        entry = tag_index.nearest(x, y, page)
+        if entry is None:
+            return None
 
-        for region in text_regions:
-            text = region.get('text', '')
-
-            # 检查是否包含位号
-            for tag_type, pattern in self.tag_patterns.items():
-                match = re.search(pattern, text)
-                if match:
-                    tag = match.group(0)
-
-                    # 提取参数
-                    parameters = {}
-                    for param_type, param_pattern in self.parameter_patterns.items():
-                        param_match = re.search(param_pattern, text)
-                        if param_match:
-                            try:
-                                parameters[param_type] = {
-                                    'value': float(param_match.group(1)),
-                                    'unit': param_match.group(2)
-                                }
-                            except:
-                                pass
-
-                    return {
-                        'tag': tag,
-                        'type': tag_type,
-                        'parameters': parameters,
-                        'confidence': 0.9
-                    }
-
-        return None
+        return {
+            'tag': entry['tag'],
+            'type': entry['type'],
+            'parameters': dict(entry['parameters']),
+            'confidence': 0.9
+        }
 
     def _point_distance(self, p1, p2):
         """计算两点距离"""
         return np.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
 
-    def _point_to_line_distance(self, px, py, x1, y1, x2, y2):
-        """计算点到线段的最短距离"""
-        # 线段长度的平方
-        line_len_sq = (x2 - x1)**2 + (y2 - y1)**2
-
-        if line_len_sq == 0:
-            # 线段退化为点
-            return np.sqrt((px - x1)**2 + (py - y1)**2)
-
-        # 计算投影参数t
-        t = max(0, min(1, ((px - x1) * (x2 - x1) + (py - y1) * (y2 - y1)) / line_len_sq))
-
-        # 投影点坐标
-        proj_x = x1 + t * (x2 - x1)
-        proj_y = y1 + t * (y2 - y1)
-
-        # 点到投影点的距离
-        return np.sqrt((px - proj_x)**2 + (py - proj_y)**2)
-
-    def _point_position_on_line(self, point, line):
-        """计算点在线段上的投影位置（用于排序）"""
-        px, py = point
-        x1, y1, x2, y2 = line
-
-        line_len_sq = (x2 - x1)**2 + (y2 - y1)**2
-        if line_len_sq == 0:
-            return 0
-
-        t = ((px - x1) * (x2 - x1) + (py - y1) * (y2 - y1)) / line_len_sq
-        return max(0, min(1, t))
-
-    def _detect_pipe_lines(self, image_path: str) -> List[Dict]:
-        """检测PID图中的管线（过滤边框）"""
-        img = cv2.imread(image_path)
-        if img is None:
-            return []
-
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        h, w = gray.shape
-
-        # 排除底部和右侧区域（图例和标题栏）
-        valid_y_min = 50  # 排除顶部边框
-        valid_y_max = int(h * 0.75)
-        valid_x_min = 50  # 排除左侧边框
-        valid_x_max = int(w * 0.90)
-
-        # 边缘检测
-        edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-
-        # 只保留有效区域
-        edges[:valid_y_min, :] = 0
-        edges[valid_y_max:, :] = 0
-        edges[:, :valid_x_min] = 0
-        edges[:, valid_x_max:] = 0
-
-        # Hough直线检测（降低阈值）
-        lines = cv2.HoughLinesP(
-            edges,
-            rho=1,
-            theta=np.pi/180,
-            threshold=60,       # 进一步降低到60
-            minLineLength=80,   # 降低最小长度到80
-            maxLineGap=20       # 增加允许间隙到20
-        )
-
-        detected_lines = []
-        if lines is not None:
-            for line in lines:
-                x1, y1, x2, y2 = line[0]
-
-                # 过滤边框线
-                is_top_edge = y1 < 100 and y2 < 100
-                is_bottom_edge = y1 > h - 100 and y2 > h - 100
-                is_left_edge = x1 < 100 and x2 < 100
-                is_right_edge = x1 > w - 100 and x2 > w - 100
-
-                if is_top_edge or is_bottom_edge or is_left_edge or is_right_edge:
-                    continue
-
-                length = np.sqrt((x2-x1)**2 + (y2-y1)**2)
-
-                # 放宽长度限制
-                if 80 < length < 1500:  # 80-1500px
-                    # 只保留接近水平或垂直的线段
-                    angle = np.abs(np.arctan2(y2-y1, x2-x1) * 180 / np.pi)
-                    is_horizontal = angle < 15 or angle > 165  # 放宽到15度
-                    is_vertical = 75 < angle < 105  # 放宽到75-105度
-
-                    if is_horizontal or is_vertical:
-                        detected_lines.append({
-                            'endpoints': (x1, y1, x2, y2),
-                            'length': length,
-                            'angle': angle
-                        })
-
-        print(f"  ✅ 检测管线: {len(detected_lines)} 条")
-        return detected_lines
-
-    def _infer_connections(self, components: List[Dict], image_path: str = None) -> List[Dict]:
-        """推断连接关系（基于管线检测）"""
+    def _infer_connections(self, components: List[Dict], page_num: int = 0, pipe_graph: Dict = None) -> List[Dict]:
+        """推断连接关系（基于管线骨架图追踪）"""
         connections = []
 
-        # 如果有图片，检测管线
-        if image_path and os.path.exists(image_path):
-            lines = self._detect_pipe_lines(image_path)
-
-            # 对每条线，找出附近的组件（使用点到线段距离）
-            for line in lines:
-                x1, y1, x2, y2 = line['endpoints']
-
-                # 找所有在管线附近的组件（50px以内）
-                nearby_comps = []
-                for comp in components:
-                    if 'position' not in comp:
-                        continue
-                    cx, cy = comp['position']
-                    dist = self._point_to_line_distance(cx, cy, x1, y1, x2, y2)
-                    if dist < 50:  # 50px阈值
-                        nearby_comps.append((comp, dist))
-
-                # 如果有2个或更多组件在这条管线上，它们相互连接
-                if len(nearby_comps) >= 2:
-                    # 按在管线上的位置排序
-                    nearby_comps.sort(key=lambda c: self._point_position_on_line(c[0]['position'], (x1, y1, x2, y2)))
-
-                    # 顺序连接
-                    for i in range(len(nearby_comps) - 1):
-                        comp1, dist1 = nearby_comps[i]
-                        comp2, dist2 = nearby_comps[i+1]
-
-                        connections.append({
-                            'from': comp1['tag_number'],
-                            'to': comp2['tag_number'],
-                            'line_length': round(line['length'], 2),
-                            'confidence': 0.8,
-                            'page': comp1['page']
-                        })
+        # 如果有骨架图，沿管线骨架追踪组件间连接
+        if pipe_graph is not None:
+            connections = PIDPipeTracer().trace_graph(pipe_graph, components, page_num)
         else:
             # 降级到邻近检测（距离阈值增加到300px）
             for i, comp1 in enumerate(components):
@@ -1085,11 +1514,15 @@ class PIDRecognitionService:
 
         return connections
 
-    def _create_visualization(self, image_path: str, components: List[Dict], page_num: int, legend_symbols: List[Dict] = None) -> str:
-        """创建可视化标注图"""
-        img = cv2.imread(image_path)
-        if img is None:
+    def _create_visualization(self, page: 'PIDPageImage', components: List[Dict], page_num: int,
+                              legend_symbols: List[Dict] = None, outputs: Dict = None) -> Optional[Dict]:
+        """创建可视化标注图，按输出计划写PNG/WebP预览/瓦片，返回实际写出的文件"""
+        if page is None:
             return None
+        if outputs is None:
+            outputs = self._visualization_outputs(page_num, uuid.uuid4().hex[:8])
+
+        img = page.image
 
         annotated = img.copy()
         h, w = img.shape[:2]
@@ -1214,53 +1647,118 @@ class PIDRecognitionService:
             cv2.putText(annotated, tag, (bg_x1 + 2, bg_y2 - 2),
                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
 
-        # 保存到uploads目录
-        upload_dir = Path(__file__).parent.parent.parent / 'uploads' / 'pid_annotations'
-        upload_dir.mkdir(parents=True, exist_ok=True)
-
-        filename = f'annotated_{page_num}_{uuid.uuid4().hex[:8]}.png'
-        output_path = upload_dir / filename
-
-        cv2.imwrite(str(output_path), annotated)
-        print(f"  ✅ 已保存标注图: {filename}")
+        # 保存到uploads目录：全分辨率PNG、降采样预览、瓦片
+        VISUALIZATION_DIR.mkdir(parents=True, exist_ok=True)
+        written = {'page': page_num}
+        if outputs.get('preview'):
+            try:
+                written['preview'] = write_preview(annotated, Path(outputs['preview']),
+                                                   self.visualization_preview_size)['path']
+            except OSError as e:
+                print(f"  ⚠️  预览图写入失败: {e}")
+        if outputs.get('tiles'):
+            try:
+                written['tiles'] = write_tiles(annotated, Path(outputs['tiles']).parent,
+                                               self.visualization_tile_size)['path']
+            except OSError as e:
+                print(f"  ⚠️  瓦片写入失败: {e}")
+
+        # 未生成PNG时预览图代替整页标注图；预览写入失败则回退写PNG
+        image_path = outputs.get('image')
+        if image_path is None and outputs.get('preview') and 'preview' not in written:
+            image_path = outputs['preview'].replace('_preview.webp', '.png')
+        if image_path:
+            if cv2.imwrite(image_path, annotated):
+                written['image'] = image_path
+                print(f"  ✅ 已保存标注图: {Path(image_path).name}")
+            else:
+                print(f"  ⚠️  标注图写入失败: {Path(image_path).name}")
+
+        return written
+
+    def _load_legend(self, page: 'PIDPageImage', source: str = '') -> Tuple[List[Dict], 'LegendTemplateBank']:
+        """图例库命中则直接复用，否则提取图例并写入图例库"""
+        key = self._legend_key(page) if self.legend_library is not None else None
+        if key is not None:
+            cached = self.legend_library.lookup(key)
+            if cached is not None:
+                print(f"  📚 图例库命中: {key[:12]}...，跳过图例提取")
+                return cached
+
+        legend_symbols, legend_templates, ocr_done = self._extract_legend_entries(page)
+        template_bank = LegendTemplateBank.from_templates(legend_templates)
+        # 图例OCR未运行或失败时描述为空，不写入图例库（否则同图例的后续图纸都会跳过图例OCR）
+        if key is not None and not ocr_done:
+            print(f"  ⚠️  图例OCR未完成，不写入图例库")
+        elif key is not None:
+            try:
+                self.legend_library.store(key, legend_symbols, template_bank, source)
+                print(f"  📚 图例已写入图例库: {key[:12]}...")
+            except (OSError, TypeError, ValueError) as e:
+                print(f"  ⚠️  图例库写入失败: {e}")
+        return legend_symbols, template_bank
+
+    def _legend_key(self, page: 'PIDPageImage') -> Optional[str]:
+        """图例库键：图例区域的感知哈希（图例区域空白时为None）"""
+        h, w = page.gray.shape
+        x1, y1, x2, y2 = legend_region(h, w)
+        return legend_hash(page.gray[y1:y2, x1:x2])
+
+    def seed_legend_library(self, pdf_path: str, page_num: int = 0) -> Dict:
+        """用参考图纸预置图例库（强制重新提取并覆盖同键条目）"""
+        if self.legend_library is None:
+            raise RuntimeError('未配置图例库目录（PID_LEGEND_LIBRARY_DIR）')
+
+        page = render_pdf_page(pdf_path, page_num)
+        key = self._legend_key(page)
+        if key is None:
+            raise ValueError(f'第{page_num + 1}页图例区域为空，无法预置图例库')
+
+        legend_symbols, legend_templates, ocr_done = self._extract_legend_entries(page)
+        if not ocr_done:
+            raise RuntimeError('图例OCR未完成（EasyOCR不可用或识别失败），无法预置图例库')
+        template_bank = LegendTemplateBank.from_templates(legend_templates)
+        self.legend_library.store(key, legend_symbols, template_bank, Path(pdf_path).name)
+        print(f"  📚 图例库预置: {key[:12]}... ({len(legend_symbols)} 个符号定义, {len(template_bank)} 个匹配模板)")
 
-        return str(output_path)
+        return {
+            'key': key,
+            'legend_symbols': len(legend_symbols),
+            'templates': len(template_bank)
+        }
 
-    def _extract_legend(self, image_path: str, text_regions: List[Dict]) -> List[Dict]:
+    def _extract_legend(self, page: 'PIDPageImage', text_regions: List[Dict]) -> List[Dict]:
         """提取图例（CHART OF SYMBOLS）"""
-        if not HAS_OPENCV:
-            return []
+        return self._extract_legend_entries(page)[0]
 
-        print(f"  🔍 提取图例...")
+    def _extract_legend_entries(self, page: 'PIDPageImage') -> Tuple[List[Dict], List[Dict], bool]:
+        """提取图例，返回 (图例定义, 匹配模板, 图例OCR是否成功)；模板为每行最左侧符号的轮廓及其描述"""
+        if not HAS_OPENCV or page is None:
+            return [], [], False
 
-        img = cv2.imread(image_path)
-        if img is None:
-            return []
+        print(f"  🔍 提取图例...")
 
+        img = page.image
         h, w = img.shape[:2]
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = page.gray
 
         # 1. 定位图例区域 - 扫描底部左侧60%宽度（包含CHART OF SYMBOLS两列，排除右侧标题栏）
-        legend_y_start = int(h * 0.75)
-        legend_x_end = int(w * 0.60)  # 图例表格通常占左边60%，右边40%是标题栏
-
-        # 使用默认图例区域（底部左侧）
-        x1, y1 = 0, legend_y_start
-        x2, y2 = legend_x_end, h
+        x1, y1, x2, y2 = legend_region(h, w)
 
         legend_roi = gray[y1:y2, x1:x2]
         legend_roi_color = img[y1:y2, x1:x2]
 
         # 2. 使用EasyOCR识别整个图例区域的文字
         ocr_texts = []
-        if EASYOCR_AVAILABLE:
-            global _easyocr_reader
-            if _easyocr_reader is None:
-                print(f"  📥 加载EasyOCR模型...")
-                _easyocr_reader = easyocr.Reader(['en'], gpu=False)
-
+        ocr_done = False
+        if self.ocr_reader.available:
             print(f"  🔍 OCR识别图例区域 ({legend_roi.shape[1]}x{legend_roi.shape[0]}px)...")
-            results = _easyocr_reader.readtext(legend_roi_color, detail=1)
+            try:
+                results = self.ocr_reader.readtext_batch([legend_roi_color], detail=1)[0]
+                ocr_done = True
+            except Exception as e:
+                print(f"  ⚠️  图例OCR失败: {e}")
+                results = []
 
             for bbox, text, conf in results:
                 # bbox是相对于legend_roi的坐标，转换为绝对坐标
@@ -1336,6 +1834,7 @@ class PIDRecognitionService:
                 'bbox': (bx, by, bw, bh),
                 'vertices': vertices,
                 'area': area,
+                'contour': cnt,
                 'y': abs_y  # 用于行分组
             })
 
@@ -1374,6 +1873,7 @@ class PIDRecognitionService:
 
         # 7. 每行只保留最左侧的符号，并匹配OCR文字
         legend_symbols = []
+        legend_templates = []
         for row_idx, row in enumerate(rows):
             # 选择X坐标最小的符号
             leftmost = min(row, key=lambda s: s['position'][0])
@@ -1401,6 +1901,12 @@ class PIDRecognitionService:
                 'vertices': leftmost['vertices'],
                 'area': leftmost['area']
             })
+            legend_templates.append({
+                'type': leftmost['type'],
+                'description': description,
+                'vertices': leftmost['vertices'],
+                'contour': leftmost['contour']
+            })
 
         # 8. 从OCR文字直接构建图例（基于ITEM编号）
         # 查找所有数字的OCR文字（1-99），这些是图例的序号
@@ -1467,12 +1973,10 @@ class PIDRecognitionService:
         if len(ocr_based_legend) > 0:
             items_preview = [f"ITEM {item['item']}: {item['description']}" for item in ocr_based_legend[:3]]
             print(f"  📝 OCR图例详情: {items_preview}")
-        return final_legend
+        return final_legend, legend_templates, ocr_done
 
     def _find_legend_description(self, symbol_x: int, symbol_y: int, legend_roi_gray, x1: int, y1: int) -> str:
         """从图例区域直接提取符号右侧的文字（使用EasyOCR识别）"""
-        global _easyocr_reader
-
         try:
             # 提取符号右侧区域（通常文字在符号右侧50-300px内）
             roi_x_start = symbol_x - x1 + 50  # 相对于legend_roi的坐标
@@ -1486,13 +1990,8 @@ class PIDRecognitionService:
             text_roi = legend_roi_gray[roi_y_start:roi_y_end, roi_x_start:roi_x_end]
 
             # 使用EasyOCR识别文字
-            if EASYOCR_AVAILABLE:
-                # 懒加载EasyOCR Reader（只初始化一次）
-                if _easyocr_reader is None:
-                    _easyocr_reader = easyocr.Reader(['en'], gpu=False)
-
-                # 识别文字
-                results = _easyocr_reader.readtext(text_roi, detail=0)
+            if self.ocr_reader.available:
+                results = self.ocr_reader.readtext_batch([text_roi], detail=0)[0]
 
                 if results:
                     # 合并所有识别到的文字
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+PID远程OCR分块客户端（DeepSeek-OCR）
+- 全分辨率页面切分为带重叠的图块（整页降采样会丢失小位号文字），空白图块不上传
+- 连接池会话 + 有界线程池并发上传，失败按指数退避重试
+- 带定位框的结果（<|ref|>文字<|/ref|><|det|>[[x1,y1,x2,y2]]<|/det|>，0-999归一化）还原为页面坐标
+- 拼接：定位结果只保留中心点落在图块核心区域内的；重叠区被截断的残片并入完整文字；
+  无定位的文字行在相邻图块间按文本去重
+"""
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from PIDSpatialIndex import GridIndex
+from PIDTiledDetector import Tile, plan_tiles
+
+GROUNDING_PATTERN = re.compile(r'<\|ref\|>(.*?)<\|/ref\|>\s*<\|det\|>(.*?)<\|/det\|>', re.S)
+BOX_PATTERN = re.compile(r'\[\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*\]')
+
+# DeepSeek-OCR定位框的归一化尺度
+GROUNDING_SCALE = 999
+
+# 灰度低于该值视为墨迹；图块内无墨迹则跳过
+INK_THRESHOLD = 128
+
+
+def parse_ocr_lines(text: str, width: int, height: int) -> List[Dict]:
+    """解析OCR文本：带定位框的片段转为像素bbox，其余按行拆分（无bbox）"""
+    lines = []
+    for match in GROUNDING_PATTERN.finditer(text):
+        boxes = [tuple(float(v) for v in b) for b in BOX_PATTERN.findall(match.group(2))]
+        content = match.group(1).strip()
+        if not content or not boxes:
+            continue
+        # 同一文字可能对应多个框，取并集
+        x1 = min(b[0] for b in boxes) / GROUNDING_SCALE * width
+        y1 = min(b[1] for b in boxes) / GROUNDING_SCALE * height
+        x2 = max(b[2] for b in boxes) / GROUNDING_SCALE * width
+        y2 = max(b[3] for b in boxes) / GROUNDING_SCALE * height
+        lines.append({'text': content, 'bbox': (int(x1), int(y1), max(int(x2 - x1), 1), max(int(y2 - y1), 1))})
+
+    plain = GROUNDING_PATTERN.sub('\n', text)
+    for line in plain.split('\n'):
+        line = re.sub(r'<\|.*?\|>', '', line).strip()
+        if line:
+            lines.append({'text': line})
+    return lines
+
+
+def _bbox_center(bbox) -> Tuple[int, int]:
+    x, y, w, h = bbox
+    return x + w // 2, y + h // 2
+
+
+def _bbox_overlaps(a, b) -> bool:
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def _tiles_overlap(a: Tile, b: Tile) -> bool:
+    return a.x0 < b.x1 and b.x0 < a.x1 and a.y0 < b.y1 and b.y0 < a.y1
+
+
+class PIDRemoteOcrClient:
+    """分块并发OCR客户端（会话与连接池在客户端生命周期内复用）"""
+
+    def __init__(self, url: str, tile_size: int = 1280, overlap: int = 256, concurrency: int = 4,
+                 retries: int = 3, timeout: float = 60):
+        if overlap >= tile_size:
+            raise ValueError('overlap必须小于tile_size')
+        self.url = url
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries, connect=retries, read=retries, status=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['POST'])
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def recognize(self, image: np.ndarray, page_num: int,
+                  encode: Callable[[np.ndarray], bytes]) -> List[Dict]:
+        """识别整页，返回页面坐标下的文本区域（格式同 _parse_ocr_response）"""
+        h, w = image.shape[:2]
+        tiles = plan_tiles(h, w, self.tile_size, self.overlap)
+        active = [t for t in tiles if image[t.y0:t.y1, t.x0:t.x1].min() < INK_THRESHOLD]
+        print(f"  🧩 分块OCR: {len(active)}/{len(tiles)} 个图块 "
+              f"({self.tile_size}px, 重叠{self.overlap}px, 并发{self.concurrency})")
+        if not active:
+            return []
+
+        # 连接失败（重试耗尽）后其余图块不再请求，避免服务不可用时每个图块都等完退避
+        unreachable = threading.Event()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(lambda t: self._ocr_tile(image, t, page_num, encode, unreachable), active))
+
+        failed = sum(1 for r in results if r is None)
+        if failed == len(results):
+            print(f"  ⚠️  OCR服务无响应，使用纯符号检测模式")
+            return []
+        if failed:
+            print(f"  ⚠️  {failed}/{len(results)} 个图块OCR失败")
+
+        regions = self._stitch([(t, r) for t, r in zip(active, results) if r is not None])
+        for i, region in enumerate(regions):
+            region['page'] = page_num
+            region['line'] = i
+        print(f"  ✅ OCR成功: {len(regions)} 个文本区域（{sum(1 for r in regions if 'bbox' in r)} 个带定位）")
+        return regions
+
+    def _ocr_tile(self, image: np.ndarray, tile: Tile, page_num: int,
+                  encode: Callable[[np.ndarray], bytes], unreachable: threading.Event) -> Optional[List[Dict]]:
+        """单个图块OCR，返回页面坐标下的文本行；请求失败返回None"""
+        if unreachable.is_set():
+            return None
+        crop = image[tile.y0:tile.y1, tile.x0:tile.x1]
+        files = {'file': (f'pid_page_{page_num}_{tile.x0}_{tile.y0}.png', encode(crop), 'image/png')}
+        try:
+            response = self.session.post(self.url, files=files, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except requests.ConnectionError as e:
+            if not unreachable.is_set():
+                unreachable.set()
+                print(f"  ⚠️  OCR服务连接失败: {e}")
+            return None
+        except (requests.RequestException, ValueError) as e:
+            print(f"  ⚠️  图块({tile.x0},{tile.y0})OCR失败: {e}")
+            return None
+
+        if not data.get('success'):
+            print(f"  ⚠️  图块({tile.x0},{tile.y0})OCR返回失败: {data.get('text', '')}")
+            return None
+
+        lines = parse_ocr_lines(data.get('text') or '', crop.shape[1], crop.shape[0])
+        for line in lines:
+            if 'bbox' in line:
+                bx, by, bw, bh = line['bbox']
+                line['bbox'] = (bx + tile.x0, by + tile.y0, bw, bh)
+                line['position'] = _bbox_center(line['bbox'])
+        return lines
+
+    def _stitch(self, tile_results: List[Tuple[Tile, List[Dict]]]) -> List[Dict]:
+        """合并各图块结果，去掉重叠区产生的重复"""
+        positioned = []
+        plain = []
+        for tile, lines in tile_results:
+            for line in lines:
+                if 'bbox' not in line:
+                    plain.append((tile, line))
+                elif tile.owns(*line['position']):
+                    positioned.append(line)
+
+        # 被图块边界截断的残片：与更长的文字框相交且为其子串 → 丢弃
+        index = GridIndex(self.overlap)
+        for i, line in enumerate(positioned):
+            index.insert(i, *line['position'])
+        keep = []
+        for i, line in enumerate(positioned):
+            x, y = line['position']
+            fragment = any(
+                len(positioned[j]['text']) > len(line['text'])
+                and line['text'] in positioned[j]['text']
+                and _bbox_overlaps(line['bbox'], positioned[j]['bbox'])
+                for j in index.candidates(x, y) if j != i
+            )
+            if not fragment:
+                keep.append(line)
+
+        # 无定位文字行：相邻（范围重叠）图块中的相同文本视为同一处
+        seen: Dict[str, List[Tile]] = {}
+        for tile, line in plain:
+            tiles_with_text = seen.setdefault(line['text'], [])
+            if any(t != tile and _tiles_overlap(t, tile) for t in tiles_with_text):
+                continue
+            tiles_with_text.append(tile)
+            keep.append(line)
+
+        return keep
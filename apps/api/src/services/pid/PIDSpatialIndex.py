@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+PID空间索引
+- 均匀网格哈希（单元边长 = 查询半径），只比较相邻3x3单元内的点
+- 距离计算全部向量化（NumPy）
+- GridIndex: 可增量插入/移动的网格索引，用于顺序相关的贪心匹配
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def radius_pairs(points, radius: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """找出所有距离小于radius的点对
+
+    Args:
+        points: N×2 坐标（列表或数组）
+        radius: 距离阈值（严格小于）
+
+    Returns:
+        (a, b, dist): 点下标数组（a < b）及其欧氏距离，按 (a, b) 升序排列
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(pts)
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+    if n < 2:
+        return empty
+
+    # 网格坐标 → 一维单元键（x方向左右各留1列，邻居单元不会跨行混淆）
+    cells = np.floor(pts / radius).astype(np.int64)
+    cells -= cells.min(axis=0)
+    width = int(cells[:, 0].max()) + 3
+    keys = (cells[:, 1] + 1) * width + (cells[:, 0] + 1)
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    index = np.arange(n)
+
+    a_parts = []
+    b_parts = []
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            target = keys + dy * width + dx
+            start = np.searchsorted(sorted_keys, target, side='left')
+            counts = np.searchsorted(sorted_keys, target, side='right') - start
+            total = int(counts.sum())
+            if total == 0:
+                continue
+
+            # 展开 (点, 邻居单元内的点) 候选对
+            a = np.repeat(index, counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            b = order[np.repeat(start, counts) + offsets]
+
+            keep = a < b
+            a_parts.append(a[keep])
+            b_parts.append(b[keep])
+
+    if not a_parts:
+        return empty
+
+    a = np.concatenate(a_parts)
+    b = np.concatenate(b_parts)
+
+    diff = pts[a] - pts[b]
+    dist = np.sqrt(diff[:, 0] ** 2 + diff[:, 1] ** 2)
+    within = dist < radius
+    a, b, dist = a[within], b[within], dist[within]
+
+    ordering = np.lexsort((b, a))
+    return a[ordering], b[ordering], dist[ordering]
+
+
+class GridIndex:
+    """增量网格哈希索引
+
+    条目为整数下标，查询返回覆盖半径的相邻单元内所有候选（升序），
+    由调用方做精确距离判断，保证与逐个扫描时"第一个命中"的语义一致。
+    """
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+
+    def _cell(self, x, y) -> Tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, item: int, x, y):
+        self._cells.setdefault(self._cell(x, y), []).append(item)
+
+    def remove(self, item: int, x, y):
+        key = self._cell(x, y)
+        bucket = self._cells[key]
+        bucket.remove(item)
+        if not bucket:
+            del self._cells[key]
+
+    def move(self, item: int, old_xy, new_xy):
+        """条目位置变化时更新所在单元"""
+        if self._cell(*old_xy) != self._cell(*new_xy):
+            self.remove(item, *old_xy)
+            self.insert(item, *new_xy)
+
+    def candidates(self, x, y, radius: float = None) -> List[int]:
+        """(x, y) 半径内可能命中的条目下标（升序，未做精确距离过滤）"""
+        reach = 1 if radius is None else max(1, int(np.ceil(radius / self.cell_size)))
+        cx, cy = self._cell(x, y)
+        found = []
+        for gy in range(cy - reach, cy + reach + 1):
+            for gx in range(cx - reach, cx + reach + 1):
+                bucket = self._cells.get((gx, gy))
+                if bucket:
+                    found.extend(bucket)
+        found.sort()
+        return found
+
+
+class PointGroupIndex:
+    """多点条目网格索引（线段两端点、符号中心及端口）
+
+    查询返回有任一点落在相邻单元内的条目下标（升序、去重），
+    单元边长取匹配容差，调用方仍按原顺序逐个做精确距离判断。
+    """
+
+    def __init__(self, cell_size: float):
+        self.grid = GridIndex(cell_size)
+
+    def insert(self, item: int, points):
+        for x, y in points:
+            self.grid.insert(item, x, y)
+
+    def candidates(self, x, y) -> List[int]:
+        return sorted(set(self.grid.candidates(x, y)))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+PID位号/参数词法分析
+- 全部位号与参数正则合并为一个带命名分组的交替式，只编译一次，每行文字只扫描一遍
+- 位号按模式长度降序排列并要求前面不紧跟字母：CV-101 不再被读成 V-101，HV-101 不会误取 V-101
+- TagIndex: 位号 → 带坐标的文字区域，按页建网格索引，符号查最近的位号文字
+"""
+import math
+import re
+from typing import Dict, List, Optional
+
+from PIDSpatialIndex import GridIndex
+
+# 位号文字与符号中心的最大距离（px）
+NEARBY_TAG_RADIUS = 250
+
+
+class TagLexer:
+    """把 tag_patterns / parameter_patterns 编译成单个正则
+
+    每个模式包在命名分组 (?P<t_类型>...) / (?P<p_类型>...) 中，模式内部的编号分组
+    按偏移量取回（参数的第1组为数值、第2组为单位，与原逐个 re.search 的取法一致）。
+    """
+
+    def __init__(self, tag_patterns: Dict[str, str], parameter_patterns: Dict[str, str]):
+        # 较长的模式优先：交替式在同一位置按顺序尝试
+        ordered_tags = sorted(tag_patterns.items(), key=lambda item: -len(item[1]))
+        tag_alternation = '|'.join(f'(?P<t_{name}>{pattern})' for name, pattern in ordered_tags)
+        parts = [f'(?<![A-Z])(?:{tag_alternation})'] if tag_patterns else []
+        parts += [f'(?P<p_{name}>{pattern})' for name, pattern in parameter_patterns.items()]
+        self.pattern = re.compile('|'.join(parts))
+
+        # 命名分组 → (种类, 类型名, 内部编号分组的起始下标, 内部分组数)
+        self._groups = {}
+        for group_name, index in self.pattern.groupindex.items():
+            kind, name = group_name[0], group_name[2:]
+            source = tag_patterns[name] if kind == 't' else parameter_patterns[name]
+            self._groups[group_name] = (kind, name, index + 1, re.compile(source).groups)
+
+    def lex(self, text: str) -> Dict:
+        """扫描一行文字，返回 {'tag', 'type', 'parameters'}：最左侧的位号（无则为None），每类参数取第一个"""
+        tag = None
+        tag_type = None
+        parameters = {}
+        for match in self.pattern.finditer(text):
+            kind, name, first, count = self._groups[match.lastgroup]
+            if kind == 't':
+                if tag is None:
+                    tag, tag_type = match.group(match.lastgroup), name
+            elif name not in parameters and count >= 2:
+                try:
+                    parameters[name] = {
+                        'value': float(match.group(first)),
+                        'unit': match.group(first + 1)
+                    }
+                except ValueError:
+                    pass
+        return {'tag': tag, 'type': tag_type, 'parameters': parameters}
+
+
+def _region_position(region: Dict):
+    if 'position' in region:
+        return region['position']
+    if 'bbox' in region:
+        x, y, w, h = region['bbox']
+        return x + w // 2, y + h // 2
+    return None
+
+
+class TagIndex:
+    """位号索引：每条OCR文字只分析一次
+
+    by_tag: 位号 → 出现该位号的文字区域条目（含坐标、页码）
+    无坐标的文字区域（整页OCR未返回定位）只进 by_tag，不参与最近邻查询。
+    """
+
+    def __init__(self, text_regions: List[Dict], lexer: TagLexer, radius: float = NEARBY_TAG_RADIUS):
+        self.radius = radius
+        self.entries: List[Dict] = []
+        self.by_tag: Dict[str, List[Dict]] = {}
+        self._grids: Dict[object, GridIndex] = {}
+
+        for region in text_regions:
+            lexed = lexer.lex(region.get('text', ''))
+            if lexed['tag'] is None:
+                continue
+            entry = dict(lexed, page=region.get('page'), position=_region_position(region))
+            self.by_tag.setdefault(entry['tag'], []).append(entry)
+            if entry['position'] is not None:
+                i = len(self.entries)
+                self.entries.append(entry)
+                self._grids.setdefault(entry['page'], GridIndex(radius)).insert(i, *entry['position'])
+
+    def nearest(self, x, y, page=None) -> Optional[Dict]:
+        """(x, y) 半径内最近的位号条目，距离相同取OCR顺序靠前者；page为None时不区分页"""
+        grids = self._grids.values() if page is None else [self._grids.get(page)]
+        best, best_dist = None, self.radius
+        for grid in grids:
+            if grid is None:
+                continue
+            for i in grid.candidates(x, y):
+                ex, ey = self.entries[i]['position']
+                dist = math.hypot(ex - x, ey - y)
+                if dist < best_dist or (dist == best_dist and best is not None and i < best):
+                    best, best_dist = i, dist
+        return self.entries[best] if best is not None else None
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+PID分块符号检测
+- 页面切分为带重叠的图块，线程池并行检测（OpenCV调用期间释放GIL）
+- 粗分辨率占用金字塔（块最大值降采样）：先在粗层判断图块是否有内容，空白图块直接跳过
+- 拼接：每个检测结果只归属其中心点所在图块的核心区域，接缝两侧不会重复，
+  再由网格去重合并不同检测器的重叠结果
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Tuple
+
+import cv2
+import numpy as np
+
+
+class Tile(NamedTuple):
+    """图块范围 [x0, x1) × [y0, y1)，核心区域 [cx0, cx1) × [cy0, cy1) 互不重叠且覆盖整页"""
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+    cx0: int
+    cy0: int
+    cx1: int
+    cy1: int
+
+    def owns(self, x, y) -> bool:
+        return self.cx0 <= x < self.cx1 and self.cy0 <= y < self.cy1
+
+
+def plan_axis(length: int, tile_size: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """单轴切分，返回 [(起点, 终点, 核心起点, 核心终点)]"""
+    if length <= tile_size:
+        return [(0, length, 0, length)]
+
+    step = tile_size - overlap
+    half = overlap // 2
+    spans = []
+    for start in range(0, max(length - overlap, 1), step):
+        end = min(start + tile_size, length)
+        core_start = start + half if start > 0 else 0
+        core_end = end - (overlap - half) if end < length else length
+        spans.append((start, end, core_start, core_end))
+        if end == length:
+            break
+    return spans
+
+
+def plan_tiles(height: int, width: int, tile_size: int, overlap: int) -> List[Tile]:
+    """按行优先顺序生成图块"""
+    tiles = []
+    for y0, y1, cy0, cy1 in plan_axis(height, tile_size, overlap):
+        for x0, x1, cx0, cx1 in plan_axis(width, tile_size, overlap):
+            tiles.append(Tile(x0, y0, x1, y1, cx0, cy0, cx1, cy1))
+    return tiles
+
+
+def occupancy_pyramid(mask: np.ndarray, factor: int) -> np.ndarray:
+    """块最大值降采样：粗层像素非零 ⇔ 对应 factor×factor 原图块内有非零像素"""
+    h, w = mask.shape
+    ph = -h % factor
+    pw = -w % factor
+    if ph or pw:
+        mask = np.pad(mask, ((0, ph), (0, pw)))
+    coarse = mask.reshape((h + ph) // factor, factor, (w + pw) // factor, factor)
+    return coarse.max(axis=(1, 3))
+
+
+def _offset_symbol(symbol: Dict, dx: int, dy: int) -> Dict:
+    """图块坐标 → 页面坐标"""
+    x, y = symbol['position']
+    symbol['position'] = [x + dx, y + dy]
+    if 'bbox' in symbol:
+        bx, by, bw, bh = symbol['bbox']
+        symbol['bbox'] = (bx + dx, by + dy, bw, bh)
+    if 'ports' in symbol:
+        symbol['ports'] = [(px + dx, py + dy) for px, py in symbol['ports']]
+    return symbol
+
+
+class PIDTiledDetector:
+    """分块并行符号检测引擎（圆形 + 轮廓两类检测器）"""
+
+    def __init__(self, service, tile_size: int = 2048, overlap: int = 256,
+                 workers: int = None, coarse_factor: int = 8):
+        # 重叠宽度需大于最大符号尺寸的两倍，保证核心区域内的符号在图块内完整
+        if overlap >= tile_size:
+            raise ValueError('overlap必须小于tile_size')
+        self.service = service
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.coarse_factor = coarse_factor
+
+    def detect(self, page, page_num: int, valid_x_max: int, valid_y_max: int,
+               template_bank=None) -> Tuple[List[Dict], List[Dict], Dict[int, int]]:
+        """返回 (圆形符号, 轮廓符号, 顶点分布)，坐标均为页面坐标"""
+        h, w = page.gray.shape
+        tiles = plan_tiles(h, w, self.tile_size, self.overlap)
+
+        # 粗层判空：二值图和边缘图都没有内容的图块不会产生任何检测结果
+        occupied = occupancy_pyramid(cv2.bitwise_or(page.binary, page.edges), self.coarse_factor)
+        f = self.coarse_factor
+        active = [
+            t for t in tiles
+            if t.cx0 < valid_x_max and t.cy0 < valid_y_max
+            and occupied[t.y0 // f:-(-t.y1 // f), t.x0 // f:-(-t.x1 // f)].any()
+        ]
+        print(f"  🧩 分块检测: {len(active)}/{len(tiles)} 个图块 "
+              f"({self.tile_size}px, 重叠{self.overlap}px, {self.workers}线程)")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(
+                lambda t: self._detect_tile(page, page_num, t, valid_x_max, valid_y_max, template_bank), active
+            ))
+
+        circles = []
+        contour_symbols = []
+        vertex_counts = {}
+        for tile_circles, tile_contours, tile_vertices in results:
+            circles.extend(tile_circles)
+            contour_symbols.extend(tile_contours)
+            for v, n in tile_vertices.items():
+                vertex_counts[v] = vertex_counts.get(v, 0) + n
+
+        return circles, contour_symbols, vertex_counts
+
+    def _detect_tile(self, page, page_num: int, tile: Tile, valid_x_max: int, valid_y_max: int,
+                     template_bank=None):
+        """单个图块的检测，只保留中心点落在核心区域内的结果"""
+        rows = slice(tile.y0, tile.y1)
+        cols = slice(tile.x0, tile.x1)
+
+        # 圆形检测（Hough）
+        raw_circles = self.service._detect_circles(
+            page.gray[rows, cols], minR=18, maxR=35, minDist=60, edges=page.edges[rows, cols]
+        )
+        circles = [
+            (x + tile.x0, y + tile.y0, r) for x, y, r in raw_circles
+            if tile.owns(x + tile.x0, y + tile.y0)
+        ]
+        circle_symbols = self.service._circle_symbols(circles, page_num, valid_x_max, valid_y_max)
+
+        # 轮廓检测：闭运算和排除区域均在图块坐标下进行
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        binary = cv2.morphologyEx(page.binary[rows, cols], cv2.MORPH_CLOSE, kernel)
+        local_y_max = valid_y_max - tile.y0
+        local_x_max = valid_x_max - tile.x0
+        binary[max(local_y_max, 0):, :] = 0
+        binary[:, max(local_x_max, 0):] = 0
+
+        symbols, vertex_counts = self.service._detect_contour_symbols(
+            binary, page_num, local_x_max, local_y_max, template_bank
+        )
+        contour_symbols = [
+            _offset_symbol(s, tile.x0, tile.y0) for s in symbols
+            if tile.owns(s['position'][0] + tile.x0, s['position'][1] + tile.y0)
+        ]
+
+        return circle_symbols, contour_symbols, vertex_counts
@@ -51,7 +51,13 @@ class PIDtoAssemblyPipeline:
         print("─" * 60)
 
         try:
-            pid_result = self.pid_service.recognize_pid(pid_file)
+            # 配置了识别缓存（PID_RECOGNITION_CACHE_DIR）且同一图纸已识别过时直接读取
+            pid_result = self.pid_service.cached_recognition(pid_file)
+            if pid_result is not None:
+                print(f"💾 使用缓存的识别结果")
+            else:
+                # 装配生成只用识别结果，不生成可视化
+                pid_result = self.pid_service.recognize_pid(pid_file, visualization='off')
             results['stages']['pid_recognition'] = {
                 'status': 'success',
                 'components': len(pid_result['components']),
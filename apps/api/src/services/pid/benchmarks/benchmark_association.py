@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+文字↔符号关联基准测试
+
+对比原全量扫描与网格索引的三个关联阶段，并校验输出一致：
+- _trace_text_to_symbol: 文字框8个出射点 × 全部引线，引线远端 × 全部符号/端口
+- _merge_with_leader_trace: 已占用位置逐个比较 merged
+- _merge_text_and_symbols: 按位号逐个扫描 merged
+合成图纸：符号带4个端口，每个符号旁有位号文字，约一半文字用引线指向符号端口，另加干扰引线。
+
+用法: python benchmark_association.py [--sizes 250,500,1000] [--seed N]
+"""
+import contextlib
+import copy
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIDRecognitionService import PIDRecognitionService
+from PIDTagLexer import TagIndex
+
+# 每个符号占用的图幅面积（px²）
+AREA_PER_SYMBOL = 200 * 200
+
+
+def reference_trace_text_to_symbol(service, text_regions, leader_lines, symbols):
+    """原实现（全量扫描），作为正确性基准"""
+    text_to_symbol = {}
+    for text_region in text_regions:
+        if 'bbox' not in text_region:
+            continue
+        tx, ty, tw, th = text_region['bbox']
+        text_center = (tx + tw//2, ty + th//2)
+        text_content = text_region.get('text', '')
+        shoot_pts = [
+            (tx, ty), (tx+tw//2, ty), (tx+tw, ty),
+            (tx, ty+th//2), (tx+tw, ty+th//2),
+            (tx, ty+th), (tx+tw//2, ty+th), (tx+tw, ty+th)
+        ]
+        closest_line = None
+        min_dist = float('inf')
+        for shoot_pt in shoot_pts:
+            for line in leader_lines:
+                dist = min(service._point_distance(shoot_pt, line['start']),
+                           service._point_distance(shoot_pt, line['end']))
+                if dist < min_dist and dist < 10:
+                    min_dist = dist
+                    closest_line = line
+        if closest_line:
+            line_far_end = closest_line['end'] if service._point_distance(text_center, closest_line['start']) < \
+                                                  service._point_distance(text_center, closest_line['end']) \
+                else closest_line['start']
+            closest_symbol = None
+            min_sym_dist = float('inf')
+            for symbol in symbols:
+                if 'position' not in symbol:
+                    continue
+                dist = service._point_distance(line_far_end, tuple(symbol['position']))
+                if 'ports' in symbol:
+                    for port in symbol['ports']:
+                        port_dist = service._point_distance(line_far_end, port)
+                        if port_dist < dist:
+                            dist = port_dist
+                if dist < min_sym_dist and dist < 30:
+                    min_sym_dist = dist
+                    closest_symbol = symbol
+            if closest_symbol:
+                text_to_symbol[text_content] = closest_symbol
+    return text_to_symbol
+
+
+def reference_merge_with_leader_trace(service, text_components, symbols, text_to_symbol_map):
+    """原实现（已占用位置逐个比较）"""
+    merged = []
+    symbol_counter = {}
+    for text_comp in text_components:
+        tag = text_comp.get('tag_number', '')
+        if tag in text_to_symbol_map:
+            symbol = text_to_symbol_map[tag]
+            merged.append(service._copy_legend_fields(symbol, {
+                'tag_number': tag,
+                'symbol_type': symbol.get('symbol_type'),
+                'position': symbol.get('position'),
+                'shape': symbol.get('shape'),
+                'ports': symbol.get('ports', []),
+                'page': symbol.get('page'),
+                'source': 'leader_traced',
+                'confidence': min(text_comp.get('confidence', 0.9), symbol.get('confidence', 0.8))
+            }))
+    for symbol in symbols:
+        if any(m.get('position') == symbol.get('position') for m in merged):
+            continue
+        symbol_type = symbol.get('symbol_type', 'unknown')
+        symbol_counter[symbol_type] = symbol_counter.get(symbol_type, 0) + 1
+        merged.append(service._copy_legend_fields(symbol, {
+            'tag_number': service._generate_auto_tag(symbol_type, symbol_counter[symbol_type]),
+            'symbol_type': symbol_type,
+            'position': symbol.get('position'),
+            'shape': symbol.get('shape'),
+            'ports': symbol.get('ports', []),
+            'page': symbol.get('page'),
+            'source': 'auto_generated',
+            'confidence': symbol.get('confidence', 0.7)
+        }))
+    return merged
+
+
+def reference_merge_text_and_symbols(service, text_components, symbols, all_text_regions):
+    """原实现（按位号逐个扫描merged）；附近位号与服务相同，经位号索引查找"""
+    merged = list(text_components)
+    symbol_counter = {}
+    tag_index = TagIndex(all_text_regions, service.tag_lexer)
+    for symbol in symbols:
+        pos = symbol.get('position')
+        if not pos:
+            continue
+        nearby_tag = service._find_nearby_tag(pos, tag_index, symbol.get('page'))
+        if nearby_tag:
+            existing = next((c for c in merged if c.get('tag_number') == nearby_tag['tag']), None)
+            if existing:
+                existing['position'] = pos
+                existing['shape'] = symbol.get('shape')
+                if 'radius' in symbol:
+                    existing['radius'] = symbol['radius']
+                if 'bbox' in symbol:
+                    existing['bbox'] = symbol['bbox']
+                service._copy_legend_fields(symbol, existing)
+            else:
+                merged.append(service._copy_legend_fields(symbol, {
+                    'tag_number': nearby_tag['tag'],
+                    'symbol_type': nearby_tag.get('type', symbol.get('symbol_type')),
+                    'parameters': nearby_tag.get('parameters', {}),
+                    'page': symbol['page'],
+                    'position': pos,
+                    'shape': symbol.get('shape'),
+                    'source': 'symbol_with_text',
+                    'confidence': min(symbol.get('confidence', 0.7), nearby_tag.get('confidence', 0.9))
+                }))
+        else:
+            symbol_type = symbol.get('symbol_type', 'unknown')
+            if symbol_type not in symbol_counter:
+                symbol_counter[symbol_type] = 1
+            tag_prefix = {
+                'pump_or_instrument': 'P',
+                'indicator': 'PI',
+                'valve': 'V',
+                'equipment': 'E',
+                'tank_or_equipment': 'T',
+            }.get(symbol_type, 'X')
+            merged.append(service._copy_legend_fields(symbol, {
+                'tag_number': f"{tag_prefix}-{symbol_counter[symbol_type]:03d}",
+                'symbol_type': symbol_type,
+                'parameters': {},
+                'page': symbol['page'],
+                'position': pos,
+                'shape': symbol.get('shape'),
+                'radius': symbol.get('radius'),
+                'bbox': symbol.get('bbox'),
+                'size': symbol.get('size'),
+                'source': 'symbol_detection',
+                'confidence': symbol.get('confidence', 0.7)
+            }))
+            symbol_counter[symbol_type] += 1
+    return merged
+
+
+def make_sheet(n: int, seed: int = 0):
+    """生成 (文字区域, 文字组件, 引线, 符号)"""
+    rng = np.random.default_rng(seed)
+    side = int(np.sqrt(n * AREA_PER_SYMBOL))
+    symbol_types = ['indicator', 'valve', 'pump_or_instrument', 'tank_or_equipment']
+
+    symbols = []
+    text_regions = []
+    text_components = []
+    leader_lines = []
+    for i in range(n):
+        x, y = (int(v) for v in rng.integers(50, side - 50, size=2))
+        r = 20
+        ports = [(x - r, y), (x + r, y), (x, y - r), (x, y + r)]
+        symbols.append({
+            'symbol_type': symbol_types[i % len(symbol_types)],
+            'position': [x, y],
+            'ports': ports,
+            'shape': 'circle',
+            'radius': r,
+            'confidence': 0.8,
+            'page': 0
+        })
+
+        tag = f'PI-{i:05d}'
+        bbox = (x + 40, y - 60, 70, 18)
+        text_regions.append({'text': tag, 'bbox': bbox, 'page': 0})
+        text_components.append({'symbol_type': 'pressure_indicator', 'tag_number': tag, 'parameters': {},
+                                'page': 0, 'source': 'ocr', 'source_text': tag, 'confidence': 0.9})
+
+        if rng.random() < 0.5:
+            # 引线：文字框左下角 → 符号右端口（带抖动）
+            jitter = rng.integers(-6, 7, size=2)
+            leader_lines.append({'start': (bbox[0], bbox[1] + bbox[3]),
+                                 'end': (ports[1][0] + int(jitter[0]), ports[1][1] + int(jitter[1]))})
+
+    # 干扰引线
+    for _ in range(n):
+        x1, y1 = (int(v) for v in rng.integers(0, side, size=2))
+        leader_lines.append({'start': (x1, y1), 'end': (x1 + int(rng.integers(-80, 80)), y1 + int(rng.integers(-80, 80)))})
+
+    return text_regions, text_components, leader_lines, symbols
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, seed: int = 0):
+    with contextlib.redirect_stdout(io.StringIO()):
+        service = PIDRecognitionService()
+    report = []
+    for n in sizes:
+        text_regions, text_components, leader_lines, symbols = make_sheet(n, seed)
+
+        traced, t_trace = _timed(service._trace_text_to_symbol, text_regions, leader_lines, symbols)
+        expected_traced, t_trace_ref = _timed(reference_trace_text_to_symbol, service, text_regions,
+                                              leader_lines, symbols)
+
+        leader, t_leader = _timed(service._merge_with_leader_trace, text_components, symbols, traced)
+        expected_leader, t_leader_ref = _timed(reference_merge_with_leader_trace, service, text_components,
+                                               symbols, traced)
+
+        proximity, t_prox = _timed(service._merge_text_and_symbols, copy.deepcopy(text_components),
+                                   symbols, text_regions)
+        expected_prox, t_prox_ref = _timed(reference_merge_text_and_symbols, service,
+                                           copy.deepcopy(text_components), symbols, text_regions)
+
+        report.append({
+            'symbols': n,
+            'leader_lines': len(leader_lines),
+            'associated': len(traced),
+            'trace': {'reference_seconds': round(t_trace_ref, 4), 'indexed_seconds': round(t_trace, 4),
+                      'speedup': round(t_trace_ref / t_trace, 1) if t_trace else None},
+            'merge_with_leader_trace': {'reference_seconds': round(t_leader_ref, 4),
+                                        'indexed_seconds': round(t_leader, 4),
+                                        'speedup': round(t_leader_ref / t_leader, 1) if t_leader else None},
+            'merge_text_and_symbols': {'reference_seconds': round(t_prox_ref, 4),
+                                       'indexed_seconds': round(t_prox, 4),
+                                       'speedup': round(t_prox_ref / t_prox, 1) if t_prox else None},
+            'identical': ({k: id(v) for k, v in traced.items()} == {k: id(v) for k, v in expected_traced.items()}
+                          and leader == expected_leader and proximity == expected_prox)
+        })
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    sizes = [250, 500, 1000]
+    seed = 0
+    if '--sizes' in args:
+        sizes = [int(s) for s in args[args.index('--sizes') + 1].split(',')]
+    if '--seed' in args:
+        seed = int(args[args.index('--seed') + 1])
+
+    report = run(sizes, seed)
+    sys.exit(0 if all(r['identical'] for r in report) else 1)
+
+
+if __name__ == '__main__':
+    main()
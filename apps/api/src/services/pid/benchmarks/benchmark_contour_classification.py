@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+轮廓符号分类基准测试
+
+对PDF各页（3倍渲染）对比原逐轮廓循环与批量向量化实现的耗时，并校验符号列表一致。
+两者耗时均包含 cv2.findContours，单独列出其耗时以便看出分类部分的差异。
+
+用法: python benchmark_contour_classification.py <pdf_path> [--max-pages N] [--repeat N]
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+import cv2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIDPageImage import get_pdf_page_count, render_pdf_page
+from PIDRecognitionService import PIDRecognitionService
+
+
+def reference_detect_contour_symbols(binary, page_num, valid_x_max, valid_y_max):
+    """原实现（逐轮廓调用OpenCV），作为正确性基准"""
+    contours, _ = cv2.findContours(binary, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    symbols = []
+    for cnt in contours:
+        area = cv2.contourArea(cnt)
+        if area < 60 or area > 50000:
+            continue
+        perimeter = cv2.arcLength(cnt, True)
+        if perimeter == 0:
+            continue
+        approx = cv2.approxPolyDP(cnt, 0.03 * perimeter, True)
+        vertices = len(approx)
+        M = cv2.moments(cnt)
+        if M['m00'] == 0:
+            continue
+        cx = int(M['m10'] / M['m00'])
+        cy = int(M['m01'] / M['m00'])
+        if cy >= valid_y_max or cx >= valid_x_max:
+            continue
+        x, y, w, h = cv2.boundingRect(cnt)
+        aspect_ratio = float(w) / h if h > 0 else 0
+        bbox_area = w * h
+        area_ratio = area / bbox_area if bbox_area > 0 else 0
+
+        def symbol(symbol_type, shape, confidence, source):
+            return {
+                'symbol_type': symbol_type,
+                'shape': shape,
+                'position': [cx, cy],
+                'bbox': (x, y, w, h),
+                'page': page_num,
+                'confidence': confidence,
+                'source': source,
+                'ports': [tuple(pt[0].astype(int)) for pt in approx]
+            }
+
+        if vertices == 3 and 30 < area < 8000:
+            symbols.append(symbol('manual_valve', 'triangle', 0.8, 'opencv_triangle'))
+        elif vertices == 4:
+            if 0.4 < aspect_ratio < 2.5 and 0.20 < area_ratio < 0.80 and 30 < area < 15000:
+                symbols.append(symbol('valve', 'diamond', 0.85, 'opencv_diamond'))
+            elif 0.7 < aspect_ratio < 1.4 and area_ratio > 0.75 and 60 < area < 2000:
+                symbols.append(symbol('filter_or_controller', 'rectangle', 0.75, 'opencv_square_rect'))
+            elif (aspect_ratio > 1.4 or aspect_ratio < 0.7) and area_ratio > 0.75 and 100 < area < 4000:
+                symbols.append(symbol('flow_meter', 'rectangle', 0.7, 'opencv_long_rect'))
+    return symbols
+
+
+def _prepare_binary(page):
+    """与 _detect_symbols_multiscale 相同的预处理"""
+    h, w = page.gray.shape
+    valid_y_max = int(h * 0.85)
+    valid_x_max = int(w * 0.95)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    binary = cv2.morphologyEx(page.binary, cv2.MORPH_CLOSE, kernel)
+    binary[valid_y_max:, :] = 0
+    binary[:, valid_x_max:] = 0
+    return binary, valid_x_max, valid_y_max
+
+
+def _best_of(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def run(pdf_path: str, max_pages: int = None, repeat: int = 5):
+    service = PIDRecognitionService()
+    page_count = get_pdf_page_count(pdf_path)
+    if max_pages is not None:
+        page_count = min(page_count, max_pages)
+
+    report = []
+    for page_num in range(page_count):
+        page = render_pdf_page(pdf_path, page_num)
+        binary, valid_x_max, valid_y_max = _prepare_binary(page)
+        (contours, _), t_find = _best_of(
+            lambda: cv2.findContours(binary, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE), repeat)
+
+        expected, t_reference = _best_of(
+            lambda: reference_detect_contour_symbols(binary, page_num, valid_x_max, valid_y_max), repeat)
+        with contextlib.redirect_stdout(io.StringIO()):
+            (actual, _), t_batched = _best_of(
+                lambda: service._detect_contour_symbols(binary, page_num, valid_x_max, valid_y_max), repeat)
+
+        report.append({
+            'page': page_num + 1,
+            'size': f'{binary.shape[1]}x{binary.shape[0]}',
+            'contours': len(contours),
+            'find_contours_seconds': round(t_find, 4),
+            'symbols': len(actual),
+            'reference_seconds': round(t_reference, 4),
+            'batched_seconds': round(t_batched, 4),
+            'speedup': round(t_reference / t_batched, 1) if t_batched else None,
+            'identical': repr(actual) == repr(expected)
+        })
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        print('Usage: python benchmark_contour_classification.py <pdf_path> [--max-pages N] [--repeat N]')
+        sys.exit(1)
+
+    max_pages = None
+    repeat = 5
+    if '--max-pages' in args:
+        idx = args.index('--max-pages')
+        max_pages = int(args[idx + 1])
+        del args[idx:idx + 2]
+    if '--repeat' in args:
+        idx = args.index('--repeat')
+        repeat = int(args[idx + 1])
+        del args[idx:idx + 2]
+
+    report = run(args[0], max_pages, repeat)
+    sys.exit(0 if all(r['identical'] for r in report) else 1)
+
+
+if __name__ == '__main__':
+    main()
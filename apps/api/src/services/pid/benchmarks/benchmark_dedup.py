@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+符号去重基准测试
+
+对比原线性扫描去重 (O(N²)) 与40px网格索引去重的耗时，并校验输出一致。
+合成候选模拟多尺度检测结果：每个真实符号产生若干位置抖动、置信度不同的重复候选。
+
+用法: python benchmark_dedup.py [--sizes 1000,5000,20000] [--seed N]
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIDRecognitionService import PIDRecognitionService
+
+# 每个真实符号占用的图幅面积（px²）
+AREA_PER_SYMBOL = 120 * 120
+
+
+def reference_deduplicate_symbols(symbols):
+    """原实现（线性扫描），作为正确性基准"""
+    if len(symbols) == 0:
+        return []
+    filtered = []
+    for sym in symbols:
+        pos1 = sym.get('position')
+        if not pos1:
+            continue
+        x1, y1 = pos1
+        is_dup = False
+        for j, existing in enumerate(filtered):
+            pos2 = existing.get('position')
+            if not pos2:
+                continue
+            x2, y2 = pos2
+            distance = np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
+            if distance < 40:
+                if sym.get('confidence', 0) > existing.get('confidence', 0):
+                    filtered[j] = sym
+                is_dup = True
+                break
+        if not is_dup:
+            filtered.append(sym)
+    return filtered
+
+
+def make_candidates(n: int, seed: int = 0):
+    """生成约n个原始候选（含重复），顺序打乱以模拟各检测器结果拼接"""
+    rng = np.random.default_rng(seed)
+    n_symbols = max(1, n // 3)
+    side = int(np.sqrt(n_symbols * AREA_PER_SYMBOL))
+    centers = rng.integers(0, side, size=(n_symbols, 2))
+
+    candidates = []
+    while len(candidates) < n:
+        cx, cy = centers[rng.integers(0, n_symbols)]
+        jitter = rng.integers(-25, 26, size=2)
+        candidates.append({
+            'symbol_type': 'instrument',
+            'position': [int(cx + jitter[0]), int(cy + jitter[1])],
+            'confidence': round(float(rng.choice([0.7, 0.75, 0.8, 0.85, 0.9])), 2),
+            'page': 0
+        })
+    return candidates
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, seed: int = 0):
+    service = PIDRecognitionService()
+    report = []
+    for n in sizes:
+        candidates = make_candidates(n, seed)
+        indexed, t_indexed = _timed(service._deduplicate_symbols, candidates)
+        expected, t_reference = _timed(reference_deduplicate_symbols, candidates)
+
+        report.append({
+            'candidates': n,
+            'kept': len(indexed),
+            'reference_seconds': round(t_reference, 4),
+            'indexed_seconds': round(t_indexed, 4),
+            'speedup': round(t_reference / t_indexed, 1) if t_indexed else None,
+            'identical': [id(s) for s in indexed] == [id(s) for s in expected]
+        })
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    sizes = [1000, 5000, 20000]
+    seed = 0
+    if '--sizes' in args:
+        sizes = [int(s) for s in args[args.index('--sizes') + 1].split(',')]
+    if '--seed' in args:
+        seed = int(args[args.index('--seed') + 1])
+
+    report = run(sizes, seed)
+    sys.exit(0 if all(r['identical'] for r in report) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+图核心基准测试（多图纸装置级规模）
+
+合成装置图：若干张图纸，每张图纸上组件排成网格，相邻组件按概率相连（含少量回流边），
+图纸之间由少量跨图连接串起。对比 NetworkX DiGraph 与 CSR 图核心（PIDGraphCore）：
+- 建图耗时与内存（tracemalloc：建图峰值 / 建成后常驻）
+- 连通性（弱连通分量、孤立节点、度中心性）、强连通分量、广度优先遍历
+- 完整 analyze()（管段模式）耗时
+并校验两者的连通分量、孤立节点与中心性前5一致。
+
+用法: python benchmark_graph_core.py [--nodes 10000,50000,100000] [--seed N]
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIDGraphAnalyzer import PIDGraphAnalyzer
+from PIDGraphCore import HAS_SCIPY, PIDGraphCore
+
+try:
+    import networkx as nx
+except ImportError:
+    nx = None
+
+NODES_PER_SHEET = 400
+SPACING = 150
+TYPES = ['pump', 'valve', 'indicator', 'filter_or_controller', 'flow_meter', 'equipment']
+
+
+def make_plant(n_nodes: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(NODES_PER_SHEET)))
+    components = []
+    connections = []
+    for i in range(n_nodes):
+        sheet, k = divmod(i, NODES_PER_SHEET)
+        r, c = divmod(k, side)
+        components.append({
+            'tag_number': f'S{sheet}-{k:04d}',
+            'symbol_type': TYPES[int(rng.integers(len(TYPES)))],
+            # 图纸横向错开，不同图纸的组件不会落在彼此附近
+            'position': [int((sheet * (side + 1) + c) * SPACING + rng.integers(-20, 21)),
+                         int(r * SPACING + rng.integers(-20, 21))],
+            'page': sheet
+        })
+        if c > 0 and rng.random() < 0.7:
+            connections.append({'from': components[i - 1]['tag_number'], 'to': components[i]['tag_number']})
+        if r > 0 and rng.random() < 0.4:
+            connections.append({'from': components[i - side]['tag_number'], 'to': components[i]['tag_number']})
+        if r > 0 and rng.random() < 0.03:
+            # 回流
+            connections.append({'from': components[i]['tag_number'], 'to': components[i - side]['tag_number']})
+    # 跨图纸连接
+    sheets = (n_nodes + NODES_PER_SHEET - 1) // NODES_PER_SHEET
+    for sheet in range(1, sheets):
+        connections.append({'from': f'S{sheet - 1}-{NODES_PER_SHEET - 1:04d}', 'to': f'S{sheet}-0000'})
+    return components, connections
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def _memory(fn, *args):
+    """返回 (结果, 峰值MB, 常驻MB)"""
+    tracemalloc.start()
+    try:
+        result = fn(*args)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, round(peak / 1024 / 1024, 1), round(current / 1024 / 1024, 1)
+
+
+def networkx_build(components, connections):
+    """原实现的建图方式"""
+    G = nx.DiGraph()
+    for comp in components:
+        G.add_node(comp['tag_number'], type=comp.get('symbol_type'), position=comp.get('position'),
+                   parameters=comp.get('parameters', {}), confidence=comp.get('confidence', 0))
+    for conn in connections:
+        G.add_edge(conn['from'], conn['to'], distance=conn.get('distance'), confidence=conn.get('confidence', 0))
+    return G
+
+
+def networkx_connectivity(G):
+    components = list(nx.connected_components(G.to_undirected()))
+    centrality = nx.degree_centrality(G)
+    top = sorted(centrality.items(), key=lambda x: x[1], reverse=True)[:5]
+    return [len(c) for c in components], list(nx.isolates(G)), [node for node, _ in top]
+
+
+def networkx_traversal(G, source):
+    return len(list(nx.strongly_connected_components(G))), len(list(nx.bfs_tree(G, source)))
+
+
+def core_connectivity(core):
+    labels = core.weak_components()
+    top = np.argsort(-core.degree_centrality(), kind='stable')[:5].tolist()
+    return np.bincount(labels).tolist(), [core.tags[i] for i in core.isolates().tolist()], [core.tags[i] for i in top]
+
+
+def core_traversal(core, source):
+    return len(np.unique(core.strong_components())), len(core.bfs(source))
+
+
+def run(sizes, seed: int = 0):
+    report = []
+    for n_nodes in sizes:
+        components, connections = make_plant(n_nodes, seed)
+        entry = {'nodes': n_nodes, 'connections': len(connections), 'scipy': HAS_SCIPY}
+
+        core, t_build = _timed(PIDGraphCore.from_components, components, connections)
+        _, peak, retained = _memory(PIDGraphCore.from_components, components, connections)
+        core_conn, t_conn = _timed(core_connectivity, core)
+        core_trav, t_trav = _timed(core_traversal, core, 0)
+        analysis, t_analyze = _timed(PIDGraphAnalyzer('runs').analyze, components, connections)
+        entry['core'] = {
+            'build_seconds': round(t_build, 3),
+            'build_peak_mb': peak,
+            'retained_mb': retained,
+            'connectivity_seconds': round(t_conn, 3),
+            'scc_bfs_seconds': round(t_trav, 3),
+            'analyze_seconds': round(t_analyze, 3),
+            'pipelines': len(analysis['pipelines'])
+        }
+
+        if nx is not None:
+            G, t_build = _timed(networkx_build, components, connections)
+            _, peak, retained = _memory(networkx_build, components, connections)
+            nx_conn, t_conn = _timed(networkx_connectivity, G)
+            nx_trav, t_trav = _timed(networkx_traversal, G, components[0]['tag_number'])
+            entry['networkx'] = {
+                'build_seconds': round(t_build, 3),
+                'build_peak_mb': peak,
+            'retained_mb': retained,
+                'connectivity_seconds': round(t_conn, 3),
+                'scc_bfs_seconds': round(t_trav, 3)
+            }
+            entry['identical'] = nx_conn == core_conn and nx_trav == core_trav
+        report.append(entry)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    sizes = [10000, 50000, 100000]
+    seed = 0
+    if '--nodes' in args:
+        sizes = [int(v) for v in args[args.index('--nodes') + 1].split(',')]
+    if '--seed' in args:
+        seed = int(args[args.index('--seed') + 1])
+
+    run(sizes, seed)
+
+
+if __name__ == '__main__':
+    main()
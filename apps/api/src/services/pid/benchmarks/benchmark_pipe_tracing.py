@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+管线连接推断基准测试
+
+合成图纸：组件（圆形符号）之间用带弯头的管线相连，部分管线带三通支路，已知真实连接。
+对比原 HoughLinesP + 逐线段×逐组件点线距离 与骨架图追踪的耗时及连接的准确率/召回率。
+
+用法: python benchmark_pipe_tracing.py [--sizes 3000x2000,7000x5000,14000x10000] [--seed N]
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIDPageImage import PIDPageImage
+from PIDPipeTracer import PIDPipeTracer
+
+# 每对相连组件占用的图幅面积（px²）
+AREA_PER_LINK = 600 * 600
+SYMBOL_RADIUS = 25
+
+
+def reference_infer_connections(page, components):
+    """原实现（Hough线段 + 点到线段距离），作为对照"""
+    h, w = page.gray.shape
+    edges = page.edges.copy()
+    edges[:50, :] = 0
+    edges[int(h * 0.75):, :] = 0
+    edges[:, :50] = 0
+    edges[:, int(w * 0.90):] = 0
+    lines = cv2.HoughLinesP(edges, rho=1, theta=np.pi / 180, threshold=60, minLineLength=80, maxLineGap=20)
+
+    def point_to_line_distance(px, py, x1, y1, x2, y2):
+        dx, dy = x2 - x1, y2 - y1
+        if dx == 0 and dy == 0:
+            return np.sqrt((px - x1) ** 2 + (py - y1) ** 2)
+        t = max(0, min(1, ((px - x1) * dx + (py - y1) * dy) / (dx * dx + dy * dy)))
+        return np.sqrt((px - (x1 + t * dx)) ** 2 + (py - (y1 + t * dy)) ** 2)
+
+    connections = []
+    for line in (lines.reshape(-1, 4) if lines is not None else []):
+        x1, y1, x2, y2 = (int(v) for v in line)
+        length = np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+        angle = np.abs(np.arctan2(y2 - y1, x2 - x1) * 180 / np.pi)
+        if not (80 < length < 1500) or not (angle < 15 or angle > 165 or 75 < angle < 105):
+            continue
+        nearby = []
+        for comp in components:
+            cx, cy = comp['position']
+            if point_to_line_distance(cx, cy, x1, y1, x2, y2) < 50:
+                nearby.append(comp)
+        nearby.sort(key=lambda c: (c['position'][0] - x1) * (x2 - x1) + (c['position'][1] - y1) * (y2 - y1))
+        for a, b in zip(nearby, nearby[1:]):
+            connections.append({'from': a['tag_number'], 'to': b['tag_number']})
+    return connections
+
+
+def make_sheet(width: int, height: int, seed: int = 0):
+    """生成 (图像, 组件, 真实连接)：每条链路 A ─┐ B（L形），三分之一的链路带三通支路 C"""
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    components = []
+    truth = set()
+
+    def add_component(x, y):
+        tag = f'C-{len(components):04d}'
+        cv2.circle(image, (x, y), SYMBOL_RADIUS, (0, 0, 0), 3)
+        components.append({'tag_number': tag, 'position': [x, y], 'ports': [], 'page': 0})
+        return tag
+
+    n_links = max(1, int(width * 0.9 * height * 0.75 / AREA_PER_LINK))
+    cols = int(np.sqrt(n_links * width / height)) or 1
+    rows = max(1, n_links // cols)
+    cell_w = int(width * 0.9 / cols)
+    cell_h = int(height * 0.75 / rows)
+    for r in range(rows):
+        for c in range(cols):
+            x0, y0 = 60 + c * cell_w, 60 + r * cell_h
+            ax, ay = x0 + 60, y0 + 60
+            bx = x0 + int(rng.integers(cell_w // 2, cell_w - 80))
+            by = y0 + int(rng.integers(cell_h // 2, cell_h - 80))
+            if bx >= width * 0.9 - 60 or by >= height * 0.75 - 60:
+                continue
+            a = add_component(ax, ay)
+            b = add_component(bx, by)
+            # A → 弯头(bx, ay) → B
+            cv2.line(image, (ax + SYMBOL_RADIUS, ay), (bx, ay), (0, 0, 0), 4)
+            cv2.line(image, (bx, ay), (bx, by - SYMBOL_RADIUS), (0, 0, 0), 4)
+            truth.add(frozenset((a, b)))
+            if rng.random() < 1 / 3:
+                tx = (ax + bx) // 2
+                cy = ay + (by - ay) // 2
+                t = add_component(tx, cy)
+                cv2.line(image, (tx, ay), (tx, cy - SYMBOL_RADIUS), (0, 0, 0), 4)
+                truth.add(frozenset((a, t)))
+                truth.add(frozenset((t, b)))
+            cv2.putText(image, f'PI-{r}{c}', (ax + 40, ay - 40), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 3)
+    return image, components, truth
+
+
+def _score(connections, truth):
+    found = {frozenset((c['from'], c['to'])) for c in connections if c['from'] != c['to']}
+    hits = len(found & truth)
+    return {
+        'connections': len(found),
+        'precision': round(hits / len(found), 3) if found else None,
+        'recall': round(hits / len(truth), 3) if truth else None
+    }
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, seed: int = 0):
+    report = []
+    for width, height in sizes:
+        image, components, truth = make_sheet(width, height, seed)
+
+        page = PIDPageImage(image)
+        traced, t_traced = _timed(PIDPipeTracer().trace, page, components)
+        page = PIDPageImage(image)
+        reference, t_reference = _timed(reference_infer_connections, page, components)
+
+        report.append({
+            'size': f'{width}x{height}',
+            'components': len(components),
+            'true_links': len(truth),
+            'reference_seconds': round(t_reference, 3),
+            'traced_seconds': round(t_traced, 3),
+            'speedup': round(t_reference / t_traced, 1) if t_traced else None,
+            'reference': _score(reference, truth),
+            'traced': _score(traced, truth)
+        })
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    sizes = [(3000, 2000), (7000, 5000), (14000, 10000)]
+    seed = 0
+    if '--sizes' in args:
+        sizes = [tuple(int(v) for v in s.split('x')) for s in args[args.index('--sizes') + 1].split(',')]
+    if '--seed' in args:
+        seed = int(args[args.index('--seed') + 1])
+
+    run(sizes, seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+管线识别基准测试
+
+合成网状图纸拓扑：泵 → 若干级「主管 + 旁路」并联段 → 设备，带一条回流环路；
+入口→出口简单路径数为 2^级数。对比逐对枚举简单路径（paths，路径长度截断为20）与分支点间管段（runs）
+的管线数、识别耗时及完整分析（含规则验证、装配约束）耗时。
+paths 模式只在简单路径数不超过 --max-paths 时运行。
+
+用法: python benchmark_pipelines.py [--stages 4,6,200,2000] [--max-paths 5000]
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIDGraphAnalyzer import PIDGraphAnalyzer
+
+
+def make_mesh(stages: int):
+    """每级：分支点 → 主管阀 / 旁路阀 → 汇合点；末级汇合点回流到第1级分支点"""
+    components = [{'tag_number': 'P-1', 'symbol_type': 'pump'}]
+    connections = []
+    previous = 'P-1'
+    for i in range(stages):
+        split, main, bypass, join = f'B-{i}', f'V-{i}', f'HV-{i}', f'J-{i}'
+        components += [{'tag_number': split, 'symbol_type': 'tee'},
+                       {'tag_number': main, 'symbol_type': 'valve'},
+                       {'tag_number': bypass, 'symbol_type': 'valve'},
+                       {'tag_number': join, 'symbol_type': 'tee'}]
+        connections += [(previous, split), (split, main), (split, bypass), (main, join), (bypass, join)]
+        previous = join
+    components.append({'tag_number': 'E-1', 'symbol_type': 'equipment'})
+    connections += [(previous, 'E-1'), (previous, 'B-0')]
+    return components, [{'from': a, 'to': b} for a, b in connections]
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(stage_counts, max_paths: int = 5000):
+    report = []
+    for stages in stage_counts:
+        components, connections = make_mesh(stages)
+        entry = {'stages': stages, 'nodes': len(components), 'edges': len(connections), 'simple_paths': f'2^{stages}'}
+        for mode in ('paths', 'runs'):
+            if mode == 'paths' and 2 ** stages > max_paths:
+                entry[mode] = None
+                continue
+            analyzer = PIDGraphAnalyzer(mode)
+            core = analyzer._build_core(components, connections)
+            (pipelines, _), t_identify = _timed(analyzer._identify_pipelines, core, components)
+            analysis, t_analyze = _timed(analyzer.analyze, components, connections)
+            entry[mode] = {
+                'pipelines': len(pipelines),
+                'identify_seconds': round(t_identify, 4),
+                'analyze_seconds': round(t_analyze, 4),
+                'constraints': len(analysis['assembly_constraints'])
+            }
+        report.append(entry)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    stage_counts = [4, 6, 200, 2000]
+    max_paths = 5000
+    if '--stages' in args:
+        stage_counts = [int(v) for v in args[args.index('--stages') + 1].split(',')]
+    if '--max-paths' in args:
+        max_paths = int(args[args.index('--max-paths') + 1])
+
+    run(stage_counts, max_paths)
+
+
+if __name__ == '__main__':
+    main()
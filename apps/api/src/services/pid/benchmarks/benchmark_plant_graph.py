@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+装置级图基准测试（多图纸合并与单图纸增量更新）
+
+合成装置：每张图纸上组件排成网格、相邻组件按概率相连，自动位号每张图纸从001起编
+（跨图重名，验证不被合并）；相邻图纸由跨图连接符 OPC-n 串起，每10张图纸共用一台设备位号。
+统计：
+- 逐张登记全部图纸的耗时、导出（合并组件/连接 + 图核心）耗时
+- 修改其中一张图纸后 update_sheet 增量更新的耗时，与重新登记全部图纸的耗时对比
+并校验增量更新后的导出结果与全量重建完全一致。
+
+用法: python benchmark_plant_graph.py [--sheets 50,200,500] [--nodes-per-sheet 400] [--seed N]
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIDPlantGraph import PIDPlantGraph
+
+TYPES = ['pump', 'valve', 'indicator', 'filter_or_controller', 'flow_meter', 'equipment']
+
+
+def make_sheet(sheet: int, n_nodes: int, seed: int = 0, revision: int = 0):
+    """一张图纸的组件与连接；revision不同时同一张图纸的连接随机变化（模拟重新识别）"""
+    rng = np.random.default_rng([seed, sheet, revision])
+    side = int(np.ceil(np.sqrt(n_nodes)))
+    components = [{'tag_number': f'OPC-{sheet}', 'symbol_type': 'off_page_connector', 'page': sheet}]
+    if sheet > 0:
+        components.append({'tag_number': f'OPC-{sheet - 1}', 'symbol_type': 'off_page_connector', 'page': sheet})
+    components.append({'tag_number': f'E-{sheet // 10}', 'symbol_type': 'equipment', 'page': sheet})
+
+    tags = []
+    for k in range(n_nodes):
+        r, c = divmod(k, side)
+        auto = k % 3 == 0
+        tag = f'V-{k:03d}' if auto else f'L{sheet}-{k:04d}'
+        tags.append(tag)
+        components.append({
+            'tag_number': tag,
+            'symbol_type': TYPES[int(rng.integers(len(TYPES)))],
+            'position': [c * 150, r * 150],
+            'page': sheet,
+            'source': 'auto_generated' if auto else 'leader_traced'
+        })
+
+    connections = []
+    for k in range(1, n_nodes):
+        r, c = divmod(k, side)
+        if c > 0 and rng.random() < 0.7:
+            connections.append({'from': tags[k - 1], 'to': tags[k], 'page': sheet})
+        if r > 0 and rng.random() < 0.4:
+            connections.append({'from': tags[k - side], 'to': tags[k], 'page': sheet})
+    connections.append({'from': f'E-{sheet // 10}', 'to': tags[0], 'page': sheet})
+    connections.append({'from': tags[-1], 'to': f'OPC-{sheet}', 'page': sheet})
+    if sheet > 0:
+        connections.append({'from': f'OPC-{sheet - 1}', 'to': tags[0], 'page': sheet})
+    return components, connections
+
+
+def build(sheets):
+    plant = PIDPlantGraph()
+    for sheet, (components, connections) in enumerate(sheets):
+        plant.update_sheet(sheet, components, connections)
+    return plant
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sheet_counts, nodes_per_sheet: int = 400, seed: int = 0):
+    report = []
+    for n_sheets in sheet_counts:
+        sheets = [make_sheet(s, nodes_per_sheet, seed) for s in range(n_sheets)]
+        plant, t_build = _timed(build, sheets)
+        _, t_export = _timed(plant.to_core)
+
+        # 重新识别中间一张图纸
+        target = n_sheets // 2
+        sheets[target] = make_sheet(target, nodes_per_sheet, seed, revision=1)
+        changes, t_update = _timed(plant.update_sheet, target, *sheets[target])
+        rebuilt, t_rebuild = _timed(build, sheets)
+
+        report.append({
+            'sheets': n_sheets,
+            'plant': plant.summary(),
+            'build_seconds': round(t_build, 3),
+            'export_core_seconds': round(t_export, 3),
+            'update_sheet_seconds': round(t_update, 4),
+            'rebuild_seconds': round(t_rebuild, 3),
+            'speedup': round(t_rebuild / t_update, 1) if t_update > 0 else None,
+            'changes': {k: len(changes[k]) for k in ('added_nodes', 'removed_nodes', 'added_edges', 'removed_edges')},
+            'identical': (plant.components() == rebuilt.components()
+                          and plant.connections() == rebuilt.connections()
+                          and plant.summary() == rebuilt.summary())
+        })
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    sheet_counts = [50, 200, 500]
+    nodes_per_sheet = 400
+    seed = 0
+    if '--sheets' in args:
+        sheet_counts = [int(v) for v in args[args.index('--sheets') + 1].split(',')]
+    if '--nodes-per-sheet' in args:
+        nodes_per_sheet = int(args[args.index('--nodes-per-sheet') + 1])
+    if '--seed' in args:
+        seed = int(args[args.index('--seed') + 1])
+
+    run(sheet_counts, nodes_per_sheet, seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+端口邻接连接推断基准测试
+
+对比原逐对组件×逐对端口比较 (O(N²·P²)) 与网格索引实现的耗时，并校验输出一致。
+合成图纸保持符号密度不变，图幅随符号数增大。
+
+用法: python benchmark_port_matching.py [--sizes 100,1000,5000] [--seed N]
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIDRecognitionService import PIDRecognitionService
+
+# 每个符号平均占用的图幅面积（px²），约等于3倍渲染下的密集图纸
+AREA_PER_SYMBOL = 250 * 250
+
+
+def reference_infer_connections_by_ports(components):
+    """原实现（逐对比较），作为正确性基准"""
+    connections = []
+    for i, comp1 in enumerate(components):
+        if 'ports' not in comp1 or not comp1['ports']:
+            continue
+        for j, comp2 in enumerate(components[i+1:], start=i+1):
+            if 'ports' not in comp2 or not comp2['ports']:
+                continue
+            for port1 in comp1['ports']:
+                for port2 in comp2['ports']:
+                    dist = np.sqrt((port1[0] - port2[0])**2 + (port1[1] - port2[1])**2)
+                    if dist < 200:
+                        connections.append({
+                            'from': comp1['tag_number'],
+                            'to': comp2['tag_number'],
+                            'port_distance': round(dist, 2),
+                            'confidence': max(0.3, 1.0 - dist / 200),
+                            'page': comp1['page']
+                        })
+                        break
+                else:
+                    continue
+                break
+    return connections
+
+
+def make_components(n: int, seed: int = 0):
+    """生成n个带端口的合成组件（端口为np.int64元组，与轮廓检测结果一致）"""
+    rng = np.random.default_rng(seed)
+    side = int(np.sqrt(n * AREA_PER_SYMBOL))
+    components = []
+    for i in range(n):
+        cx, cy = rng.integers(0, side, size=2)
+        comp = {
+            'tag_number': f'AUTO-{i + 1:05d}',
+            'position': [int(cx), int(cy)],
+            'page': 0
+        }
+        # 约10%的组件（文字组件、圆形仪表）没有端口
+        if rng.random() >= 0.1:
+            k = int(rng.integers(3, 5))
+            offsets = rng.integers(-40, 41, size=(k, 2))
+            comp['ports'] = [tuple((np.array([cx, cy]) + o).astype(int)) for o in offsets]
+        components.append(comp)
+    return components
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, seed: int = 0):
+    service = PIDRecognitionService()
+    report = []
+    for n in sizes:
+        components = make_components(n, seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            indexed, t_indexed = _timed(service._infer_connections_by_ports, components, [])
+        expected, t_reference = _timed(reference_infer_connections_by_ports, components)
+
+        report.append({
+            'symbols': n,
+            'connections': len(indexed),
+            'reference_seconds': round(t_reference, 4),
+            'indexed_seconds': round(t_indexed, 4),
+            'speedup': round(t_reference / t_indexed, 1) if t_indexed else None,
+            'identical': repr(indexed) == repr(expected)
+        })
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    sizes = [100, 1000, 5000]
+    seed = 0
+    if '--sizes' in args:
+        sizes = [int(s) for s in args[args.index('--sizes') + 1].split(',')]
+    if '--seed' in args:
+        seed = int(args[args.index('--seed') + 1])
+
+    report = run(sizes, seed)
+    sys.exit(0 if all(r['identical'] for r in report) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+PID识别端到端基准测试（合成图纸 + 真值）
+
+按 密度 × 页数 生成合成图纸（synthetic_pid.py），用本地假OCR服务代替DeepSeek-OCR，
+完整运行 recognize_pid，统计：
+- 吞吐：页/秒、符号/秒
+- 各阶段耗时（PIDInstrumentation报告）
+- 准确率：符号检测、位号、连接的精确率/召回率（与真值按位置匹配）
+每次运行追加到历史文件（JSON，默认 ~/.cache/pid-benchmarks/recognition_history.json，
+可用 PID_BENCHMARK_HISTORY 或 --history 指定，不写入源码目录），并与相同配置的上一次结果对比。
+
+注意：引线检测目前停用（_detect_leader_lines 返回空），文字位号在合并阶段无法关联到符号，
+tag_recall / tag_association 按构造为0.0，不是回退；启用引线检测后才有意义。
+
+假OCR服务实现DeepSeek-OCR分块接口：按上传文件名 pid_page_{页}_{x0}_{y0}.png 定位图块，
+返回落在图块内的真值位号（带定位框），OCR耗时可用 --ocr-latency 模拟。
+
+用法: python benchmark_recognition.py [--densities 30,60,120] [--pages 1,4] [--seed 0] [--workers 1]
+                                      [--ocr-latency 0] [--history FILE] [--keep DIR]
+"""
+import contextlib
+import io
+import json
+import os
+import re
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from PIDSpatialIndex import GridIndex
+from synthetic_pid import make_pdf
+
+# 组件与真值匹配的位置容差（px，渲染后坐标）
+MATCH_TOLERANCE = 25
+GROUNDING_SCALE = 999
+
+DEFAULT_HISTORY = Path(os.getenv('PID_BENCHMARK_HISTORY',
+                                 Path.home() / '.cache' / 'pid-benchmarks' / 'recognition_history.json'))
+
+_FILENAME_PATTERN = re.compile(rb'filename="pid_page_(\d+)_(\d+)_(\d+)\.png"')
+
+
+# ------------------------------------------------------------ 假OCR服务
+
+class FakeOcrServer:
+    """本地DeepSeek-OCR替身：只认分块上传，按真值返回带定位框的位号"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.texts: Dict[int, List[Dict]] = {}
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                payload = server.respond(body)
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/ocr'
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def load_truth(self, truth: Dict):
+        """真值位号 → 按页的文字框列表"""
+        self.texts = {}
+        for comp in truth['components']:
+            self.texts.setdefault(comp['page'], []).append({'text': comp['tag_number'], 'bbox': comp['text_bbox']})
+
+    def respond(self, body: bytes) -> Dict:
+        self.requests += 1
+        match = _FILENAME_PATTERN.search(body)
+        png = body.find(b'\x89PNG\r\n\x1a\n')
+        if match is None or png < 0:
+            return {'success': False, 'text': '仅支持分块上传（PID_OCR_TILED=1）'}
+        page, x0, y0 = (int(v) for v in match.groups())
+        # IHDR紧跟PNG签名：宽、高为大端uint32
+        width, height = struct.unpack('>II', body[png + 16:png + 24])
+        if self.latency:
+            time.sleep(self.latency)
+
+        parts = []
+        for item in self.texts.get(page, []):
+            x, y, w, h = item['bbox']
+            cx, cy = x + w / 2, y + h / 2
+            if not (x0 <= cx < x0 + width and y0 <= cy < y0 + height):
+                continue
+            # 文字框截断到图块内，归一化到0-999
+            x1, y1 = max(x - x0, 0), max(y - y0, 0)
+            x2, y2 = min(x + w - x0, width), min(y + h - y0, height)
+            box = [int(x1 / width * GROUNDING_SCALE), int(y1 / height * GROUNDING_SCALE),
+                   int(x2 / width * GROUNDING_SCALE), int(y2 / height * GROUNDING_SCALE)]
+            parts.append(f"<|ref|>{item['text']}<|/ref|><|det|>[{box}]<|/det|>")
+        return {'success': True, 'text': '\n'.join(parts)}
+
+
+# ------------------------------------------------------------ 评分
+
+def _ratio(hits: int, total: int) -> Optional[float]:
+    return round(hits / total, 3) if total else None
+
+
+def match_components(components: List[Dict], truth: Dict) -> Tuple[Dict[int, int], Dict[int, int]]:
+    """组件下标 → 真值下标，返回 (按位置, 全部)
+
+    带形状的组件按位置贪心匹配（最近优先）；其余组件按位号匹配，只用于连接映射。
+    """
+    truth_components = truth['components']
+    grids: Dict[int, GridIndex] = {}
+    for j, gt in enumerate(truth_components):
+        grids.setdefault(gt['page'], GridIndex(MATCH_TOLERANCE)).insert(j, *gt['position'])
+
+    pairs = []
+    for i, comp in enumerate(components):
+        grid = grids.get(comp.get('page', 0))
+        if not comp.get('shape') or grid is None or not comp.get('position'):
+            continue
+        x, y = comp['position']
+        for j in grid.candidates(x, y):
+            gx, gy = truth_components[j]['position']
+            dist = ((gx - x) ** 2 + (gy - y) ** 2) ** 0.5
+            if dist <= MATCH_TOLERANCE:
+                pairs.append((dist, i, j))
+
+    matched: Dict[int, int] = {}
+    used = set()
+    for dist, i, j in sorted(pairs):
+        if i not in matched and j not in used:
+            matched[i] = j
+            used.add(j)
+
+    by_position = dict(matched)
+    by_tag = {(gt['page'], gt['tag_number']): j for j, gt in enumerate(truth_components)}
+    for i, comp in enumerate(components):
+        if i not in matched:
+            j = by_tag.get((comp.get('page', 0), comp.get('tag_number')))
+            if j is not None:
+                matched[i] = j
+    return by_position, matched
+
+
+def score(result: Dict, truth: Dict) -> Dict:
+    components = result.get('components', [])
+    connections = result.get('connections', [])
+    truth_components = truth['components']
+    by_position, matched = match_components(components, truth)
+
+    # 符号：带形状的组件中与真值位置匹配者
+    symbols = [i for i, comp in enumerate(components) if comp.get('shape')]
+    symbol_hits = [i for i in symbols if i in by_position]
+    shape_hits = sum(1 for i in symbol_hits if components[i]['shape'] == truth_components[matched[i]]['shape'])
+
+    # 位号：OCR提取率（真值位号出现在任一组件上）与符号-位号关联正确率
+    found_tags = {(comp.get('page', 0), comp.get('tag_number')) for comp in components}
+    tags_found = sum(1 for gt in truth_components if (gt['page'], gt['tag_number']) in found_tags)
+    tags_attached = sum(1 for i in symbol_hits if components[i].get('tag_number') == truth_components[matched[i]]['tag_number'])
+
+    # 连接：经匹配映射到真值组件对
+    tag_to_index = {}
+    for i, comp in enumerate(components):
+        tag_to_index.setdefault(comp.get('tag_number'), i)
+    truth_pairs = {frozenset((c['from'], c['to'])) for c in truth['connections']}
+    predicted = set()
+    for conn in connections:
+        a, b = tag_to_index.get(conn.get('from')), tag_to_index.get(conn.get('to'))
+        if a in matched and b in matched and matched[a] != matched[b]:
+            predicted.add(frozenset((truth_components[matched[a]]['tag_number'],
+                                     truth_components[matched[b]]['tag_number'])))
+        else:
+            predicted.add(('unmatched', conn.get('from'), conn.get('to')))
+    connection_hits = len(predicted & truth_pairs)
+
+    return {
+        'symbol_precision': _ratio(len(symbol_hits), len(symbols)),
+        'symbol_recall': _ratio(len(symbol_hits), len(truth_components)),
+        'shape_accuracy': _ratio(shape_hits, len(symbol_hits)),
+        'tag_recall': _ratio(tags_found, len(truth_components)),
+        'tag_association': _ratio(tags_attached, len(symbol_hits)),
+        'connection_precision': _ratio(connection_hits, len(predicted)),
+        'connection_recall': _ratio(connection_hits, len(truth_pairs)),
+        'components': len(components),
+        'connections': len(connections)
+    }
+
+
+# ------------------------------------------------------------ 运行
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).resolve().parent,
+                              capture_output=True, text=True, check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(service, server: FakeOcrServer, workdir: Path, density: int, pages: int, seed: int,
+             workers: int) -> Dict:
+    pdf_path = workdir / f'synthetic_d{density}_p{pages}_s{seed}.pdf'
+    truth = make_pdf(str(pdf_path), density, pages, seed)
+    server.load_truth(truth)
+    requests_before = server.requests
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = service.recognize_pid(str(pdf_path), workers=workers)
+    seconds = time.perf_counter() - start
+
+    metrics = result.get('metrics') or service.instrumentation.report(include_profile=False)
+    return {
+        'config': {'density': density, 'pages': pages, 'seed': seed, 'workers': workers,
+                   'ocr_latency': server.latency},
+        'truth': {'components': len(truth['components']), 'connections': len(truth['connections'])},
+        'seconds': round(seconds, 3),
+        'throughput': {
+            'pages_per_second': round(pages / seconds, 3) if seconds else None,
+            'symbols_per_second': round(len(truth['components']) / seconds, 1) if seconds else None
+        },
+        'ocr_requests': server.requests - requests_before,
+        'stages': {name: stage['seconds'] for name, stage in metrics.get('stages', {}).items()},
+        'peak_rss_mb': metrics.get('peak_rss_mb'),
+        'accuracy': score(result, truth)
+    }
+
+
+def _load_history(path: Path) -> List[Dict]:
+    if not path.exists():
+        return []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"⚠️  历史文件无法读取，重新开始: {path}")
+        return []
+
+
+def _previous(history: List[Dict], config: Dict) -> Optional[Dict]:
+    for run in reversed(history):
+        for case in run.get('cases', []):
+            if case.get('config') == config:
+                return case
+    return None
+
+
+def _print_case(case: Dict, previous: Optional[Dict]):
+    config, accuracy = case['config'], case['accuracy']
+
+    def delta(value, old, unit=''):
+        if old is None or value is None:
+            return ''
+        return f' ({value - old:+.3f}{unit})'
+
+    print(f"📊 密度 {config['density']} × {config['pages']} 页 (workers={config['workers']}): "
+          f"{case['seconds']:.2f}s{delta(case['seconds'], previous and previous['seconds'], 's')}, "
+          f"{case['throughput']['pages_per_second']} 页/秒")
+    stages = ' '.join(f'{name}={seconds:.2f}s' for name, seconds in case['stages'].items())
+    print(f"   阶段: {stages}")
+    old = previous['accuracy'] if previous else {}
+    for key in ('symbol_precision', 'symbol_recall', 'shape_accuracy', 'tag_recall', 'tag_association',
+                'connection_precision', 'connection_recall'):
+        print(f"   {key:<22} {accuracy[key]}{delta(accuracy[key], old.get(key))}")
+
+
+def run(densities: List[int], page_counts: List[int], seed: int = 0, workers: int = 1,
+        ocr_latency: float = 0.0, history_path: Path = DEFAULT_HISTORY, keep_dir: str = None) -> Dict:
+    with FakeOcrServer(ocr_latency) as server:
+        # 服务在构造时读取环境变量：强制分块OCR指向假服务，关闭缓存与剖析
+        os.environ['DOCUMENT_RECOGNITION_SERVICE'] = server.url
+        os.environ['PID_OCR_TILED'] = '1'
+        os.environ.pop('PID_RECOGNITION_CACHE_DIR', None)
+        os.environ.pop('PID_PROFILER', None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            from PIDRecognitionService import PIDRecognitionService
+            service = PIDRecognitionService()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(keep_dir or tmp)
+            workdir.mkdir(parents=True, exist_ok=True)
+            cases = [run_case(service, server, workdir, density, pages, seed, workers)
+                     for pages in page_counts for density in densities]
+
+    history = _load_history(history_path)
+    for case in cases:
+        _print_case(case, _previous(history, case['config']))
+
+    record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'cases': cases
+    }
+    history.append(record)
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(history_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+    print(f"✅ 已追加到历史: {history_path} (共 {len(history)} 次运行)")
+    return record
+
+
+def main():
+    args = sys.argv[1:]
+    densities = [30, 60, 120]
+    page_counts = [1]
+    seed = 0
+    workers = 1
+    ocr_latency = 0.0
+    history_path = DEFAULT_HISTORY
+    keep_dir = None
+    if '--densities' in args:
+        densities = [int(v) for v in args[args.index('--densities') + 1].split(',')]
+    if '--pages' in args:
+        page_counts = [int(v) for v in args[args.index('--pages') + 1].split(',')]
+    if '--seed' in args:
+        seed = int(args[args.index('--seed') + 1])
+    if '--workers' in args:
+        workers = int(args[args.index('--workers') + 1])
+    if '--ocr-latency' in args:
+        ocr_latency = float(args[args.index('--ocr-latency') + 1])
+    if '--history' in args:
+        history_path = Path(args[args.index('--history') + 1])
+    if '--keep' in args:
+        keep_dir = args[args.index('--keep') + 1]
+
+    run(densities, page_counts, seed, workers, ocr_latency, history_path, keep_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+合成PID图纸生成器（带真值）
+
+在矢量PDF上绘制符号（圆形仪表、菱形控制阀、三角阀、方形控制器、长方形流量计）、位号文字及管线，
+同时给出真值：组件（位号、形状、渲染后像素坐标、位号文字框）与连接（组件对）。
+- 符号排布在带抖动的网格上，密度 = 每页符号数
+- 相邻符号按概率用Z形管线（两个弯头）相连，管线端点接在符号外沿
+- 有效区域避开底部图例区与右侧标题栏（与识别服务的排除区域一致）
+
+用法: python synthetic_pid.py OUT.pdf [--density 60] [--pages 1] [--seed 0]
+"""
+import json
+import sys
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+# A3横向（pt），识别服务按3倍渲染
+PAGE_WIDTH = 1190
+PAGE_HEIGHT = 842
+ZOOM = 3
+
+# 符号可放置区域（pt）：避开边框、底部图例区（25%）与右侧标题栏（15%）
+AREA_X = (60, PAGE_WIDTH * 0.80)
+AREA_Y = (60, PAGE_HEIGHT * 0.68)
+
+LINE_WIDTH = 0.8
+
+# 符号种类 → (形状, 符号类型, 位号前缀, 半宽, 半高)（pt）
+# 形状/符号类型与识别服务的命名一致；半宽/半高即管线接入点到中心的距离（渲染后需小于管线吸附半径30px）
+SHAPES = {
+    'circle': ('circle', 'indicator', ('PI', 'TI', 'FI', 'LI'), 8, 8),
+    'diamond': ('diamond', 'valve', ('CV',), 9, 9),
+    'triangle': ('triangle', 'manual_valve', ('V',), 9, 9),
+    'square': ('rectangle', 'filter_or_controller', ('P',), 7, 7),
+    'long_rect': ('rectangle', 'flow_meter', ('E',), 9, 4),
+}
+
+
+def _draw_symbol(page, kind: str, x: float, y: float):
+    hw, hh = SHAPES[kind][3:]
+    black = (0, 0, 0)
+    if kind == 'circle':
+        page.draw_circle((x, y), hw, color=black, width=LINE_WIDTH)
+    elif kind == 'diamond':
+        page.draw_polyline([(x, y - hh), (x + hw, y), (x, y + hh), (x - hw, y), (x, y - hh)],
+                           color=black, width=LINE_WIDTH, closePath=True)
+    elif kind == 'triangle':
+        # 指向右侧的流向三角：左边中点与右顶点为接入点
+        page.draw_polyline([(x - hw, y - hh), (x + hw, y), (x - hw, y + hh), (x - hw, y - hh)],
+                           color=black, width=LINE_WIDTH, closePath=True)
+    else:
+        page.draw_rect(fitz.Rect(x - hw, y - hh, x + hw, y + hh), color=black, width=LINE_WIDTH)
+
+
+def _draw_pipe(page, points: List[Tuple[float, float]]):
+    page.draw_polyline(points, color=(0, 0, 0), width=LINE_WIDTH)
+
+
+def _layout(density: int, rng: np.random.Generator) -> List[Tuple[int, int, float, float]]:
+    """带抖动的网格：返回 (行, 列, x, y)"""
+    width = AREA_X[1] - AREA_X[0]
+    height = AREA_Y[1] - AREA_Y[0]
+    cols = max(1, int(round(np.sqrt(density * width / height))))
+    rows = max(1, int(np.ceil(density / cols)))
+    cell_w, cell_h = width / cols, height / rows
+    jitter = 0.2
+    cells = []
+    for r in range(rows):
+        for c in range(cols):
+            if len(cells) >= density:
+                break
+            x = AREA_X[0] + (c + 0.5 + rng.uniform(-jitter, jitter)) * cell_w
+            y = AREA_Y[0] + (r + 0.5 + rng.uniform(-jitter, jitter)) * cell_h
+            cells.append((r, c, x, y))
+    return cells
+
+
+def make_page(page, page_num: int, density: int, rng: np.random.Generator,
+              link_right: float = 0.6, link_down: float = 0.3) -> Tuple[List[Dict], List[Dict]]:
+    """在PyMuPDF页面上绘制一张合成图纸，返回 (真值组件, 真值连接)"""
+    kinds = list(SHAPES)
+    components = []
+    by_cell = {}
+    for r, c, x, y in _layout(density, rng):
+        kind = kinds[int(rng.integers(len(kinds)))]
+        shape, symbol_type, prefixes, hw, hh = SHAPES[kind]
+        tag = f'{prefixes[int(rng.integers(len(prefixes)))]}-{page_num + 1}{len(components):03d}'
+        _draw_symbol(page, kind, x, y)
+
+        # 位号文字：符号右上方
+        fontsize = 6
+        tx, ty = x + hw + 3, y - hh - 3
+        page.insert_text((tx, ty), tag, fontsize=fontsize)
+        text_w = fitz.get_text_length(tag, fontsize=fontsize)
+
+        by_cell[(r, c)] = len(components)
+        components.append({
+            'tag_number': tag,
+            'kind': kind,
+            'shape': shape,
+            'symbol_type': symbol_type,
+            'page': page_num,
+            'position': [int(round(x * ZOOM)), int(round(y * ZOOM))],
+            'text_bbox': [int(tx * ZOOM), int((ty - fontsize) * ZOOM),
+                          int(text_w * ZOOM) + 1, int(fontsize * 1.2 * ZOOM)],
+            '_pt': (x, y, hw, hh)
+        })
+
+    connections = []
+    for (r, c), i in by_cell.items():
+        a = components[i]
+        ax, ay, ahw, ahh = a['_pt']
+        right = by_cell.get((r, c + 1))
+        if right is not None and rng.random() < link_right:
+            b = components[right]
+            bx, by, bhw, bhh = b['_pt']
+            # A右接入点 → 水平 → 垂直 → 水平 → B左接入点
+            mid_x = (ax + ahw + bx - bhw) / 2
+            _draw_pipe(page, [(ax + ahw, ay), (mid_x, ay), (mid_x, by), (bx - bhw, by)])
+            connections.append({'from': a['tag_number'], 'to': b['tag_number'], 'page': page_num})
+        down = by_cell.get((r + 1, c))
+        if down is not None and rng.random() < link_down:
+            b = components[down]
+            bx, by, bhw, bhh = b['_pt']
+            # A下接入点 → 垂直 → 水平 → 垂直 → B上接入点
+            mid_y = (ay + ahh + by - bhh) / 2
+            _draw_pipe(page, [(ax, ay + ahh), (ax, mid_y), (bx, mid_y), (bx, by - bhh)])
+            connections.append({'from': a['tag_number'], 'to': b['tag_number'], 'page': page_num})
+
+    for comp in components:
+        comp.pop('_pt')
+    return components, connections
+
+
+def make_pdf(path: str, density: int = 60, pages: int = 1, seed: int = 0) -> Dict:
+    """生成合成PID PDF，返回真值 {'components', 'connections', 'zoom', 'density', 'pages', 'seed'}"""
+    if fitz is None:
+        raise RuntimeError('PyMuPDF未安装，无法生成合成图纸')
+    rng = np.random.default_rng(seed)
+    doc = fitz.open()
+    components = []
+    connections = []
+    for page_num in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        page_components, page_connections = make_page(page, page_num, density, rng)
+        components.extend(page_components)
+        connections.extend(page_connections)
+    doc.save(path)
+    doc.close()
+    return {
+        'components': components,
+        'connections': connections,
+        'zoom': ZOOM,
+        'density': density,
+        'pages': pages,
+        'seed': seed
+    }
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        print('用法: python synthetic_pid.py OUT.pdf [--density 60] [--pages 1] [--seed 0]')
+        sys.exit(1)
+    density = int(args[args.index('--density') + 1]) if '--density' in args else 60
+    pages = int(args[args.index('--pages') + 1]) if '--pages' in args else 1
+    seed = int(args[args.index('--seed') + 1]) if '--seed' in args else 0
+
+    truth = make_pdf(args[0], density, pages, seed)
+    truth_path = args[0].rsplit('.', 1)[0] + '.truth.json'
+    with open(truth_path, 'w', encoding='utf-8') as f:
+        json.dump(truth, f, ensure_ascii=False, indent=2)
+    print(f"✅ {args[0]}: {len(truth['components'])} 个组件, {len(truth['connections'])} 条连接 → {truth_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -11,21 +11,32 @@ from datetime import datetime
 sys.path.insert(0, str(Path(__file__).parent))
 
 from PIDtoAssemblyPipeline import PIDtoAssemblyPipeline
+from PIDRecognitionService import PIDRecognitionService
 
 def main():
     if len(sys.argv) < 2:
         print(json.dumps({
             'success': False,
-            'error': 'Usage: python3 generate_assembly_from_data.py <json_file>'
+            'error': 'Usage: python3 generate_assembly_from_data.py <json_file | pdf_file>'
         }))
         sys.exit(1)
 
     json_file = sys.argv[1]
 
     try:
-        # 读取JSON数据
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if json_file.lower().endswith('.pdf'):
+            # PDF：读取识别缓存（需设置PID_RECOGNITION_CACHE_DIR，且该图纸已识别过）
+            data = PIDRecognitionService().cached_recognition(json_file)
+            if data is None:
+                print(json.dumps({
+                    'success': False,
+                    'error': f'No cached recognition result for {json_file}'
+                }))
+                sys.exit(1)
+        else:
+            # 读取JSON数据
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
 
         components = data.get('components', [])
         connections = data.get('connections', [])
@@ -3,6 +3,8 @@
 PID识别命令行工具
 供Node.js服务调用
 """
+import contextlib
+import os
 import sys
 import json
 import numpy as np
@@ -28,11 +30,69 @@ def main():
     if len(sys.argv) < 2:
         print(json.dumps({
             'success': False,
-            'error': 'Usage: python3 pid_recognition_cli.py <pdf_path>'
+            'error': 'Usage: python3 pid_recognition_cli.py <pdf_path> [--workers N] [--max-pages N] '
+                     '[--legend-library DIR] [--seed-legend] [--cache-dir DIR] '
+                     '[--profile REPORT.json] [--profiler cprofile|pyinstrument] '
+                     '[--visualization sync|background|off] [--render-visualization]'
         }))
         sys.exit(1)
 
-    pdf_path = sys.argv[1]
+    args = sys.argv[1:]
+
+    # 页面并行进程数（默认读取PID_PAGE_WORKERS）
+    workers = None
+    if '--workers' in args:
+        idx = args.index('--workers')
+        workers = int(args[idx + 1])
+        del args[idx:idx + 2]
+
+    max_pages = None
+    if '--max-pages' in args:
+        idx = args.index('--max-pages')
+        max_pages = int(args[idx + 1])
+        del args[idx:idx + 2]
+
+    # 图例库目录（默认读取PID_LEGEND_LIBRARY_DIR）
+    if '--legend-library' in args:
+        idx = args.index('--legend-library')
+        os.environ['PID_LEGEND_LIBRARY_DIR'] = args[idx + 1]
+        del args[idx:idx + 2]
+
+    # 识别结果缓存目录（默认读取PID_RECOGNITION_CACHE_DIR）
+    if '--cache-dir' in args:
+        idx = args.index('--cache-dir')
+        os.environ['PID_RECOGNITION_CACHE_DIR'] = args[idx + 1]
+        del args[idx:idx + 2]
+
+    # 分阶段耗时/内存报告；--profiler 选择逐阶段剖析器（默认cProfile，工作进程继承环境变量）
+    profile_path = None
+    if '--profile' in args:
+        idx = args.index('--profile')
+        profile_path = args[idx + 1]
+        del args[idx:idx + 2]
+        os.environ.setdefault('PID_PROFILER', 'cprofile')
+    if '--profiler' in args:
+        idx = args.index('--profiler')
+        os.environ['PID_PROFILER'] = args[idx + 1]
+        del args[idx:idx + 2]
+
+    # 可视化模式（默认读取PID_VISUALIZATION）
+    if '--visualization' in args:
+        idx = args.index('--visualization')
+        os.environ['PID_VISUALIZATION'] = args[idx + 1]
+        del args[idx:idx + 2]
+
+    # 只基于缓存的识别结果生成可视化，不做识别（需配合--cache-dir）
+    render_visualization = '--render-visualization' in args
+    if render_visualization:
+        args.remove('--render-visualization')
+
+    # 只用该图纸预置图例库，不做识别
+    seed_legend = '--seed-legend' in args
+    if seed_legend:
+        args.remove('--seed-legend')
+
+    pdf_path = args[0]
 
     if not Path(pdf_path).exists():
         print(json.dumps({
@@ -43,7 +103,36 @@ def main():
 
     try:
         service = PIDRecognitionService()
-        result = service.recognize_pid(pdf_path)
+        if seed_legend:
+            # 预置过程的日志输出到stderr，stdout只保留JSON结果
+            with contextlib.redirect_stdout(sys.stderr):
+                seeded = service.seed_legend_library(pdf_path)
+            print(json.dumps({'success': True, **seeded}, ensure_ascii=False))
+            sys.exit(0)
+
+        if render_visualization:
+            # 基于缓存的识别结果按需生成可视化，日志输出到stderr
+            with contextlib.redirect_stdout(sys.stderr):
+                cached = service.cached_recognition(pdf_path, max_pages=max_pages)
+                rendered = service.render_visualizations(
+                    pdf_path, cached['components'], cached['connections'], cached['legend'],
+                    cached['detected_pages'], workers=workers or 1
+                ) if cached is not None else None
+            if rendered is None:
+                print(json.dumps({'success': False, 'error': 'No cached recognition result (use --cache-dir)'}))
+                sys.exit(1)
+            print(json.dumps({'success': True, **rendered}, ensure_ascii=False))
+            sys.exit(0)
+
+        result = service.recognize_pid(pdf_path, workers=workers, max_pages=max_pages)
+        # background模式：进程退出前必须等后台可视化写完，其日志输出到stderr，stdout最后一行保持为JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            finished = service.wait_visualizations()
+        if finished and result.get('visualization_status') == 'pending':
+            result['visualization_status'] = 'done'
+        if profile_path:
+            service.instrumentation.write(profile_path)
+            print(f"  📈 性能报告已保存: {profile_path}", file=sys.stderr)
 
         # 输出JSON结果到stdout（供Node.js解析）
         print(json.dumps(result, ensure_ascii=False, cls=NumpyEncoder))
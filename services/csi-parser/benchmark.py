@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+CSI 解析器基准测试
+
+对目录下所有 DOCX 分别运行 CSIDocxParser 和 CSIFastDocxParser,
+校验两者输出一致并统计耗时。
+
+--nodes 模式对比 CSINode 数据类树与 CSINodeStore 的内存占用和序列化耗时。
+
+用法: python benchmark.py <spec_dir> [--limit N] [--nodes]
+"""
+
+import dataclasses
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from csi_docx_parser import CSIDocxParser, CSIFastDocxParser, CSINodeStore
+
+
+class _NodeCollector(CSIFastDocxParser):
+    """解析时额外收集 CSINode 序列, 用于构建两种表示"""
+
+    def parse_to_store(self, file_path):
+        self.collected = []
+        return super().parse_to_store(file_path)
+
+    def _process_text(self, text, style_name):
+        node = super()._process_text(text, style_name)
+        if node is not None:
+            self.collected.append(node)
+        return node
+
+
+def _time_parse(parser_cls, file_path):
+    start = time.perf_counter()
+    result = parser_cls().parse(file_path)
+    elapsed = time.perf_counter() - start
+    return result, elapsed
+
+
+def run(spec_dir: str, limit: int = 0):
+    files = sorted(str(p) for p in Path(spec_dir).rglob('*.docx') if not p.name.startswith('~$'))
+    if limit:
+        files = files[:limit]
+
+    totals = {'python-docx': 0.0, 'fast': 0.0}
+    mismatches = []
+    errors = []
+    nodes = 0
+
+    for file_path in files:
+        try:
+            expected, t_docx = _time_parse(CSIDocxParser, file_path)
+            actual, t_fast = _time_parse(CSIFastDocxParser, file_path)
+        except Exception as e:
+            errors.append({'file': file_path, 'error': str(e)})
+            continue
+
+        totals['python-docx'] += t_docx
+        totals['fast'] += t_fast
+        nodes += expected['stats']['total_nodes']
+
+        if json.dumps(expected, ensure_ascii=False) != json.dumps(actual, ensure_ascii=False):
+            mismatches.append(file_path)
+
+    report = {
+        'files': len(files),
+        'nodes': nodes,
+        'seconds': {k: round(v, 3) for k, v in totals.items()},
+        'speedup': round(totals['python-docx'] / totals['fast'], 2) if totals['fast'] else None,
+        'mismatches': mismatches,
+        'errors': errors
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def _measure(build):
+    """返回 (结果, 构建耗时, 构建后保留的内存字节数)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained
+
+
+def run_nodes(spec_dir: str, limit: int = 0):
+    """对比 CSINode 数据类树 (含扁平副本) 与 CSINodeStore"""
+    files = sorted(str(p) for p in Path(spec_dir).rglob('*.docx') if not p.name.startswith('~$'))
+    if limit:
+        files = files[:limit]
+
+    # 先把所有文件的节点序列读入内存, 两种表示共享同一批字符串, 只比较结构开销
+    sequences = []
+    for file_path in files:
+        collector = _NodeCollector()
+        collector.parse_to_store(file_path)
+        sequences.append(collector.collected)
+    nodes = sum(len(seq) for seq in sequences)
+
+    def build_dataclass():
+        built = []
+        for seq in sequences:
+            parser = CSIDocxParser()
+            parser.nodes = [dataclasses.replace(n, children=None) for n in seq]
+            tree = parser._build_tree()
+            built.append((tree, parser._flatten(tree)))
+        return built
+
+    def build_store():
+        built = []
+        for seq in sequences:
+            store = CSINodeStore()
+            for n in seq:
+                store.append(n)
+            built.append(store)
+        return built
+
+    dc_built, dc_build_s, dc_bytes = _measure(build_dataclass)
+    st_built, st_build_s, st_bytes = _measure(build_store)
+
+    start = time.perf_counter()
+    dc_out = [([n.to_dict() for n in tree], [n.to_dict() for n in flat]) for tree, flat in dc_built]
+    dc_ser_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    st_out = [(store.to_tree(), store.to_flat_list()) for store in st_built]
+    st_ser_s = time.perf_counter() - start
+
+    report = {
+        'files': len(files),
+        'nodes': nodes,
+        'dataclass': {
+            'bytes': dc_bytes,
+            'bytes_per_node': round(dc_bytes / nodes, 1) if nodes else 0,
+            'build_seconds': round(dc_build_s, 3),
+            'serialize_seconds': round(dc_ser_s, 3)
+        },
+        'store': {
+            'bytes': st_bytes,
+            'bytes_per_node': round(st_bytes / nodes, 1) if nodes else 0,
+            'build_seconds': round(st_build_s, 3),
+            'serialize_seconds': round(st_ser_s, 3)
+        },
+        'identical': json.dumps(dc_out) == json.dumps(st_out)
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        print('Usage: python benchmark.py <spec_dir> [--limit N] [--nodes]')
+        sys.exit(1)
+
+    nodes_mode = '--nodes' in args
+    args = [a for a in args if a != '--nodes']
+
+    limit = 0
+    if '--limit' in args:
+        idx = args.index('--limit')
+        limit = int(args[idx + 1])
+        del args[idx:idx + 2]
+
+    if nodes_mode:
+        report = run_nodes(args[0], limit)
+        sys.exit(0 if report['identical'] else 1)
+
+    report = run(args[0], limit)
+    sys.exit(1 if report['mismatches'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,13 +18,17 @@ CSI 样式映射：
 """
 
 import json
+import posixpath
 import re
 import sys
+import zipfile
+from array import array
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 from docx import Document
 from docx.oxml.ns import qn
+from lxml import etree
 
 
 @dataclass
@@ -55,6 +59,151 @@ class CSINode:
         return result
 
 
+class CSINodeStore:
+    """
+    CSI 节点紧凑存储 (并行数组)
+
+    节点按先序 (即创建顺序) 存放, 每个字段一个数组:
+    - levels / level_types / sort_orders / parents / ends 为 array 整数数组
+    - 字符串字段为列表, 重复值 (division/section_code) 做 intern
+    子树用下标区间表示: 节点 i 的子树为 [i, ends[i]), 不需要 children 列表。
+    树形和扁平两种输出都直接从数组生成。
+    """
+
+    LEVEL_TYPES = ('SEC', 'PRT', 'ART', 'PR1', 'PR2', 'PR3', 'PR4', 'PR5')
+    _LEVEL_TYPE_INDEX = {t: i for i, t in enumerate(LEVEL_TYPES)}
+
+    __slots__ = ('sort_orders', 'full_codes', 'divisions', 'section_codes', 'levels',
+                 'level_types', 'level_labels', 'titles_en', 'titles_zh', 'contents',
+                 'parents', 'ends', 'root_parent_codes', '_stack')
+
+    def __init__(self):
+        self.sort_orders = array('i')
+        self.full_codes: List[str] = []
+        self.divisions: List[str] = []
+        self.section_codes: List[str] = []
+        self.levels = array('b')
+        self.level_types = array('b')
+        self.level_labels: List[str] = []
+        self.titles_en: List[str] = []
+        self.titles_zh: List[str] = []
+        self.contents: List[str] = []
+        self.parents = array('i')          # 父节点下标, 根节点为 -1
+        self.ends = array('i')             # 子树结束下标 (不含)
+        self.root_parent_codes: Dict[int, str] = {}  # 根节点保留创建时的 parent_code
+        self._stack: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def append(self, node: CSINode) -> int:
+        """追加节点, 按层级用栈算法确定父节点 (与 CSIDocxParser._build_tree 一致)"""
+        index = len(self.levels)
+        stack = self._stack
+        levels = self.levels
+
+        while stack and levels[stack[-1]] >= node.level:
+            self.ends[stack.pop()] = index
+        parent = stack[-1] if stack else -1
+
+        self.sort_orders.append(node.sort_order)
+        self.full_codes.append(node.full_code)
+        self.divisions.append(sys.intern(node.division))
+        self.section_codes.append(sys.intern(node.section_code))
+        levels.append(node.level)
+        self.level_types.append(self._LEVEL_TYPE_INDEX[node.level_type])
+        self.level_labels.append(node.level_label)
+        self.titles_en.append(node.title_en)
+        self.titles_zh.append(node.title_zh)
+        self.contents.append(node.content)
+        self.parents.append(parent)
+        self.ends.append(index + 1)
+        if parent < 0:
+            self.root_parent_codes[index] = node.parent_code
+
+        stack.append(index)
+        return index
+
+    def parent_code(self, index: int) -> str:
+        """父节点编号"""
+        parent = self.parents[index]
+        if parent < 0:
+            return self.root_parent_codes.get(index, "")
+        return self.full_codes[parent]
+
+    def roots(self) -> List[int]:
+        """根节点下标"""
+        self._close()
+        result = []
+        i, n = 0, len(self)
+        while i < n:
+            result.append(i)
+            i = self.ends[i]
+        return result
+
+    def children(self, index: int) -> List[int]:
+        """子节点下标 (沿子树区间跳跃)"""
+        self._close()
+        result = []
+        i, end = index + 1, self.ends[index]
+        while i < end:
+            result.append(i)
+            i = self.ends[i]
+        return result
+
+    def node_dict(self, index: int, children: List[Dict]) -> Dict:
+        """单个节点的字典形式 (字段顺序与 CSINode.to_dict 一致)"""
+        sort_order = self.sort_orders[index]
+        return {
+            'id': f"node_{sort_order}",
+            'full_code': self.full_codes[index],
+            'division': self.divisions[index],
+            'section_code': self.section_codes[index],
+            'level': self.levels[index],
+            'level_type': self.LEVEL_TYPES[self.level_types[index]],
+            'level_label': self.level_labels[index],
+            'title_en': self.titles_en[index],
+            'title_zh': self.titles_zh[index],
+            'parent_code': self.parent_code(index),
+            'sort_order': sort_order,
+            'content': self.contents[index],
+            'children': children
+        }
+
+    def to_flat_list(self) -> List[Dict]:
+        """扁平输出 (先序, children 为空)"""
+        return [self.node_dict(i, []) for i in range(len(self))]
+
+    def to_tree(self) -> List[Dict]:
+        """树形输出"""
+        self._close()
+        ends = self.ends
+
+        def build(index: int) -> Dict:
+            children = []
+            i, end = index + 1, ends[index]
+            while i < end:
+                children.append(build(i))
+                i = ends[i]
+            return self.node_dict(index, children)
+
+        return [build(i) for i in self.roots()]
+
+    def count_by_level(self) -> Dict[str, int]:
+        """按层级统计 (按首次出现顺序)"""
+        counts = {}
+        for t in self.level_types:
+            level_type = self.LEVEL_TYPES[t]
+            counts[level_type] = counts.get(level_type, 0) + 1
+        return counts
+
+    def _close(self):
+        """尚未闭合的节点子树延伸到末尾"""
+        n = len(self)
+        for index in self._stack:
+            self.ends[index] = n
+
+
 class CSIDocxParser:
     """CSI MasterSpec DOCX 解析器"""
 
@@ -444,15 +593,362 @@ class CSIDocxParser:
         return counts
 
 
+# WordprocessingML / OPC 命名空间
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+RT_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+RT_STYLES = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles'
+
+W_P = f'{{{W_NS}}}p'
+W_R = f'{{{W_NS}}}r'
+W_HYPERLINK = f'{{{W_NS}}}hyperlink'
+W_T = f'{{{W_NS}}}t'
+W_TAB = f'{{{W_NS}}}tab'
+W_PTAB = f'{{{W_NS}}}ptab'
+W_BR = f'{{{W_NS}}}br'
+W_CR = f'{{{W_NS}}}cr'
+W_NO_BREAK_HYPHEN = f'{{{W_NS}}}noBreakHyphen'
+W_PPR = f'{{{W_NS}}}pPr'
+W_PSTYLE = f'{{{W_NS}}}pStyle'
+W_BODY = f'{{{W_NS}}}body'
+W_VAL = f'{{{W_NS}}}val'
+W_TYPE = f'{{{W_NS}}}type'
+
+# 内置样式的 styles.xml 名称 -> UI 名称 (与 python-docx BabelFish 一致)
+_UI_STYLE_NAMES = {
+    'caption': 'Caption', 'footer': 'Footer', 'header': 'Header',
+    **{f'heading {i}': f'Heading {i}' for i in range(1, 10)}
+}
+
+
+class CSIFastDocxParser(CSIDocxParser):
+    """
+    CSI MasterSpec DOCX 快速解析器
+
+    不加载 python-docx 文档对象, 直接用 lxml iterparse 流式读取 word/document.xml:
+    - 样式 id -> 名称 只从 styles.xml 解析一次
+    - 节点直接写入 CSINodeStore, 父子关系在线确定, 树和扁平列表都从数组生成
+    输出与 CSIDocxParser.parse 完全一致
+    """
+
+    def parse(self, file_path: str) -> Dict[str, Any]:
+        """解析 CSI MasterSpec DOCX 文件 (流式)"""
+        store = self.parse_to_store(file_path)
+
+        return {
+            'file_path': file_path,
+            'section_code': self.current_section_code,
+            'division': self.current_division,
+            'tree': store.to_tree(),
+            'flat_list': store.to_flat_list(),
+            'stats': {
+                'total_nodes': len(store),
+                'by_level': store.count_by_level()
+            }
+        }
+
+    def parse_to_store(self, file_path: str) -> CSINodeStore:
+        """流式解析为 CSINodeStore, 节点按先序存放, 父子关系在线确定"""
+        self._reset()
+        store = CSINodeStore()
+
+        with zipfile.ZipFile(file_path) as zf:
+            document_part = self._find_document_part(zf)
+            style_names = self._load_style_names(zf, document_part)
+
+            with zf.open(document_part) as xml:
+                for style_id, text in self._iter_body_paragraphs(xml):
+                    style_name = style_names.get(style_id, style_names.get(None, ''))
+                    node = self._process_text(text.strip(), style_name)
+                    if node is not None:
+                        store.append(node)
+
+        return store
+
+    def _reset(self):
+        """重置解析状态"""
+        self.nodes = []
+        self.current_section_code = ""
+        self.current_division = ""
+        self.node_counter = 0
+        self.part_counter = 0
+        self.article_counter = 0
+        self.current_part_num = "1"
+        self.pr1_counter = 0
+        self.pr2_counter = 0
+        self.pr3_counter = 0
+        self.pr4_counter = 0
+        self.pr5_counter = 0
+
+    def _process_text(self, text: str, style_name: str) -> Optional[CSINode]:
+        """处理单个段落 (与 _process_paragraph 逻辑一致, 输入为已解析的文本和样式名)"""
+        if not text or not style_name:
+            return None
+
+        if style_name in self.IGNORE_STYLES:
+            return None
+
+        level_info = self.STYLE_LEVEL_MAP.get(style_name)
+        if not level_info:
+            return None
+
+        return self._create_node(text, style_name, level_info)
+
+    @staticmethod
+    def _find_document_part(zf: zipfile.ZipFile) -> str:
+        """从 _rels/.rels 找到主文档部件路径"""
+        try:
+            rels = etree.fromstring(zf.read('_rels/.rels'))
+            for rel in rels.iter(f'{{{REL_NS}}}Relationship'):
+                if rel.get('Type') == RT_OFFICE_DOCUMENT:
+                    return rel.get('Target').lstrip('/')
+        except KeyError:
+            pass
+        return 'word/document.xml'
+
+    @staticmethod
+    def _load_style_names(zf: zipfile.ZipFile, document_part: str) -> Dict[Optional[str], str]:
+        """
+        解析 styles.xml, 返回 段落样式 id -> 大写样式名
+
+        键 None 对应默认段落样式 (段落无 pStyle 或 pStyle 无效时使用),
+        解析规则与 python-docx 的 Paragraph.style 保持一致
+        """
+        part_dir = posixpath.dirname(document_part)
+        styles_part = posixpath.join(part_dir, 'styles.xml')
+        rels_part = posixpath.join(part_dir, '_rels', posixpath.basename(document_part) + '.rels')
+        try:
+            rels = etree.fromstring(zf.read(rels_part))
+            for rel in rels.iter(f'{{{REL_NS}}}Relationship'):
+                if rel.get('Type') == RT_STYLES:
+                    target = rel.get('Target')
+                    styles_part = target.lstrip('/') if target.startswith('/') \
+                        else posixpath.normpath(posixpath.join(part_dir, target))
+                    break
+        except KeyError:
+            pass
+
+        try:
+            root = etree.fromstring(zf.read(styles_part))
+        except KeyError:
+            return {}
+
+        names: Dict[Optional[str], str] = {}
+        default_name = ''
+        for style in root.iterchildren(f'{{{W_NS}}}style'):
+            if style.get(W_TYPE) != 'paragraph':
+                continue
+            name_el = style.find(f'{{{W_NS}}}name')
+            name = name_el.get(W_VAL) if name_el is not None else None
+            name = _UI_STYLE_NAMES.get(name, name).upper() if name else ''
+
+            style_id = style.get(f'{{{W_NS}}}styleId')
+            # 同 id 多个样式时取第一个
+            if style_id and style_id not in names:
+                names[style_id] = name
+            # 多个默认样式时取最后一个
+            if style.get(f'{{{W_NS}}}default') in ('1', 'true', 'on'):
+                default_name = name
+
+        names[None] = default_name
+        return names
+
+    @staticmethod
+    def _iter_body_paragraphs(xml):
+        """
+        流式遍历 w:body 的直接子段落, 产出 (样式 id, 段落文本)
+
+        文本规则与 python-docx 的 Paragraph.text 一致: 只取段落直接子元素
+        w:r 与 w:hyperlink/w:r 中的文本; 表格等嵌套段落不计入
+        """
+        for _, elem in etree.iterparse(xml, events=('end',), tag=W_P):
+            parent = elem.getparent()
+            if parent is None or parent.tag != W_BODY:
+                continue
+
+            style_id = None
+            ppr = elem.find(W_PPR)
+            if ppr is not None:
+                pstyle = ppr.find(W_PSTYLE)
+                if pstyle is not None:
+                    style_id = pstyle.get(W_VAL)
+
+            parts = []
+            for child in elem:
+                if child.tag == W_R:
+                    _append_run_text(child, parts)
+                elif child.tag == W_HYPERLINK:
+                    for run in child.iterchildren(W_R):
+                        _append_run_text(run, parts)
+
+            yield style_id, ''.join(parts)
+
+            # 释放已处理的段落及之前的兄弟节点 (含表格), 内存占用保持恒定
+            elem.clear()
+            while elem.getprevious() is not None:
+                del parent[0]
+
+
+def _append_run_text(run, parts: List[str]):
+    """追加 w:r 的文本 (w:t/w:tab/w:br 等按 python-docx 规则转换)"""
+    for child in run:
+        tag = child.tag
+        if tag == W_T:
+            if child.text:
+                parts.append(child.text)
+        elif tag == W_TAB or tag == W_PTAB:
+            parts.append('\t')
+        elif tag == W_BR:
+            if child.get(W_TYPE, 'textWrapping') == 'textWrapping':
+                parts.append('\n')
+        elif tag == W_CR:
+            parts.append('\n')
+        elif tag == W_NO_BREAK_HYPHEN:
+            parts.append('-')
+
+
+def _parse_file(task) -> str:
+    """解析单个文件并返回一行 NDJSON (进程池工作函数, 错误内联返回)"""
+    file_path, fast = task
+    try:
+        if not Path(file_path).exists():
+            raise FileNotFoundError(f'File not found: {file_path}')
+        parser = CSIFastDocxParser() if fast else CSIDocxParser()
+        result = parser.parse(file_path)
+    except Exception as e:
+        result = {'file_path': file_path, 'error': str(e)}
+    return json.dumps(result, ensure_ascii=False)
+
+
+def _collect_files(paths: List[str], files_from: Optional[str]) -> List[str]:
+    """展开目录 (递归查找 .docx) 与文件列表"""
+    if files_from:
+        stream = sys.stdin if files_from == '-' else open(files_from, encoding='utf-8')
+        with stream:
+            paths = paths + [line.strip() for line in stream if line.strip()]
+
+    files = []
+    for path in paths:
+        p = Path(path)
+        if p.is_dir():
+            files.extend(sorted(str(f) for f in p.rglob('*.docx') if not f.name.startswith('~$')))
+        else:
+            files.append(path)
+    return files
+
+
+def run_batch(files: List[str], fast: bool = False, workers: int = 0, out=None):
+    """
+    批量解析: 进程池并行, 每完成一个文件输出一行 NDJSON
+
+    Args:
+        files: 文件路径列表
+        fast: 是否使用 CSIFastDocxParser
+        workers: 进程数 (0 为 CPU 核数, 1 为单进程)
+        out: 输出流, 默认 stdout
+    """
+    from multiprocessing import Pool, cpu_count
+
+    out = out or sys.stdout
+    tasks = [(f, fast) for f in files]
+    workers = workers or cpu_count()
+
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            out.write(_parse_file(task) + '\n')
+            out.flush()
+        return
+
+    with Pool(min(workers, len(tasks))) as pool:
+        # 按完成顺序输出, 每行自带 file_path
+        for line in pool.imap_unordered(_parse_file, tasks, chunksize=4):
+            out.write(line + '\n')
+            out.flush()
+
+
+def serve(fast: bool = False, inp=None, out=None):
+    """
+    常驻模式: 从 stdin 逐行读取请求, 每个请求输出一行 NDJSON
+
+    请求可以是文件路径, 或 JSON 对象 {"file_path": "...", "fast": true}
+    调用方复用同一个已预热的进程, 省去解释器启动和 python-docx 导入开销
+    """
+    inp = inp or sys.stdin
+    out = out or sys.stdout
+
+    for line in inp:
+        line = line.strip()
+        if not line:
+            continue
+
+        use_fast = fast
+        if line.startswith('{'):
+            try:
+                request = json.loads(line)
+                file_path = request['file_path']
+                use_fast = request.get('fast', fast)
+            except (ValueError, KeyError) as e:
+                out.write(json.dumps({'error': f'Invalid request: {e}'}) + '\n')
+                out.flush()
+                continue
+        else:
+            file_path = line
+
+        out.write(_parse_file((file_path, use_fast)) + '\n')
+        out.flush()
+
+
 def main():
-    """命令行入口"""
-    if len(sys.argv) < 2:
+    """
+    命令行入口
+
+    python csi_docx_parser.py [--fast] <file_path>
+    python csi_docx_parser.py --batch [--fast] [--workers N] [--files-from LIST|-] <dir_or_file>...
+    python csi_docx_parser.py --serve [--fast]
+    """
+    args = sys.argv[1:]
+    fast = '--fast' in args
+    batch = '--batch' in args
+    server = '--serve' in args
+    args = [a for a in args if a not in ('--fast', '--batch', '--serve')]
+
+    workers = 0
+    files_from = None
+    try:
+        if '--workers' in args:
+            idx = args.index('--workers')
+            workers = int(args[idx + 1])
+            del args[idx:idx + 2]
+        if '--files-from' in args:
+            idx = args.index('--files-from')
+            files_from = args[idx + 1]
+            del args[idx:idx + 2]
+    except (IndexError, ValueError):
+        print(json.dumps({
+            'error': 'Usage: python csi_docx_parser.py --batch [--fast] [--workers N] [--files-from LIST|-] <dir_or_file>...'
+        }))
+        sys.exit(1)
+
+    if server:
+        serve(fast)
+        return
+
+    if batch:
+        if not args and not files_from:
+            print(json.dumps({
+                'error': 'Usage: python csi_docx_parser.py --batch [--fast] [--workers N] [--files-from LIST|-] <dir_or_file>...'
+            }))
+            sys.exit(1)
+        run_batch(_collect_files(args, files_from), fast, workers)
+        return
+
+    if not args:
         print(json.dumps({
-            'error': 'Usage: python csi_docx_parser.py <file_path>'
+            'error': 'Usage: python csi_docx_parser.py [--fast] <file_path>'
         }))
         sys.exit(1)
 
-    file_path = sys.argv[1]
+    file_path = args[0]
 
     if not Path(file_path).exists():
         print(json.dumps({
@@ -461,7 +957,7 @@ def main():
         sys.exit(1)
 
     try:
-        parser = CSIDocxParser()
+        parser = CSIFastDocxParser() if fast else CSIDocxParser()
         result = parser.parse(file_path)
         print(json.dumps(result, ensure_ascii=False, indent=2))
     except Exception as e:
@@ -8,8 +8,11 @@ from flask import Flask, request, jsonify
 from werkzeug.utils import secure_filename
 import tempfile
 import os
+import json
 import traceback
 
+from result_cache import ResultCache, save_stream_with_hash
+
 # Docling 导入
 try:
     from docling.document_converter import DocumentConverter
@@ -21,6 +24,18 @@ except ImportError:
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB 最大文件
 
+# 解析器版本: 解析逻辑或 Docling 版本变化时缓存自动失效
+PARSER_VERSION = "1.1.0"
+
+
+def _get_docling_version():
+    """获取已安装的 Docling 版本"""
+    try:
+        from importlib.metadata import version
+        return version('docling')
+    except Exception:
+        return "unknown"
+
 
 class DoclingParser:
     """Docling 解析器封装"""
@@ -38,12 +53,15 @@ class DoclingParser:
             # 使用 Docling 转换文档
             result = self.converter.convert(file_path)
 
+            # 单次遍历提取章节与表格
+            sections, tables = self._extract_structure(result)
+
             # 提取结构化数据
             structured_data = {
                 "success": True,
                 "structure": {
-                    "sections": self._extract_sections(result),
-                    "tables": self._extract_tables(result),
+                    "sections": sections,
+                    "tables": tables,
                     "metadata": self._extract_metadata(result)
                 },
                 "raw_text": self._extract_text(result),
@@ -58,25 +76,90 @@ class DoclingParser:
             traceback.print_exc()
             raise
 
-    def _extract_sections(self, doc):
-        """提取章节结构"""
-        sections = []
+    # 标题类标签 (新版 Docling 为 section_header/title, 旧版为 heading-N)
+    HEADING_LABELS = {'section_header', 'title'}
 
-        # Docling 解析出的文档对象包含层级结构
-        # 遍历所有标题元素
-        for item in doc.document.body:
-            if hasattr(item, 'label') and item.label.startswith('heading'):
-                # 提取章节编号和标题
-                section_data = {
-                    "code": self._extract_section_code(item.text),
-                    "title": self._extract_section_title(item.text),
-                    "level": self._get_heading_level(item.label),
-                    "content": self._get_section_content(item),
-                    "page": getattr(item, 'page_number', 0)
-                }
-                sections.append(section_data)
+    # 不计入章节正文的标签 (页眉页脚、题注等)
+    SKIP_CONTENT_LABELS = {'page_header', 'page_footer', 'caption', 'footnote'}
 
-        return sections
+    def _extract_structure(self, doc):
+        """单次线性遍历文档, 同时提取章节 (含正文) 和表格"""
+        sections = []
+        tables = []
+        current = None
+        content_parts = []
+
+        for item in self._iter_items(doc):
+            label = self._get_label(item)
+            if not label:
+                continue
+
+            if label in self.HEADING_LABELS or label.startswith('heading'):
+                # 新标题开始, 结束上一章节的正文收集
+                if current is not None:
+                    current["content"] = "\n".join(content_parts)
+                text = getattr(item, 'text', '') or ''
+                current = {
+                    "code": self._extract_section_code(text),
+                    "title": self._extract_section_title(text),
+                    "level": self._get_heading_level(label, item),
+                    "content": "",
+                    "page": self._get_page_number(item)
+                }
+                content_parts = []
+                sections.append(current)
+
+            elif label == 'table':
+                tables.append({
+                    "page": self._get_page_number(item),
+                    "caption": self._get_caption(item, doc),
+                    "section": current["code"] if current else "",
+                    "data": self._convert_table_to_array(item)
+                })
+
+            elif current is not None and label not in self.SKIP_CONTENT_LABELS:
+                text = getattr(item, 'text', None)
+                if text and text.strip():
+                    content_parts.append(text.strip())
+
+        if current is not None:
+            current["content"] = "\n".join(content_parts)
+
+        return sections, tables
+
+    def _iter_items(self, doc):
+        """按阅读顺序遍历文档元素"""
+        document = doc.document
+        if hasattr(document, 'iterate_items'):
+            # iterate_items 递归展开分组, 产出 (item, level)
+            for item, _level in document.iterate_items():
+                yield item
+        else:
+            yield from document.body
+
+    def _get_label(self, item):
+        """获取元素标签字符串 (兼容枚举与字符串)"""
+        label = getattr(item, 'label', None)
+        if label is None:
+            return ""
+        return str(getattr(label, 'value', label)).lower()
+
+    def _get_page_number(self, item):
+        """获取元素所在页码"""
+        prov = getattr(item, 'prov', None)
+        if prov:
+            return getattr(prov[0], 'page_no', 0)
+        return getattr(item, 'page_number', 0)
+
+    def _get_caption(self, item, doc):
+        """获取表格标题"""
+        if hasattr(item, 'caption_text'):
+            try:
+                return item.caption_text(doc.document)
+            except Exception:
+                pass
+        caption = getattr(item, 'caption', '')
+        return caption if isinstance(caption, str) else ''
 
     def _extract_section_code(self, text):
         """从文本中提取章节编号 (如 "1.1", "2.3.4")"""
@@ -94,40 +177,41 @@ class DoclingParser:
         title = re.sub(r'^[\d\.\s]+', '', text)
         return title.strip()
 
-    def _get_heading_level(self, label):
-        """获取标题级别 (heading-1 -> 1)"""
+    def _get_heading_level(self, label, item=None):
+        """获取标题级别 (section_header 取 item.level, heading-1 -> 1)"""
         import re
+        level = getattr(item, 'level', None)
+        if isinstance(level, int) and level > 0:
+            return level
         match = re.search(r'heading-?(\d+)', label, re.IGNORECASE)
         if match:
             return int(match.group(1))
         return 1
 
-    def _get_section_content(self, heading_item):
-        """获取章节内容 (标题后的段落)"""
-        # TODO: 实现获取标题后的段落内容
-        # 需要遍历文档树获取同级或子级的段落
-        return ""
-
-    def _extract_tables(self, doc):
-        """提取表格数据"""
-        tables = []
-
-        for item in doc.document.body:
-            if hasattr(item, 'label') and item.label == 'table':
-                table_data = {
-                    "page": getattr(item, 'page_number', 0),
-                    "caption": getattr(item, 'caption', ''),
-                    "data": self._convert_table_to_array(item)
-                }
-                tables.append(table_data)
-
-        return tables
-
     def _convert_table_to_array(self, table_item):
         """将表格转换为二维数组"""
-        # TODO: 实现表格数据提取
-        # Docling 表格对象需要转换为标准的二维数组格式
-        return []
+        data = getattr(table_item, 'data', None)
+        if data is None:
+            return []
+
+        # 优先使用 grid (已展开合并单元格)
+        grid = getattr(data, 'grid', None)
+        if grid:
+            return [[getattr(cell, 'text', '') or '' for cell in row] for row in grid]
+
+        # 回退: 按单元格偏移量填充
+        num_rows = getattr(data, 'num_rows', 0)
+        num_cols = getattr(data, 'num_cols', 0)
+        if not num_rows or not num_cols:
+            return []
+
+        rows = [['' for _ in range(num_cols)] for _ in range(num_rows)]
+        for cell in getattr(data, 'table_cells', []):
+            r = getattr(cell, 'start_row_offset_idx', None)
+            c = getattr(cell, 'start_col_offset_idx', None)
+            if r is not None and c is not None and r < num_rows and c < num_cols:
+                rows[r][c] = cell.text or ''
+        return rows
 
     def _extract_metadata(self, doc):
         """提取文档元数据"""
@@ -164,6 +248,20 @@ if DOCLING_AVAILABLE:
     except Exception as e:
         print(f"❌ Docling 解析器初始化失败: {e}")
 
+# 初始化结果缓存 (DOCLING_CACHE_MAX_MB=0 时禁用)
+result_cache = None
+_cache_max_mb = int(os.getenv('DOCLING_CACHE_MAX_MB', '2048'))
+if _cache_max_mb > 0:
+    try:
+        result_cache = ResultCache(
+            cache_dir=os.getenv('DOCLING_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'docling-cache')),
+            max_bytes=_cache_max_mb * 1024 * 1024,
+            parser_version=f"{PARSER_VERSION}+docling-{_get_docling_version()}"
+        )
+        print(f"✅ 解析结果缓存已启用: {result_cache.cache_dir}")
+    except Exception as e:
+        print(f"⚠️  解析结果缓存初始化失败: {e}")
+
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -171,7 +269,8 @@ def health_check():
     return jsonify({
         "status": "ok",
         "docling_available": DOCLING_AVAILABLE,
-        "parser_ready": parser is not None
+        "parser_ready": parser is not None,
+        "cache": result_cache.stats() if result_cache else None
     })
 
 
@@ -205,9 +304,19 @@ def parse_document():
         filename = secure_filename(file.filename)
         suffix = os.path.splitext(filename)[1]
 
+        # 流式写入临时文件, 同时计算内容哈希
         with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            file.save(tmp.name)
             tmp_path = tmp.name
+        content_hash, _ = save_stream_with_hash(file.stream, tmp_path)
+
+        # 命中缓存直接返回已序列化的结果
+        cache_key = result_cache.make_key(content_hash) if result_cache else None
+        if cache_key:
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                os.unlink(tmp_path)
+                print(f"[Cache] ✅ 命中缓存: {filename} ({content_hash[:12]})")
+                return app.response_class(cached, mimetype='application/json')
 
         # 解析文档
         result = parser.parse_document(tmp_path)
@@ -215,7 +324,11 @@ def parse_document():
         # 清理临时文件
         os.unlink(tmp_path)
 
-        return jsonify(result)
+        body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        if cache_key:
+            result_cache.put(cache_key, body)
+
+        return app.response_class(body, mimetype='application/json')
 
     except Exception as e:
         # 清理临时文件
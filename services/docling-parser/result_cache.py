@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Docling 解析结果缓存
+按 sha256(文件内容) + 解析器版本 缓存结构化 JSON, 本地磁盘存储, 按总大小 LRU 淘汰
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+# 流式读取上传文件时的块大小
+CHUNK_SIZE = 1024 * 1024
+
+
+def save_stream_with_hash(stream, dest_path, chunk_size=CHUNK_SIZE):
+    """边写临时文件边计算 sha256, 上传内容只读一遍, 不在内存中整体缓冲"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(dest_path, 'wb') as out:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class ResultCache:
+    """基于内容哈希的解析结果磁盘缓存 (LRU)"""
+
+    SUFFIX = '.json'
+
+    def __init__(self, cache_dir, max_bytes, parser_version):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.parser_version = parser_version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> 文件大小, 顺序即 LRU 顺序 (最久未使用在前)
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def make_key(self, content_hash):
+        """缓存键: 内容哈希 + 解析器版本"""
+        return hashlib.sha256(f"{content_hash}:{self.parser_version}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """命中时返回已序列化的 JSON 字节串, 未命中返回 None"""
+        path = self._path(key)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                # 文件被外部删除, 同步索引
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        # 更新 mtime, 重启后仍能恢复 LRU 顺序
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        """写入缓存 (data 为 JSON 字节串), 超出容量时淘汰最久未使用的条目"""
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[Cache] ⚠️  写入缓存失败: {e}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def stats(self):
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "parser_version": self.parser_version
+            }
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + self.SUFFIX)
+
+    def _load_index(self):
+        """启动时按 mtime 恢复缓存索引"""
+        items = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith('.tmp'):
+                # 上次异常退出遗留的半成品
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                continue
+            if not name.endswith(self.SUFFIX):
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            items.append((st.st_mtime, name[:-len(self.SUFFIX)], st.st_size))
+
+        for _, key, size in sorted(items):
+            self._entries[key] = size
+            self._total_bytes += size
+
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的条目直到总大小不超过上限 (调用方持有锁)"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass